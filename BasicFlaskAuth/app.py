@@ -4,8 +4,11 @@ from functools import wraps
 from jose import jwt
 from urllib.request import urlopen
 
+import instrumentation
+
 
 app = Flask(__name__)
+instrumentation.init_app(app)
 
 AUTH0_DOMAIN = @TODO_REPLACE_WITH_YOUR_DOMAIN
 ALGORITHMS = ['RS256']
@@ -1,6 +1,11 @@
 from flask import Flask, request, jsonify, abort
 
+import fastjson
+import instrumentation
+
 app = Flask(__name__)
+fastjson.init_app(app)
+instrumentation.init_app(app)
 
 greetings = {
             'en': 'hello', 
@@ -0,0 +1,91 @@
+import os
+import re
+
+from flask.json import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+'''
+Fast JSON responses
+
+init_app(app) makes jsonify() encode with orjson when it is installed,
+unless JSON_ENCODER=stdlib.  jsonify() in Flask 1.1 hands the payload to
+app.json_encoder(...).encode(), so FastJSONEncoder overrides encode() and
+keeps the stdlib encoder for everything orjson would write differently:
+    - pretty printed output (debug mode, JSONIFY_PRETTYPRINT_REGULAR)
+    - floats orjson formats differently (1e-05, 1e+16)
+    - sorted objects with non-str keys, since orjson sorts int keys as
+      strings ("1", "10", "2") and stdlib as numbers; orjson refuses them
+      at once without OPT_NON_STR_KEYS
+    - ints wider than 64 bits, tuple subclasses and anything else orjson
+      refuses
+Types neither encoder knows, such as datetime, go through the usual
+JSONEncoder.default(), and non-ASCII text is escaped as with ensure_ascii,
+so the response bytes are the same with either encoder.  The exception is
+NaN and Infinity, which are not JSON: stdlib writes them bare, orjson null.
+'''
+# orjson only writes a float differently from repr() when it is below 1e-4,
+# which orjson writes 0.0000..., or from 1e16, which it writes 1e16, not
+# 1e+16.  Both patterns need a number, so words like "re-elected" do not
+# match; the 'e' leading EXPONENT keeps the search on re's fast path.
+EXPONENT = re.compile(rb'e(?<=[0-9]e)[-1-9]')
+TINY = re.compile(rb'(?:^|[-[{:,"])0\.0000')
+# what ensure_ascii escapes besides the control characters: DEL and up
+NON_ASCII = re.compile('[^\x00-\x7e]')
+
+
+def escape_non_ascii(match):
+    code = ord(match.group(0))
+    if code < 0x10000:
+        return '\\u{:04x}'.format(code)
+    code -= 0x10000
+    return '\\u{:04x}\\u{:04x}'.format(0xd800 | (code >> 10),
+                                       0xdc00 | (code & 0x3ff))
+
+
+class FastJSONEncoder(JSONEncoder):
+    def encode(self, o):
+        if self.indent is not None or self.item_separator != ',' or \
+                self.key_separator != ':' or self.skipkeys or \
+                not self.allow_nan:
+            return super().encode(o)
+        option = orjson.OPT_PASSTHROUGH_DATETIME | \
+            orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_PASSTHROUGH_SUBCLASS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        else:
+            option |= orjson.OPT_NON_STR_KEYS
+        try:
+            data = orjson.dumps(o, default=self.default, option=option)
+        except TypeError:
+            return super().encode(o)
+        if EXPONENT.search(data) or \
+                (b'0.0000' in data and TINY.search(data)):
+            return super().encode(o)
+        if self.ensure_ascii:
+            if not data.isascii():
+                escaped = data.decode('utf-8').encode('ascii',
+                                                      'backslashreplace')
+                # right for U+0100 to U+FFFF only: JSON writes \xe9 as
+                # \u00e9 and \U0001f600 as a surrogate pair
+                if b'\\x' in escaped or b'\\U' in escaped:
+                    return NON_ASCII.sub(escape_non_ascii,
+                                         data.decode('utf-8'))
+                data = escaped
+            if b'\x7f' in data:
+                return NON_ASCII.sub(escape_non_ascii, data.decode('utf-8'))
+        return data.decode('utf-8')
+
+
+def init_app(app, environ=os.environ):
+    '''
+    init_app(app)
+        sets app.json_encoder, returns the name of the encoder in use
+    '''
+    if orjson is None or environ.get('JSON_ENCODER', 'orjson') == 'stdlib':
+        return 'stdlib'
+    app.json_encoder = FastJSONEncoder
+    return 'orjson'
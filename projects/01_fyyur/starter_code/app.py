@@ -3,15 +3,29 @@
 #----------------------------------------------------------------------------#
 
 import json
+import os
+import itertools
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from functools import lru_cache
 import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+import babel.dates
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, stream_with_context, abort, jsonify
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
+from flask_migrate import Migrate
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
 import logging
 from logging import Formatter, FileHandler
 from flask_wtf import Form
+from jinja2 import FileSystemBytecodeCache
 from forms import *
+from search import TrigramIndex
+from engine import pool_stats
+import instrumentation
+import compression
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
@@ -20,6 +34,10 @@ app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
 db = SQLAlchemy(app)
+migrate = Migrate(app, db)
+instrumentation.init_app(app, gauges=lambda: {
+  'db_pool_' + name: value for name, value in pool_stats(db.engine).items()})
+compression.init_app(app)
 
 # TODO: connect to a local postgresql database
 
@@ -38,8 +56,18 @@ class Venue(db.Model):
     phone = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
-
-    # TODO: implement any missing fields, as a database migration using Flask-Migrate
+    genres = db.Column(db.String(120))
+    website = db.Column(db.String(120))
+    seeking_talent = db.Column(db.Boolean, nullable=False, default=False)
+    seeking_description = db.Column(db.String(500))
+    # maintained by the Show events and refresh_show_counters()
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0)
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0)
+    shows = db.relationship('Show', backref='venue', lazy=True)
+
+    __table_args__ = (
+        db.Index('ix_venue_state_city', 'state', 'city'),
+    )
 
 class Artist(db.Model):
     __tablename__ = 'Artist'
@@ -52,22 +80,252 @@ class Artist(db.Model):
     genres = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
+    website = db.Column(db.String(120))
+    seeking_venue = db.Column(db.Boolean, nullable=False, default=False)
+    seeking_description = db.Column(db.String(500))
+    # maintained by the Show events and refresh_show_counters()
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0)
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0)
+    shows = db.relationship('Show', backref='artist', lazy=True)
+
+def show_duration():
+    return timedelta(minutes=app.config['SHOW_DURATION_MINUTES'])
+
+def show_end_time(context):
+    return context.get_current_parameters()['start_time'] + show_duration()
+
+class Show(db.Model):
+    __tablename__ = 'Show'
+
+    id = db.Column(db.Integer, primary_key=True)
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False)
+    # the end of the booked slot, start_time + SHOW_DURATION_MINUTES
+    end_time = db.Column(db.DateTime, nullable=False, default=show_end_time)
+    # the time partition: False while upcoming, flipped by refresh_show_counters()
+    is_past = db.Column(db.Boolean, nullable=False, default=False)
+
+    # upcoming/past show lookups per venue and artist are range scans on
+    # these, the rollover only visits upcoming shows that have started, and
+    # the conflict check only visits shows that have not ended
+    __table_args__ = (
+        db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_show_is_past_start_time', 'is_past', 'start_time'),
+        db.Index('ix_show_venue_id_end_time', 'venue_id', 'end_time'),
+        db.Index('ix_show_artist_id_end_time', 'artist_id', 'end_time'),
+    )
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+# Venue and Artist carry materialized upcoming/past show counts so detail
+# pages never count shows.  Inserting or deleting a Show through the ORM
+# adjusts them; refresh_show_counters() moves shows that have started from
+# the upcoming to the past partition.  It runs from cron (`flask
+# refresh-show-counters`) and, at most once a minute, when shows are created,
+# never in a GET: the detail pages, the venue listing and the search results
+# count a started show as past before it has been moved, with
+# started_show_counts().  recount_show_counters() rebuilds them from scratch,
+# e.g. after rows were written without the ORM.
+
+SHOW_COUNTER_REFRESH_INTERVAL = 60
+show_counters_refreshed_at = [0]
+
+def _shift_show_counters(connection, model, counts, column, other=None):
+  table = model.__table__
+  for id, count in counts.items():
+    values = {column: table.c[column] + count}
+    if other:
+      values[other] = table.c[other] - count
+    connection.execute(table.update().where(table.c.id == id).values(values))
+
+@event.listens_for(Show, 'before_insert')
+def partition_show(mapper, connection, show):
+  show.is_past = show.start_time <= datetime.utcnow()
+
+def _count_show(connection, show, delta):
+  column = 'past_shows_count' if show.is_past else 'upcoming_shows_count'
+  _shift_show_counters(connection, Venue, {show.venue_id: delta}, column)
+  _shift_show_counters(connection, Artist, {show.artist_id: delta}, column)
+
+@event.listens_for(Show, 'after_insert')
+def count_new_show(mapper, connection, show):
+  _count_show(connection, show, 1)
+
+@event.listens_for(Show, 'after_delete')
+def uncount_deleted_show(mapper, connection, show):
+  _count_show(connection, show, -1)
+
+def refresh_show_counters(now=None):
+  now = now or datetime.utcnow()
+  started = db.session.query(Show.id, Show.venue_id, Show.artist_id).filter(
+    Show.is_past == False, Show.start_time <= now).with_for_update().all()
+  if started:
+    connection = db.session.connection()
+    _shift_show_counters(connection, Venue, Counter(show.venue_id for show in started),
+      'past_shows_count', 'upcoming_shows_count')
+    _shift_show_counters(connection, Artist, Counter(show.artist_id for show in started),
+      'past_shows_count', 'upcoming_shows_count')
+    Show.query.filter(Show.id.in_([show.id for show in started])).update(
+      {'is_past': True}, synchronize_session=False)
+  db.session.commit()
+  show_counters_refreshed_at[0] = time.time()
+  return len(started)
+
+def refresh_show_counters_if_due():
+  if time.time() - show_counters_refreshed_at[0] > SHOW_COUNTER_REFRESH_INTERVAL:
+    refresh_show_counters()
+
+def recount_show_counters(now=None):
+  now = now or datetime.utcnow()
+  Show.query.update({'is_past': Show.start_time <= now}, synchronize_session=False)
+  for model, foreign_key in ((Venue, Show.venue_id), (Artist, Show.artist_id)):
+    for column, is_past in (('upcoming_shows_count', False), ('past_shows_count', True)):
+      count = db.select([db.func.count(Show.id)]).where(
+        db.and_(foreign_key == model.id, Show.is_past == is_past)).as_scalar()
+      db.session.execute(model.__table__.update().values({column: count}))
+  db.session.commit()
+  show_counters_refreshed_at[0] = time.time()
+
+def started_show_counts(foreign_key, now=None):
+  # {venue or artist id: shows still counted as upcoming that have started},
+  # a range scan of the (is_past, start_time) index over the few shows the
+  # next refresh will move
+  now = now or datetime.utcnow()
+  return dict(db.session.query(foreign_key, db.func.count(Show.id)).filter(
+    Show.is_past == False, Show.start_time <= now).group_by(foreign_key).all())
+
+@app.cli.command('refresh-show-counters')
+def refresh_show_counters_command():
+  """Move shows that have started into the past show counts."""
+  print('{} shows moved to past'.format(refresh_show_counters()))
+
+@app.cli.command('recount-show-counters')
+def recount_show_counters_command():
+  """Rebuild every venue and artist show count from the shows table."""
+  recount_show_counters()
 
-    # TODO: implement any missing fields, as a database migration using Flask-Migrate
+#----------------------------------------------------------------------------#
+# Show conflicts.
+#----------------------------------------------------------------------------#
 
-# TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
+# A venue or an artist cannot be booked for two shows at overlapping times.
+# Before shows are created, the shows of their venue and of their artist that
+# overlap any of their slots are looked up in one query with a range scan of the (venue_id,
+# end_time) and (artist_id, end_time) indexes: an overlapping show ends after
+# the new one starts, and starts before it ends.  Each show is compared by the
+# end_time stored with it, so changing SHOW_DURATION_MINUTES only affects new
+# shows.  On PostgreSQL exclusion constraints (created by the migrations) also
+# reject overlapping rows, which closes the race between two bookings checked
+# at the same time.
+
+def show_conflicts(venue_id, artist_id, start_times):
+  # the shows of the venue or the artist overlapping a show starting at any
+  # of start_times, found in one query
+  duration = show_duration()
+  def overlapping(foreign_key, id):
+    return Show.query.filter(foreign_key == id, Show.end_time > min(start_times), db.or_(*[
+      db.and_(Show.end_time > start_time, Show.start_time < start_time + duration)
+      for start_time in start_times]))
+  return overlapping(Show.venue_id, venue_id).union(
+    overlapping(Show.artist_id, artist_id)).order_by(Show.start_time).all()
+
+def insert_shows(venue_id, artist_id, start_times):
+  # inserts the shows with one multi-row insert, which bypasses the Show
+  # events, so the partition and the counters are set here, in the same
+  # transaction
+  now = datetime.utcnow()
+  rows = [{
+    'venue_id': venue_id,
+    'artist_id': artist_id,
+    'start_time': start_time,
+    'is_past': start_time <= now,
+  } for start_time in start_times]
+  db.session.execute(Show.__table__.insert(), rows)
+  connection = db.session.connection()
+  for column, is_past in (('upcoming_shows_count', False), ('past_shows_count', True)):
+    count = len([row for row in rows if row['is_past'] == is_past])
+    if count:
+      _shift_show_counters(connection, Venue, {venue_id: count}, column)
+      _shift_show_counters(connection, Artist, {artist_id: count}, column)
+
+def is_show_conflict(error):
+  # exclusion_violation, raised by the constraints above
+  return getattr(error.orig, 'pgcode', None) == '23P01'
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+# Venue and artist names are searched case-insensitively for partial matches.
+# On PostgreSQL ILIKE '%term%' is answered from pg_trgm GIN indexes on the
+# names (created by the migrations), elsewhere from an in-memory TrigramIndex.  Each match carries its
+# upcoming show count from the materialized counter, in the same query, less
+# the shows that have started since the last refresh.
+
+name_indexes = {
+  Venue: TrigramIndex(lambda: db.session.query(Venue.id, Venue.name).all()),
+  Artist: TrigramIndex(lambda: db.session.query(Artist.id, Artist.name).all()),
+}
+
+@event.listens_for(Venue, 'after_insert')
+@event.listens_for(Venue, 'after_update')
+@event.listens_for(Artist, 'after_insert')
+@event.listens_for(Artist, 'after_update')
+def index_name(mapper, connection, target):
+  name_indexes[mapper.class_].add(target.id, target.name)
+
+@event.listens_for(Venue, 'after_delete')
+@event.listens_for(Artist, 'after_delete')
+def unindex_name(mapper, connection, target):
+  name_indexes[mapper.class_].remove(target.id)
+
+def search_names(model, term):
+  columns = (model.id, model.name, model.upcoming_shows_count)
+  started = started_show_counts(Show.venue_id if model is Venue else Show.artist_id)
+  if db.engine.dialect.name == 'postgresql':
+    pattern = '%{}%'.format(term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_'))
+    rows = db.session.query(*columns).filter(
+      model.name.ilike(pattern, escape='\\')).order_by(model.name).all()
+  else:
+    ids = name_indexes[model].search(term)
+    rows = []
+    # keep well below sqlite's limit on bound parameters
+    for start in range(0, len(ids), 500):
+      rows.extend(db.session.query(*columns).filter(
+        model.id.in_(ids[start:start + 500])).all())
+    rows.sort(key=lambda row: (row[1] or '', row[0]))
+  return {
+    "count": len(rows),
+    "data": [{
+      "id": id,
+      "name": name,
+      "num_upcoming_shows": num_upcoming_shows - started.get(id, 0),
+    } for id, name, num_upcoming_shows in rows]
+  }
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
+# Formatting a date is slow and a page shows the same dates many times, so
+# formatted strings are memoized on (value, format, locale).  value may be an
+# ISO string or an already parsed datetime, which is never parsed again.
+
+@lru_cache(maxsize=8192)
+def _format_datetime(value, format, locale):
+  date = value if isinstance(value, datetime) else dateutil.parser.parse(value)
   if format == 'full':
       format="EEEE MMMM, d, y 'at' h:mma"
   elif format == 'medium':
       format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format)
+  return babel.dates.format_datetime(date, format, locale=locale)
+
+def format_datetime(value, format='medium', locale=None):
+  return _format_datetime(value, format, locale or babel.dates.LC_TIME)
 
 app.jinja_env.filters['datetime'] = format_datetime
 
@@ -83,130 +341,90 @@ def index():
 #  Venues
 #  ----------------------------------------------------------------
 
+def venue_areas():
+  # every venue with its materialized upcoming show count, in one statement
+  # ordered by the (state, city) index so that venues of the same city/state
+  # are adjacent, less the shows that have started since the last refresh
+  started = started_show_counts(Show.venue_id)
+  rows = db.session.query(
+      Venue.city, Venue.state, Venue.id, Venue.name, Venue.upcoming_shows_count
+    ).order_by(Venue.state, Venue.city, Venue.name, Venue.id).all()
+
+  areas = []
+  for (city, state), venues in itertools.groupby(rows, key=lambda row: (row[0], row[1])):
+    areas.append({
+      "city": city,
+      "state": state,
+      "venues": [{
+        "id": id,
+        "name": name,
+        "num_upcoming_shows": count - started.get(id, 0),
+      } for _, _, id, name, count in venues]
+    })
+  return areas
+
 @app.route('/venues')
 def venues():
-  # TODO: replace with real venues data.
-  #       num_shows should be aggregated based on number of upcoming shows per venue.
-  data=[{
-    "city": "San Francisco",
-    "state": "CA",
-    "venues": [{
-      "id": 1,
-      "name": "The Musical Hop",
-      "num_upcoming_shows": 0,
-    }, {
-      "id": 3,
-      "name": "Park Square Live Music & Coffee",
-      "num_upcoming_shows": 1,
-    }]
-  }, {
-    "city": "New York",
-    "state": "NY",
-    "venues": [{
-      "id": 2,
-      "name": "The Dueling Pianos Bar",
-      "num_upcoming_shows": 0,
-    }]
-  }]
-  return render_template('pages/venues.html', areas=data);
+  return render_template('pages/venues.html', areas=venue_areas());
 
 @app.route('/venues/search', methods=['POST'])
 def search_venues():
-  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
-  # seach for Hop should return "The Musical Hop".
-  # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-  response={
-    "count": 1,
-    "data": [{
-      "id": 2,
-      "name": "The Dueling Pianos Bar",
-      "num_upcoming_shows": 0,
-    }]
-  }
-  return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
+  # case-insensitive partial match: "Hop" finds "The Musical Hop",
+  # "Music" finds "The Musical Hop" and "Park Square Live Music & Coffee"
+  search_term = request.form.get('search_term', '')
+  response = search_names(Venue, search_term)
+  return render_template('pages/search_venues.html', results=response, search_term=search_term)
+
+def split_genres(genres):
+  return [genre for genre in (genres or '').split(',') if genre]
+
+def shows_of(foreign_key, id, is_past, other, *columns):
+  # only this entity's shows of one partition are read, in start time order
+  return db.session.query(Show.start_time, *columns).join(other).filter(
+    foreign_key == id, Show.is_past == is_past).order_by(Show.start_time).all()
+
+def past_and_upcoming_shows(foreign_key, id, other, *columns, now=None):
+  # the entity's past and upcoming shows, and how many of the upcoming
+  # partition have started since refresh_show_counters() last ran; those are
+  # listed as past without writing anything
+  now = now or datetime.utcnow()
+  past = shows_of(foreign_key, id, True, other, *columns)
+  upcoming = shows_of(foreign_key, id, False, other, *columns)
+  started = len([show for show in upcoming if show.start_time <= now])
+  past = sorted(past + upcoming[:started], key=lambda show: show.start_time)
+  return past, upcoming[started:], started
 
 @app.route('/venues/<int:venue_id>')
 def show_venue(venue_id):
   # shows the venue page with the given venue_id
-  # TODO: replace with real venue data from the venues table, using venue_id
-  data1={
-    "id": 1,
-    "name": "The Musical Hop",
-    "genres": ["Jazz", "Reggae", "Swing", "Classical", "Folk"],
-    "address": "1015 Folsom Street",
-    "city": "San Francisco",
-    "state": "CA",
-    "phone": "123-123-1234",
-    "website": "https://www.themusicalhop.com",
-    "facebook_link": "https://www.facebook.com/TheMusicalHop",
-    "seeking_talent": True,
-    "seeking_description": "We are on the lookout for a local artist to play every two weeks. Please call us.",
-    "image_link": "https://images.unsplash.com/photo-1543900694-133f37abaaa5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=400&q=60",
-    "past_shows": [{
-      "artist_id": 4,
-      "artist_name": "Guns N Petals",
-      "artist_image_link": "https://images.unsplash.com/photo-1549213783-8284d0336c4f?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=300&q=80",
-      "start_time": "2019-05-21T21:30:00.000Z"
-    }],
-    "upcoming_shows": [],
-    "past_shows_count": 1,
-    "upcoming_shows_count": 0,
-  }
-  data2={
-    "id": 2,
-    "name": "The Dueling Pianos Bar",
-    "genres": ["Classical", "R&B", "Hip-Hop"],
-    "address": "335 Delancey Street",
-    "city": "New York",
-    "state": "NY",
-    "phone": "914-003-1132",
-    "website": "https://www.theduelingpianos.com",
-    "facebook_link": "https://www.facebook.com/theduelingpianos",
-    "seeking_talent": False,
-    "image_link": "https://images.unsplash.com/photo-1497032205916-ac775f0649ae?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=750&q=80",
-    "past_shows": [],
-    "upcoming_shows": [],
-    "past_shows_count": 0,
-    "upcoming_shows_count": 0,
+  venue = Venue.query.get_or_404(venue_id)
+  columns = (Artist.id, Artist.name, Artist.image_link)
+  past, upcoming, started = past_and_upcoming_shows(Show.venue_id, venue_id, Artist, *columns)
+  past_shows, upcoming_shows = [[{
+      "artist_id": artist_id,
+      "artist_name": artist_name,
+      "artist_image_link": artist_image_link,
+      "start_time": start_time
+    } for start_time, artist_id, artist_name, artist_image_link in shows
+    ] for shows in (past, upcoming)]
+  data={
+    "id": venue.id,
+    "name": venue.name,
+    "genres": split_genres(venue.genres),
+    "address": venue.address,
+    "city": venue.city,
+    "state": venue.state,
+    "phone": venue.phone,
+    "website": venue.website,
+    "facebook_link": venue.facebook_link,
+    "seeking_talent": venue.seeking_talent,
+    "seeking_description": venue.seeking_description,
+    "image_link": venue.image_link,
+    "past_shows": past_shows,
+    "upcoming_shows": upcoming_shows,
+    "past_shows_count": venue.past_shows_count + started,
+    "upcoming_shows_count": venue.upcoming_shows_count - started,
   }
-  data3={
-    "id": 3,
-    "name": "Park Square Live Music & Coffee",
-    "genres": ["Rock n Roll", "Jazz", "Classical", "Folk"],
-    "address": "34 Whiskey Moore Ave",
-    "city": "San Francisco",
-    "state": "CA",
-    "phone": "415-000-1234",
-    "website": "https://www.parksquarelivemusicandcoffee.com",
-    "facebook_link": "https://www.facebook.com/ParkSquareLiveMusicAndCoffee",
-    "seeking_talent": False,
-    "image_link": "https://images.unsplash.com/photo-1485686531765-ba63b07845a7?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=747&q=80",
-    "past_shows": [{
-      "artist_id": 5,
-      "artist_name": "Matt Quevedo",
-      "artist_image_link": "https://images.unsplash.com/photo-1495223153807-b916f75de8c5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=334&q=80",
-      "start_time": "2019-06-15T23:00:00.000Z"
-    }],
-    "upcoming_shows": [{
-      "artist_id": 6,
-      "artist_name": "The Wild Sax Band",
-      "artist_image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80",
-      "start_time": "2035-04-01T20:00:00.000Z"
-    }, {
-      "artist_id": 6,
-      "artist_name": "The Wild Sax Band",
-      "artist_image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80",
-      "start_time": "2035-04-08T20:00:00.000Z"
-    }, {
-      "artist_id": 6,
-      "artist_name": "The Wild Sax Band",
-      "artist_image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80",
-      "start_time": "2035-04-15T20:00:00.000Z"
-    }],
-    "past_shows_count": 1,
-    "upcoming_shows_count": 1,
-  }
-  data = list(filter(lambda d: d['id'] == venue_id, [data1, data2, data3]))[0]
   return render_template('pages/show_venue.html', venue=data)
 
 #  Create Venue
@@ -257,95 +475,42 @@ def artists():
 
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
-  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
-  # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
-  # search for "band" should return "The Wild Sax Band".
-  response={
-    "count": 1,
-    "data": [{
-      "id": 4,
-      "name": "Guns N Petals",
-      "num_upcoming_shows": 0,
-    }]
-  }
-  return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+  # case-insensitive partial match: "A" finds "Guns N Petals", "Matt Quevado"
+  # and "The Wild Sax Band", "band" finds "The Wild Sax Band"
+  search_term = request.form.get('search_term', '')
+  response = search_names(Artist, search_term)
+  return render_template('pages/search_artists.html', results=response, search_term=search_term)
 
 @app.route('/artists/<int:artist_id>')
 def show_artist(artist_id):
-  # shows the venue page with the given venue_id
-  # TODO: replace with real venue data from the venues table, using venue_id
-  data1={
-    "id": 4,
-    "name": "Guns N Petals",
-    "genres": ["Rock n Roll"],
-    "city": "San Francisco",
-    "state": "CA",
-    "phone": "326-123-5000",
-    "website": "https://www.gunsnpetalsband.com",
-    "facebook_link": "https://www.facebook.com/GunsNPetals",
-    "seeking_venue": True,
-    "seeking_description": "Looking for shows to perform at in the San Francisco Bay Area!",
-    "image_link": "https://images.unsplash.com/photo-1549213783-8284d0336c4f?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=300&q=80",
-    "past_shows": [{
-      "venue_id": 1,
-      "venue_name": "The Musical Hop",
-      "venue_image_link": "https://images.unsplash.com/photo-1543900694-133f37abaaa5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=400&q=60",
-      "start_time": "2019-05-21T21:30:00.000Z"
-    }],
-    "upcoming_shows": [],
-    "past_shows_count": 1,
-    "upcoming_shows_count": 0,
-  }
-  data2={
-    "id": 5,
-    "name": "Matt Quevedo",
-    "genres": ["Jazz"],
-    "city": "New York",
-    "state": "NY",
-    "phone": "300-400-5000",
-    "facebook_link": "https://www.facebook.com/mattquevedo923251523",
-    "seeking_venue": False,
-    "image_link": "https://images.unsplash.com/photo-1495223153807-b916f75de8c5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=334&q=80",
-    "past_shows": [{
-      "venue_id": 3,
-      "venue_name": "Park Square Live Music & Coffee",
-      "venue_image_link": "https://images.unsplash.com/photo-1485686531765-ba63b07845a7?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=747&q=80",
-      "start_time": "2019-06-15T23:00:00.000Z"
-    }],
-    "upcoming_shows": [],
-    "past_shows_count": 1,
-    "upcoming_shows_count": 0,
-  }
-  data3={
-    "id": 6,
-    "name": "The Wild Sax Band",
-    "genres": ["Jazz", "Classical"],
-    "city": "San Francisco",
-    "state": "CA",
-    "phone": "432-325-5432",
-    "seeking_venue": False,
-    "image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80",
-    "past_shows": [],
-    "upcoming_shows": [{
-      "venue_id": 3,
-      "venue_name": "Park Square Live Music & Coffee",
-      "venue_image_link": "https://images.unsplash.com/photo-1485686531765-ba63b07845a7?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=747&q=80",
-      "start_time": "2035-04-01T20:00:00.000Z"
-    }, {
-      "venue_id": 3,
-      "venue_name": "Park Square Live Music & Coffee",
-      "venue_image_link": "https://images.unsplash.com/photo-1485686531765-ba63b07845a7?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=747&q=80",
-      "start_time": "2035-04-08T20:00:00.000Z"
-    }, {
-      "venue_id": 3,
-      "venue_name": "Park Square Live Music & Coffee",
-      "venue_image_link": "https://images.unsplash.com/photo-1485686531765-ba63b07845a7?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=747&q=80",
-      "start_time": "2035-04-15T20:00:00.000Z"
-    }],
-    "past_shows_count": 0,
-    "upcoming_shows_count": 3,
+  # shows the artist page with the given artist_id
+  artist = Artist.query.get_or_404(artist_id)
+  columns = (Venue.id, Venue.name, Venue.image_link)
+  past, upcoming, started = past_and_upcoming_shows(Show.artist_id, artist_id, Venue, *columns)
+  past_shows, upcoming_shows = [[{
+      "venue_id": venue_id,
+      "venue_name": venue_name,
+      "venue_image_link": venue_image_link,
+      "start_time": start_time
+    } for start_time, venue_id, venue_name, venue_image_link in shows
+    ] for shows in (past, upcoming)]
+  data={
+    "id": artist.id,
+    "name": artist.name,
+    "genres": split_genres(artist.genres),
+    "city": artist.city,
+    "state": artist.state,
+    "phone": artist.phone,
+    "website": artist.website,
+    "facebook_link": artist.facebook_link,
+    "seeking_venue": artist.seeking_venue,
+    "seeking_description": artist.seeking_description,
+    "image_link": artist.image_link,
+    "past_shows": past_shows,
+    "upcoming_shows": upcoming_shows,
+    "past_shows_count": artist.past_shows_count + started,
+    "upcoming_shows_count": artist.upcoming_shows_count - started,
   }
-  data = list(filter(lambda d: d['id'] == artist_id, [data1, data2, data3]))[0]
   return render_template('pages/show_artist.html', artist=data)
 
 #  Update
@@ -426,48 +591,49 @@ def create_artist_submission():
 #  Shows
 #  ----------------------------------------------------------------
 
+# The full list of shows is streamed: rows are read from a server-side cursor
+# SHOWS_FETCH_SIZE at a time and the page is sent in chunks as it renders, so
+# neither the rows nor the page are ever held in memory all at once.  With
+# ?page=N the list is split into pages of SHOWS_PER_PAGE shows instead.
+SHOWS_FETCH_SIZE = 1000
+SHOWS_PER_PAGE = 120
+SHOWS_STREAM_BUFFER = 50
+
+def stream_template(template_name, **context):
+  app.update_template_context(context)
+  stream = app.jinja_env.get_template(template_name).stream(context)
+  stream.enable_buffering(SHOWS_STREAM_BUFFER)
+  return stream
+
+def show_rows(query):
+  for venue_id, venue_name, artist_id, artist_name, artist_image_link, start_time in query:
+    yield {
+      "venue_id": venue_id,
+      "venue_name": venue_name,
+      "artist_id": artist_id,
+      "artist_name": artist_name,
+      "artist_image_link": artist_image_link,
+      "start_time": start_time
+    }
+
 @app.route('/shows')
 def shows():
   # displays list of shows at /shows
-  # TODO: replace with real venues data.
-  #       num_shows should be aggregated based on number of upcoming shows per venue.
-  data=[{
-    "venue_id": 1,
-    "venue_name": "The Musical Hop",
-    "artist_id": 4,
-    "artist_name": "Guns N Petals",
-    "artist_image_link": "https://images.unsplash.com/photo-1549213783-8284d0336c4f?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=300&q=80",
-    "start_time": "2019-05-21T21:30:00.000Z"
-  }, {
-    "venue_id": 3,
-    "venue_name": "Park Square Live Music & Coffee",
-    "artist_id": 5,
-    "artist_name": "Matt Quevedo",
-    "artist_image_link": "https://images.unsplash.com/photo-1495223153807-b916f75de8c5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=334&q=80",
-    "start_time": "2019-06-15T23:00:00.000Z"
-  }, {
-    "venue_id": 3,
-    "venue_name": "Park Square Live Music & Coffee",
-    "artist_id": 6,
-    "artist_name": "The Wild Sax Band",
-    "artist_image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80",
-    "start_time": "2035-04-01T20:00:00.000Z"
-  }, {
-    "venue_id": 3,
-    "venue_name": "Park Square Live Music & Coffee",
-    "artist_id": 6,
-    "artist_name": "The Wild Sax Band",
-    "artist_image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80",
-    "start_time": "2035-04-08T20:00:00.000Z"
-  }, {
-    "venue_id": 3,
-    "venue_name": "Park Square Live Music & Coffee",
-    "artist_id": 6,
-    "artist_name": "The Wild Sax Band",
-    "artist_image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80",
-    "start_time": "2035-04-15T20:00:00.000Z"
-  }]
-  return render_template('pages/shows.html', shows=data)
+  query = db.session.query(
+      Show.venue_id, Venue.name, Show.artist_id, Artist.name, Artist.image_link, Show.start_time
+    ).join(Venue).join(Artist).order_by(Show.start_time, Show.id)
+  page = request.args.get('page', type=int)
+  if page is None:
+    return Response(stream_with_context(stream_template('pages/shows.html',
+      shows=show_rows(query.yield_per(SHOWS_FETCH_SIZE)))))
+  if page < 1:
+    abort(404)
+  # one extra row tells whether there is a next page without counting
+  rows = query.offset((page - 1) * SHOWS_PER_PAGE).limit(SHOWS_PER_PAGE + 1).all()
+  if not rows and page > 1:
+    abort(404)
+  return render_template('pages/shows.html', shows=show_rows(rows[:SHOWS_PER_PAGE]),
+    page=page, has_next=len(rows) > SHOWS_PER_PAGE)
 
 @app.route('/shows/create')
 def create_shows():
@@ -478,15 +644,50 @@ def create_shows():
 @app.route('/shows/create', methods=['POST'])
 def create_show_submission():
   # called to create new shows in the db, upon submitting new show listing form
-  # TODO: insert form data as a new Show record in the db, instead
-
+  form = ShowForm()
+  if not form.validate():
+    flash('Show could not be listed: ' + '; '.join(
+      '{}: {}'.format(field, ', '.join(errors)) for field, errors in form.errors.items()))
+    return render_template('forms/new_show.html', form=form), 400
+  try:
+    venue = Venue.query.get(int(form.venue_id.data))
+    artist = Artist.query.get(int(form.artist_id.data))
+  except ValueError:
+    venue = artist = None
+  if venue is None or artist is None:
+    flash('Show could not be listed: unknown ' + ('venue' if venue is None else 'artist') + '.')
+    return render_template('forms/new_show.html', form=form), 400
+  start_times = [form.start_time.data + timedelta(weeks=week) for week in range(form.weeks.data or 1)]
+  conflicts = show_conflicts(venue.id, artist.id, start_times)
+  if conflicts:
+    flash('Show could not be listed: ' + '; '.join(
+      '{} is already booked at {}'.format(
+        venue.name if show.venue_id == venue.id else artist.name, show.start_time)
+      for show in conflicts))
+    return render_template('forms/new_show.html', form=form), 409
+  try:
+    refresh_show_counters_if_due()
+    insert_shows(venue.id, artist.id, start_times)
+    db.session.commit()
+  except Exception as e:
+    db.session.rollback()
+    if isinstance(e, IntegrityError) and is_show_conflict(e):
+      flash('Show could not be listed: the venue or the artist was just booked at that time.')
+      return render_template('forms/new_show.html', form=form), 409
+    app.logger.exception('could not list show')
+    flash('An error occurred. Show could not be listed.')
+    return render_template('pages/home.html')
   # on successful db insert, flash success
-  flash('Show was successfully listed!')
-  # TODO: on unsuccessful db insert, flash an error instead.
-  # e.g., flash('An error occurred. Show could not be listed.')
-  # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
+  if len(start_times) > 1:
+    flash('Show was successfully listed for {} weeks!'.format(len(start_times)))
+  else:
+    flash('Show was successfully listed!')
   return render_template('pages/home.html')
 
+@app.route('/metrics/pool')
+def pool_metrics():
+  return jsonify(pool_stats(db.engine))
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -506,6 +707,22 @@ if not app.debug:
     app.logger.addHandler(file_handler)
     app.logger.info('errors')
 
+#----------------------------------------------------------------------------#
+# Templates.
+#----------------------------------------------------------------------------#
+
+def warm_up_templates():
+  # compiles every template now rather than on the first request that uses it
+  for name in app.jinja_env.list_templates(extensions=['html']):
+    app.jinja_env.get_template(name)
+
+if app.config.get('TEMPLATE_CACHE_DIR'):
+  os.makedirs(app.config['TEMPLATE_CACHE_DIR'], exist_ok=True)
+  app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['TEMPLATE_CACHE_DIR'])
+
+if app.config.get('TEMPLATE_WARMUP'):
+  warm_up_templates()
+
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
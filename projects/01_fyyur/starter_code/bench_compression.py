@@ -0,0 +1,124 @@
+'''
+Benchmark of response compression against a throwaway sqlite database
+(or DATABASE_URL, which must point at an empty, disposable database).
+
+For the large static assets and the /venues, /shows?page=1 and streamed
+/shows pages it prints the bytes sent uncompressed, with gzip and with
+Brotli, and the CPU time to compress them: at the dynamic levels
+(COMPRESS_LEVEL, COMPRESS_BR_QUALITY) for pages, at the highest levels
+(paid once, at build time) for static files.  Then times whole
+requests with and without Accept-Encoding, static files being served from
+their precompressed copies.
+
+  python bench_compression.py [shows] [rounds]
+'''
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+path = None
+if not os.environ.get('DATABASE_URL'):
+  fd, path = tempfile.mkstemp(suffix='.db')
+  os.close(fd)
+  os.environ['DATABASE_URL'] = 'sqlite:///' + path
+
+import compression
+from app import app, db, Venue, Artist, Show
+
+STATIC = ['css/bootstrap.css', 'js/libs/jquery-1.11.1.min.js', 'fonts/fontawesome-webfont.svg']
+PAGES = ['/venues', '/shows?page=1', '/shows']
+
+
+def seed(shows):
+  rng = random.Random(0)
+  start = datetime(2026, 1, 1, 20, 0)
+  cities = [('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX'), ('Seattle', 'WA')]
+  db.session.execute(Artist.__table__.insert(), [
+    {'name': 'artist %d' % i, 'image_link': 'https://example.com/%d.jpg' % i}
+    for i in range(200)])
+  db.session.execute(Venue.__table__.insert(), [
+    dict(zip(('city', 'state'), rng.choice(cities)), name='venue %d' % i)
+    for i in range(500)])
+  db.session.execute(Show.__table__.insert(), [
+    {'venue_id': rng.randint(1, 500), 'artist_id': rng.randint(1, 200),
+     'start_time': start + timedelta(hours=rng.randrange(5000))}
+    for _ in range(shows)])
+  db.session.commit()
+
+
+def cpu_ms(func, rounds):
+  start = time.process_time()
+  for _ in range(rounds):
+    func()
+  return (time.process_time() - start) / rounds * 1000
+
+
+def request_ms(client, url, headers, rounds):
+  start = time.perf_counter()
+  for _ in range(rounds):
+    client.get(url, headers=headers, buffered=True)
+  return (time.perf_counter() - start) / rounds * 1000
+
+
+def row(name, data, codings, levels, rounds):
+  sizes, times = {}, {}
+  for coding in codings:
+    level = levels[coding]
+    sizes[coding] = len(compression.compress(data, coding, level))
+    times[coding] = cpu_ms(lambda: compression.compress(data, coding, level), rounds)
+  print('{:<36} {:>9} {:>9} {:>9} {:>10.2f} {:>10}'.format(
+    name, len(data), sizes['gzip'], sizes.get('br', '-'), times['gzip'],
+    '{:.2f}'.format(times['br']) if 'br' in times else '-'))
+
+
+
+def main(shows=2000, rounds=20):
+  static_path = os.path.join(app.static_folder, STATIC[0])
+  try:
+    with app.app_context():
+      db.create_all()
+      seed(shows)
+    client = app.test_client()
+    codings = compression.encodings()
+    print('shows: {}, encodings: {}'.format(shows, ', '.join(codings)))
+
+    print('\n{:<36} {:>9} {:>9} {:>9} {:>10} {:>10}'.format(
+      'bytes on the wire / CPU ms', 'identity', 'gzip', 'br', 'gzip ms', 'br ms'))
+    for name in STATIC:
+      with open(os.path.join(app.static_folder, name), 'rb') as f:
+        data = f.read()
+      row(name + ' (static)', data, codings, {'gzip': 9, 'br': 11}, 3)
+    levels = {'gzip': app.config['COMPRESS_LEVEL'], 'br': app.config['COMPRESS_BR_QUALITY']}
+    for url in PAGES:
+      data = client.get(url, buffered=True).get_data()
+      row(url, data, codings, levels, rounds)
+    streamed = {coding: len(client.get('/shows', headers={'Accept-Encoding': coding},
+                                       buffered=True).get_data())
+                for coding in codings}
+    print('{:<36} {:>9} {:>9} {:>9}   (flushed every 16KB)'.format(
+      '/shows streamed', '', streamed.get('gzip', '-'), streamed.get('br', '-')))
+
+    # what `flask compress-static` writes, for the timed file only
+    with open(static_path, 'rb') as f:
+      data = f.read()
+    for coding in codings:
+      with open(static_path + compression.SUFFIXES[coding], 'wb') as f:
+        f.write(compression.compress(data, coding, 11 if coding == 'br' else 9))
+    print('\n{:<36} {:>12} {:>12} {:>12}'.format('request ms', 'identity', 'gzip', 'br'))
+    for url in ['/static/' + STATIC[0]] + PAGES:
+      times = [request_ms(client, url, {}, rounds)]
+      times += [request_ms(client, url, {'Accept-Encoding': coding}, rounds) for coding in codings]
+      print('{:<36}'.format(url) + ''.join(' {:>12.2f}'.format(t) for t in times))
+  finally:
+    for suffix in compression.SUFFIXES.values():
+      if os.path.exists(static_path + suffix):
+        os.remove(static_path + suffix)
+    if path is not None:
+      os.remove(path)
+
+
+if __name__ == '__main__':
+  main(*[int(arg) for arg in sys.argv[1:3]])
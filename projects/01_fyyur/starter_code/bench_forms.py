@@ -0,0 +1,93 @@
+'''
+Benchmark of the venue and artist forms used by the create/edit routes:
+constructing a form from a submission, rendering its template and
+validating it, per second.
+
+Compares the forms in forms.py, whose choices are shared immutable tuples
+validated with a set lookup, with the same forms built on plain WTForms
+select fields and lists of choices.
+
+  python bench_forms.py [iterations]
+'''
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+from werkzeug.datastructures import MultiDict
+
+if not os.environ.get('DATABASE_URL'):
+  os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'bench_forms.db')
+
+from flask import render_template
+from wtforms import SelectField, SelectMultipleField
+from wtforms.validators import DataRequired
+
+from app import app
+from forms import VenueForm, ArtistForm, STATE_CHOICES, GENRE_CHOICES
+
+warnings.filterwarnings('ignore', message='"flask_wtf.Form" has been renamed')
+
+
+class ListVenueForm(VenueForm):
+  state = SelectField('state', validators=[DataRequired()], choices=list(STATE_CHOICES))
+  genres = SelectMultipleField('genres', validators=[DataRequired()], choices=list(GENRE_CHOICES))
+
+
+class ListArtistForm(ArtistForm):
+  state = SelectField('state', validators=[DataRequired()], choices=list(STATE_CHOICES))
+  genres = SelectMultipleField('genres', validators=[DataRequired()], choices=list(GENRE_CHOICES))
+
+
+SUBMISSION = MultiDict([
+  ('name', 'The Musical Hop'), ('city', 'San Francisco'), ('state', 'WY'),
+  ('address', '1015 Folsom Street'), ('phone', '123-123-1234'),
+  ('facebook_link', 'https://www.facebook.com/TheMusicalHop'),
+  ('genres', 'Soul'), ('genres', 'Other'), ('genres', 'Rock n Roll')])
+
+TEMPLATES = {
+  VenueForm: 'forms/new_venue.html', ListVenueForm: 'forms/new_venue.html',
+  ArtistForm: 'forms/new_artist.html', ListArtistForm: 'forms/new_artist.html',
+}
+
+
+def per_second(func, iterations):
+  start = time.perf_counter()
+  for _ in range(iterations):
+    func()
+  return iterations / (time.perf_counter() - start)
+
+
+def main(iterations=5000):
+  app.config['WTF_CSRF_ENABLED'] = False
+  with app.test_request_context('/venues/create', method='POST', data=SUBMISSION):
+    for form_class in TEMPLATES:
+      form = form_class(SUBMISSION)
+      assert form.validate(), form.errors
+      render_template(TEMPLATES[form_class], form=form)
+    print('{:16} {:>14} {:>14} {:>14}'.format('form', 'construct/s', 'render/s', 'validate/s'))
+    for form_class, template in TEMPLATES.items():
+      form = form_class(SUBMISSION)
+      print('{:16} {:14.0f} {:14.0f} {:14.0f}'.format(
+        form_class.__name__,
+        per_second(lambda: form_class(SUBMISSION), iterations),
+        per_second(lambda: render_template(template, form=form), iterations // 10),
+        per_second(form.validate, iterations)))
+    # the select fields on their own: rendering their options and checking
+    # the submitted values against the choices
+    print('{:16} {:>14} {:>14}'.format('select fields', 'options/s', 'check/s'))
+    for form_class in (VenueForm, ListVenueForm):
+      form = form_class(SUBMISSION)
+      def options():
+        list(form.state.iter_choices())
+        list(form.genres.iter_choices())
+      def check():
+        form.state.pre_validate(form)
+        form.genres.pre_validate(form)
+      print('{:16} {:14.0f} {:14.0f}'.format(
+        form_class.__name__, per_second(options, iterations), per_second(check, iterations)))
+
+
+if __name__ == '__main__':
+  main(*[int(arg) for arg in sys.argv[1:2]])
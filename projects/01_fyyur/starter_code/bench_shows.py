@@ -0,0 +1,132 @@
+'''
+Benchmark of rendering the /shows page against a throwaway sqlite database
+(or DATABASE_URL, which must point at an empty, disposable database).
+
+Renders pages/shows.html with the original datetime filter, which parses
+an ISO string and formats it with babel for every show, and with the
+memoized filter given the datetimes read from the database, cold and warm,
+then compares the buffered page with the streamed one: time to the first
+chunk, total time and peak memory (tracemalloc).
+
+  python bench_shows.py [shows] [distinct start times]
+'''
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+path = None
+if not os.environ.get('DATABASE_URL'):
+  fd, path = tempfile.mkstemp(suffix='.db')
+  os.close(fd)
+  os.environ['DATABASE_URL'] = 'sqlite:///' + path
+
+import babel.dates
+import dateutil.parser
+from flask import render_template
+
+from app import app, db, Venue, Artist, Show, format_datetime, _format_datetime
+
+
+def seed(shows, slots):
+  rng = random.Random(0)
+  start = datetime(2026, 1, 1, 20, 0)
+  db.session.execute(Artist.__table__.insert(), [
+    {'name': 'artist %d' % i, 'image_link': 'https://example.com/%d.jpg' % i}
+    for i in range(100)])
+  db.session.execute(Venue.__table__.insert(), [
+    {'name': 'venue %d' % i, 'city': 'San Francisco', 'state': 'CA'}
+    for i in range(100)])
+  db.session.execute(Show.__table__.insert(), [
+    {'venue_id': rng.randint(1, 100), 'artist_id': rng.randint(1, 100),
+     'start_time': start + timedelta(hours=rng.randrange(slots))}
+    for _ in range(shows)])
+  db.session.commit()
+
+
+def original_format_datetime(value, format='medium'):
+  date = dateutil.parser.parse(value)
+  if format == 'full':
+      format="EEEE MMMM, d, y 'at' h:mma"
+  elif format == 'medium':
+      format="EE MM, dd, y h:mma"
+  return babel.dates.format_datetime(date, format)
+
+
+def load_shows():
+  rows = db.session.query(
+      Show.venue_id, Venue.name, Show.artist_id, Artist.name, Artist.image_link, Show.start_time
+    ).join(Venue).join(Artist).all()
+  return [{
+    "venue_id": venue_id,
+    "venue_name": venue_name,
+    "artist_id": artist_id,
+    "artist_name": artist_name,
+    "artist_image_link": artist_image_link,
+    "start_time": start_time
+  } for venue_id, venue_name, artist_id, artist_name, artist_image_link, start_time in rows]
+
+
+def buffered_shows():
+  return render_template('pages/shows.html', shows=load_shows())
+
+
+def first_chunk(client):
+  # (ms to the first chunk, total ms, peak MB) of a request
+  tracemalloc.start()
+  start = time.perf_counter()
+  response = client.get('/shows', buffered=False)
+  chunks = iter(response.response)
+  next(chunks)
+  first = (time.perf_counter() - start) * 1000
+  for _ in chunks:
+    pass
+  total = (time.perf_counter() - start) * 1000
+  response.close()
+  peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+  tracemalloc.stop()
+  return first, total, peak
+
+
+def timed(func):
+  start = time.perf_counter()
+  func()
+  return (time.perf_counter() - start) * 1000
+
+
+def main(shows=20000, slots=2000):
+  try:
+    with app.app_context():
+      db.create_all()
+      seed(shows, slots)
+      data = load_shows()
+      as_strings = [dict(show, start_time=str(show['start_time'])) for show in data]
+      render = lambda shows: render_template('pages/shows.html', shows=shows)
+      print('shows: {}, distinct start times: {}'.format(shows, slots))
+      with app.test_request_context('/shows'):
+        render(data[:1])
+        app.jinja_env.filters['datetime'] = original_format_datetime
+        print('original filter: {:10.1f} ms'.format(timed(lambda: render(as_strings))))
+        app.jinja_env.filters['datetime'] = format_datetime
+        _format_datetime.cache_clear()
+        print('memoized, cold:  {:10.1f} ms'.format(timed(lambda: render(data))))
+        print('memoized, warm:  {:10.1f} ms'.format(timed(lambda: render(data))))
+      client = app.test_client()
+      print('GET /shows:      {:10.1f} ms'.format(timed(lambda: client.get('/shows', buffered=True))))
+      with app.test_request_context('/shows'):
+        tracemalloc.start()
+        total = timed(buffered_shows)
+        peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+      print('buffered:        first chunk {:8.1f} ms, total {:8.1f} ms, peak {:6.1f} MB'.format(total, total, peak))
+      print('streamed:        first chunk {:8.1f} ms, total {:8.1f} ms, peak {:6.1f} MB'.format(*first_chunk(client)))
+  finally:
+    if path is not None:
+      os.remove(path)
+
+
+if __name__ == '__main__':
+  main(*[int(arg) for arg in sys.argv[1:3]])
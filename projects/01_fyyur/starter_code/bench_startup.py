@@ -0,0 +1,80 @@
+'''
+Cold-start benchmark: starts a fresh interpreter per run and times creating
+the app and then the first request to each page, against a throwaway sqlite
+database (or DATABASE_URL, which must point at a disposable database).
+
+Runs are made with templates compiled lazily on first use, compiled by the
+warmup at app creation, and loaded from an empty and then a populated
+TEMPLATE_CACHE_DIR.
+
+  python bench_startup.py [runs]
+'''
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+PAGES = ['/', '/venues', '/artists', '/shows', '/venues/1', '/artists/1',
+         '/venues/create', '/artists/create', '/shows/create']
+
+# the libraries are imported before the clock starts so that creating the
+# app, which includes the template warmup, is timed on its own
+CHILD = '''
+import json, time
+import babel.dates, dateutil.parser, flask, flask_moment, flask_sqlalchemy, flask_wtf, forms
+start = time.perf_counter()
+from app import app, db
+created = time.perf_counter() - start
+with app.app_context():
+  db.create_all()
+client = app.test_client()
+first = {}
+for page in %r:
+  start = time.perf_counter()
+  client.get(page)
+  first[page] = (time.perf_counter() - start) * 1000
+print(json.dumps({'created': created * 1000, 'first': first}))
+''' % PAGES
+
+
+def run(env):
+  output = subprocess.check_output([sys.executable, '-c', CHILD], env=env,
+    cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL)
+  return json.loads(output.decode().splitlines()[-1])
+
+
+def report(label, results):
+  # medians of the runs
+  def median(values):
+    return sorted(values)[len(values) // 2]
+  created = median([result['created'] for result in results])
+  first = median([sum(result['first'].values()) for result in results])
+  slowest = median([max(result['first'].values()) for result in results])
+  print('{:24} app created {:7.1f} ms, first requests {:7.1f} ms (slowest {:6.1f} ms), total {:7.1f} ms'.format(
+    label, created, first, slowest, created + first))
+
+
+def main(runs=9):
+  workdir = tempfile.mkdtemp()
+  cache_dir = os.path.join(workdir, 'templates')
+  env = dict(os.environ)
+  env.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(workdir, 'fyyur.db'))
+  env.pop('TEMPLATE_CACHE_DIR', None)
+  try:
+    report('lazy compile', [run(dict(env, TEMPLATE_WARMUP='0')) for _ in range(runs)])
+    report('warmup', [run(dict(env, TEMPLATE_WARMUP='1')) for _ in range(runs)])
+    cold = []
+    for _ in range(runs):
+      shutil.rmtree(cache_dir, ignore_errors=True)
+      cold.append(run(dict(env, TEMPLATE_WARMUP='1', TEMPLATE_CACHE_DIR=cache_dir)))
+    report('warmup, empty cache', cold)
+    report('warmup, bytecode cache', [
+      run(dict(env, TEMPLATE_WARMUP='1', TEMPLATE_CACHE_DIR=cache_dir)) for _ in range(runs)])
+  finally:
+    shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+  main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,86 @@
+'''
+Benchmark of the /venues listing against a throwaway sqlite database
+(or DATABASE_URL, which must point at an empty, disposable database).
+
+Compares venue_areas(), which lists venues by city/state with their
+materialized upcoming show counts in one statement, with the naive N+1
+version that runs a count query per venue.
+
+  python bench_venues.py [venues] [shows per venue]
+'''
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+path = None
+if not os.environ.get('DATABASE_URL'):
+  fd, path = tempfile.mkstemp(suffix='.db')
+  os.close(fd)
+  os.environ['DATABASE_URL'] = 'sqlite:///' + path
+
+from app import app, db, Venue, Artist, Show, venue_areas, recount_show_counters
+
+CITIES = [('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX'),
+          ('Chicago', 'IL'), ('Seattle', 'WA'), ('Nashville', 'TN'),
+          ('Portland', 'OR'), ('Boston', 'MA'), ('Denver', 'CO')]
+
+
+def seed(venues, shows_per_venue):
+  rng = random.Random(0)
+  now = datetime.utcnow()
+  db.session.execute(Artist.__table__.insert(), [
+    {'name': 'artist %d' % i} for i in range(100)])
+  db.session.execute(Venue.__table__.insert(), [
+    {'name': 'venue %d' % i, 'city': city, 'state': state}
+    for i, (city, state) in enumerate(rng.choice(CITIES) for _ in range(venues))])
+  db.session.execute(Show.__table__.insert(), [
+    {'venue_id': venue_id, 'artist_id': rng.randint(1, 100),
+     'start_time': now + timedelta(days=rng.randint(-365, 365))}
+    for venue_id in range(1, venues + 1) for _ in range(shows_per_venue)])
+  db.session.commit()
+
+
+def naive_venue_areas():
+  now = datetime.utcnow()
+  areas = {}
+  for venue in Venue.query.all():
+    area = areas.setdefault((venue.city, venue.state), {
+      "city": venue.city, "state": venue.state, "venues": []})
+    area['venues'].append({
+      "id": venue.id,
+      "name": venue.name,
+      "num_upcoming_shows": Show.query.filter(
+        Show.venue_id == venue.id, Show.start_time > now).count(),
+    })
+  return list(areas.values())
+
+
+def timed(func):
+  start = time.perf_counter()
+  func()
+  elapsed = (time.perf_counter() - start) * 1000
+  db.session.remove()
+  return elapsed
+
+
+def main(venues=50000, shows_per_venue=4):
+  try:
+    with app.app_context():
+      db.create_all()
+      seed(venues, shows_per_venue)
+      recount_show_counters()
+      print('venues: {}, shows: {}'.format(venues, venues * shows_per_venue))
+      print('N+1 queries:     {:10.1f} ms'.format(timed(naive_venue_areas)))
+      print('grouped query:   {:10.1f} ms'.format(timed(venue_areas)))
+      client = app.test_client()
+      print('GET /venues:     {:10.1f} ms'.format(timed(lambda: client.get('/venues'))))
+  finally:
+    if path is not None:
+      os.remove(path)
+
+
+if __name__ == '__main__':
+  main(*[int(arg) for arg in sys.argv[1:3]])
@@ -1,4 +1,5 @@
 import os
+from engine import engine_options
 SECRET_KEY = os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
@@ -9,5 +10,27 @@ DEBUG = True
 # Connect to the database
 
 
-# TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = '<Put your local database url>'
+SQLALCHEMY_DATABASE_URI = os.environ.get(
+    'DATABASE_URL', 'postgresql://localhost:5432/fyyur')
+SQLALCHEMY_TRACK_MODIFICATIONS = False
+# pool size, overflow, recycling, pre-ping and statement timeout, from the
+# DB_* environment variables (see engine.py)
+SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+
+# Templates are compiled on first use, or all of them when the app is created
+# with TEMPLATE_WARMUP=1.  Set TEMPLATE_CACHE_DIR to keep their compiled
+# bytecode on disk, so restarted workers load it instead of compiling.
+TEMPLATE_WARMUP = os.environ.get('TEMPLATE_WARMUP', '0') == '1'
+TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR')
+
+# Shows are booked for this long; a venue or an artist cannot have two shows
+# at overlapping times.
+SHOW_DURATION_MINUTES = int(os.environ.get('SHOW_DURATION_MINUTES', 180))
+
+# Responses of COMPRESS_MIN_SIZE bytes or more are sent gzip or Brotli
+# compressed (see compression.py) at COMPRESS_LEVEL / COMPRESS_BR_QUALITY.
+# Static files are served from the copies `flask compress-static` writes at
+# build time.
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+COMPRESS_BR_QUALITY = int(os.environ.get('COMPRESS_BR_QUALITY', 5))
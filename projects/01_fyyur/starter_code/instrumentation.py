@@ -0,0 +1,206 @@
+import logging
+import os
+import threading
+import time
+
+from flask import g, has_request_context, request
+
+#----------------------------------------------------------------------------#
+# Request and query instrumentation.
+#----------------------------------------------------------------------------#
+
+# init_app(app) times every request from before_request to after_request and,
+# when SQLAlchemy is installed, every SQL statement from before_cursor_execute
+# to after_cursor_execute on any engine.  Per route it keeps
+#   http_requests_total            requests by method, route and status
+#   http_request_duration_seconds  latency histogram
+#   http_request_queries           histogram of SQL statements per request
+#   db_query_duration_seconds      latency histogram of SQL statements
+#   db_slow_queries_total          statements slower than SLOW_QUERY_MS (100)
+# Slow statements are also logged with their route.  The metrics are served in
+# the Prometheus text format at /metrics, and every response carries a
+# Server-Timing header with its total time and, if it ran SQL, the SQL time
+# and statement count, which browser dev tools show next to the request.  The
+# route label is the URL rule, such as /items/<int:item_id>, not the path, so
+# the number of series stays bounded.  Streamed responses are timed until they
+# start, not until their last chunk is sent.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+
+logger = logging.getLogger('instrumentation')
+
+class Histogram:
+  def __init__(self, buckets):
+    self.buckets = buckets
+    self.counts = [0] * len(buckets)
+    self.count = 0
+    self.sum = 0.0
+
+  def observe(self, value):
+    for i, bound in enumerate(self.buckets):
+      if value <= bound:
+        self.counts[i] += 1
+        break
+    self.count += 1
+    self.sum += value
+
+  def samples(self, name, labels):
+    cumulative = 0
+    for bound, count in zip(self.buckets, self.counts):
+      cumulative += count
+      yield '{}_bucket{{{},le="{}"}} {}'.format(name, labels, bound, cumulative)
+    yield '{}_bucket{{{},le="+Inf"}} {}'.format(name, labels, self.count)
+    yield '{}_sum{{{}}} {}'.format(name, labels, self.sum)
+    yield '{}_count{{{}}} {}'.format(name, labels, self.count)
+
+class Metrics:
+  def __init__(self, slow_query_ms=SLOW_QUERY_MS):
+    self.slow_query_ms = slow_query_ms
+    self.requests = {}
+    self.latency = {}
+    self.queries = {}
+    self.query_latency = {}
+    self.slow_queries = {}
+    self.lock = threading.Lock()
+
+  def observe_request(self, method, route, status, seconds, queries):
+    with self.lock:
+      key = (method, route, status)
+      self.requests[key] = self.requests.get(key, 0) + 1
+      self._histogram(self.latency, (method, route), LATENCY_BUCKETS).observe(seconds)
+      self._histogram(self.queries, (method, route), QUERY_COUNT_BUCKETS).observe(queries)
+
+  def observe_query(self, route, seconds, statement):
+    slow = seconds * 1000 >= self.slow_query_ms
+    with self.lock:
+      self._histogram(self.query_latency, route, LATENCY_BUCKETS).observe(seconds)
+      if slow:
+        self.slow_queries[route] = self.slow_queries.get(route, 0) + 1
+    if slow:
+      logger.warning('slow query (%.1f ms) in %s: %s', seconds * 1000,
+                     route, ' '.join(statement.split())[:500])
+
+  @staticmethod
+  def _histogram(histograms, key, buckets):
+    histogram = histograms.get(key)
+    if histogram is None:
+      histogram = histograms[key] = Histogram(buckets)
+    return histogram
+
+  def render(self, gauges=None):
+    # the metrics in the Prometheus text exposition format; gauges maps extra
+    # gauge names to numeric values
+    lines = []
+
+    def header(name, kind, text):
+      lines.append('# HELP {} {}'.format(name, text))
+      lines.append('# TYPE {} {}'.format(name, kind))
+
+    with self.lock:
+      header('http_requests_total', 'counter', 'Requests handled.')
+      for (method, route, status), count in sorted(self.requests.items()):
+        lines.append('http_requests_total{{method="{}",route="{}",status="{}"}} {}'.format(
+          method, label(route), status, count))
+      header('http_request_duration_seconds', 'histogram', 'Time from before_request to after_request.')
+      for (method, route), histogram in sorted(self.latency.items()):
+        lines.extend(histogram.samples('http_request_duration_seconds',
+          'method="{}",route="{}"'.format(method, label(route))))
+      header('http_request_queries', 'histogram', 'SQL statements executed per request.')
+      for (method, route), histogram in sorted(self.queries.items()):
+        lines.extend(histogram.samples('http_request_queries',
+          'method="{}",route="{}"'.format(method, label(route))))
+      header('db_query_duration_seconds', 'histogram', 'SQL statement execution time.')
+      for route, histogram in sorted(self.query_latency.items()):
+        lines.extend(histogram.samples('db_query_duration_seconds',
+          'route="{}"'.format(label(route))))
+      header('db_slow_queries_total', 'counter',
+             'SQL statements slower than {} ms.'.format(self.slow_query_ms))
+      for route, count in sorted(self.slow_queries.items()):
+        lines.append('db_slow_queries_total{{route="{}"}} {}'.format(label(route), count))
+    for name, value in sorted((gauges or {}).items()):
+      if isinstance(value, (int, float)) and not isinstance(value, bool):
+        lines.append('# TYPE {} gauge'.format(name))
+        lines.append('{} {}'.format(name, value))
+    return '\n'.join(lines) + '\n'
+
+def label(value):
+  return value.replace('\\', '\\\\').replace('"', '\\"')
+
+def current_route():
+  if not has_request_context():
+    return '(background)'
+  rule = request.url_rule
+  return rule.rule if rule is not None else '(unmatched)'
+
+metrics = Metrics()
+
+#----------------------------------------------------------------------------#
+# SQLAlchemy events.
+#----------------------------------------------------------------------------#
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  starts = conn.info.get('query_start')
+  if not starts:
+    return
+  seconds = time.perf_counter() - starts.pop()
+  if has_request_context() and 'request_start' in g:
+    g.query_count += 1
+    g.query_seconds += seconds
+  metrics.observe_query(current_route(), seconds, statement)
+
+def discard_query_timer(context):
+  # a failed statement never reaches after_cursor_execute
+  if context.connection is not None:
+    starts = context.connection.info.get('query_start')
+    if starts:
+      starts.pop()
+
+def listen_to_sqlalchemy():
+  try:
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+  except ImportError:
+    return
+  if not event.contains(Engine, 'before_cursor_execute', before_cursor_execute):
+    event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+    event.listen(Engine, 'handle_error', discard_query_timer)
+
+#----------------------------------------------------------------------------#
+# Flask hooks.
+#----------------------------------------------------------------------------#
+
+def init_app(app, path='/metrics', gauges=None):
+  # instruments app and serves its metrics at path; gauges() may return more
+  # {name: number} to export, e.g. the pool stats
+  listen_to_sqlalchemy()
+
+  @app.before_request
+  def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.query_count = 0
+    g.query_seconds = 0.0
+
+  @app.after_request
+  def record_request(response):
+    if 'request_start' not in g:
+      return response
+    seconds = time.perf_counter() - g.request_start
+    metrics.observe_request(request.method, current_route(), response.status_code, seconds, g.query_count)
+    timing = 'app;dur={:.1f}'.format(seconds * 1000)
+    if g.query_count:
+      timing += ', db;dur={:.1f};desc="{} queries"'.format(g.query_seconds * 1000, g.query_count)
+    response.headers.add('Server-Timing', timing)
+    return response
+
+  def serve_metrics():
+    return app.response_class(metrics.render(gauges() if gauges else None),
+                              mimetype='text/plain; version=0.0.4')
+
+  app.add_url_rule(path, 'metrics', serve_metrics)
+  return metrics
@@ -0,0 +1,117 @@
+"""shows and show counters
+
+Revision ID: 3d378819b646
+Revises: c9e7c4b4e7db
+Create Date: 2026-10-18 18:53:38.439772
+
+"""
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+from flask import current_app
+
+
+# revision identifiers, used by Alembic.
+revision = '3d378819b646'
+down_revision = 'c9e7c4b4e7db'
+branch_labels = None
+depends_on = None
+
+# columns this revision adds to the starter tables
+VENUE_COLUMNS = [
+    sa.Column('genres', sa.String(length=120), nullable=True),
+    sa.Column('website', sa.String(length=120), nullable=True),
+    sa.Column('seeking_talent', sa.Boolean(), nullable=False, server_default=sa.false()),
+    sa.Column('seeking_description', sa.String(length=500), nullable=True),
+    sa.Column('upcoming_shows_count', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('past_shows_count', sa.Integer(), nullable=False, server_default='0'),
+]
+ARTIST_COLUMNS = [
+    sa.Column('website', sa.String(length=120), nullable=True),
+    sa.Column('seeking_venue', sa.Boolean(), nullable=False, server_default=sa.false()),
+    sa.Column('seeking_description', sa.String(length=500), nullable=True),
+    sa.Column('upcoming_shows_count', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('past_shows_count', sa.Integer(), nullable=False, server_default='0'),
+]
+INDEXES = [
+    ('ix_venue_state_city', 'Venue', ['state', 'city']),
+    ('ix_show_venue_id_start_time', 'Show', ['venue_id', 'start_time']),
+    ('ix_show_artist_id_start_time', 'Show', ['artist_id', 'start_time']),
+    ('ix_show_is_past_start_time', 'Show', ['is_past', 'start_time']),
+]
+
+show = sa.table('Show',
+    sa.column('id', sa.Integer), sa.column('venue_id', sa.Integer),
+    sa.column('artist_id', sa.Integer), sa.column('start_time', sa.DateTime),
+    sa.column('end_time', sa.DateTime), sa.column('is_past', sa.Boolean))
+
+
+def add_missing_columns(inspector, table, columns):
+    existing = {column['name'] for column in inspector.get_columns(table)}
+    for column in columns:
+        if column.name not in existing:
+            op.add_column(table, column)
+
+
+def backfill_shows(bind):
+    # the partition and the end of the booked slot of shows that were
+    # written before these columns existed
+    op.execute(show.update().values(is_past=show.c.start_time <= datetime.utcnow()))
+    duration = timedelta(minutes=current_app.config['SHOW_DURATION_MINUTES'])
+    rows = bind.execute(sa.select([show.c.id, show.c.start_time]).where(
+        show.c.end_time == None)).fetchall()
+    for id, start_time in rows:
+        op.execute(show.update().where(show.c.id == id).values(end_time=start_time + duration))
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.alter_column('end_time', existing_type=sa.DateTime(), nullable=False)
+
+
+def backfill_counters():
+    for name, foreign_key in (('Venue', show.c.venue_id), ('Artist', show.c.artist_id)):
+        table = sa.table(name, sa.column('id', sa.Integer),
+            sa.column('upcoming_shows_count', sa.Integer), sa.column('past_shows_count', sa.Integer))
+        for column, is_past in (('upcoming_shows_count', False), ('past_shows_count', True)):
+            count = sa.select([sa.func.count(show.c.id)]).where(sa.and_(
+                foreign_key == table.c.id, show.c.is_past == is_past)).as_scalar()
+            op.execute(table.update().values({column: count}))
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    add_missing_columns(inspector, 'Venue', VENUE_COLUMNS)
+    add_missing_columns(inspector, 'Artist', ARTIST_COLUMNS)
+    if 'Show' not in inspector.get_table_names():
+        op.create_table('Show',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('venue_id', sa.Integer(), nullable=False),
+        sa.Column('artist_id', sa.Integer(), nullable=False),
+        sa.Column('start_time', sa.DateTime(), nullable=False),
+        sa.Column('end_time', sa.DateTime(), nullable=False),
+        sa.Column('is_past', sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ),
+        sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+    else:
+        # made with db.create_all() from the models before the show counters
+        add_missing_columns(inspector, 'Show', [
+            sa.Column('end_time', sa.DateTime(), nullable=True),
+            sa.Column('is_past', sa.Boolean(), nullable=False, server_default=sa.false()),
+        ])
+        backfill_shows(bind)
+    for name, table, columns in INDEXES:
+        if name not in {index['name'] for index in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns, unique=False)
+    backfill_counters()
+
+
+def downgrade():
+    op.drop_table('Show')
+    for table, columns in (('Artist', ARTIST_COLUMNS), ('Venue', VENUE_COLUMNS)):
+        with op.batch_alter_table(table) as batch_op:
+            if table == 'Venue':
+                batch_op.drop_index('ix_venue_state_city')
+            for column in reversed(columns):
+                batch_op.drop_column(column.name)
@@ -0,0 +1,51 @@
+"""venue and artist
+
+Revision ID: c9e7c4b4e7db
+Revises: 
+Create Date: 2026-10-18 18:53:35.225249
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9e7c4b4e7db'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # the starter models; databases made with db.create_all() before there
+    # were migrations already have these tables
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'Venue' not in tables:
+        op.create_table('Venue',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('city', sa.String(length=120), nullable=True),
+        sa.Column('state', sa.String(length=120), nullable=True),
+        sa.Column('address', sa.String(length=120), nullable=True),
+        sa.Column('phone', sa.String(length=120), nullable=True),
+        sa.Column('image_link', sa.String(length=500), nullable=True),
+        sa.Column('facebook_link', sa.String(length=120), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+    if 'Artist' not in tables:
+        op.create_table('Artist',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('city', sa.String(length=120), nullable=True),
+        sa.Column('state', sa.String(length=120), nullable=True),
+        sa.Column('phone', sa.String(length=120), nullable=True),
+        sa.Column('genres', sa.String(length=120), nullable=True),
+        sa.Column('image_link', sa.String(length=500), nullable=True),
+        sa.Column('facebook_link', sa.String(length=120), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade():
+    op.drop_table('Artist')
+    op.drop_table('Venue')
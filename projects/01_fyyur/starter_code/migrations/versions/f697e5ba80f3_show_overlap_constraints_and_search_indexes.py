@@ -0,0 +1,44 @@
+"""show overlap constraints and search indexes
+
+Revision ID: f697e5ba80f3
+Revises: 3d378819b646
+Create Date: 2026-10-18 20:12:05.118402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f697e5ba80f3'
+down_revision = '3d378819b646'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # the conflict check of /shows/create scans these
+    op.create_index('ix_show_venue_id_end_time', 'Show', ['venue_id', 'end_time'], unique=False)
+    op.create_index('ix_show_artist_id_end_time', 'Show', ['artist_id', 'end_time'], unique=False)
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    # a venue or an artist cannot have two shows with overlapping slots
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    for column in ('venue_id', 'artist_id'):
+        op.execute('ALTER TABLE "Show" ADD CONSTRAINT ex_show_{0}_overlap EXCLUDE USING gist '
+                   '({0} WITH =, tsrange(start_time, end_time) WITH &&)'.format(column))
+    # ILIKE '%term%' on venue and artist names
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in ('Venue', 'Artist'):
+        op.execute('CREATE INDEX ix_{0}_name_trgm ON "{1}" '
+                   'USING GIN (name gin_trgm_ops)'.format(table.lower(), table))
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        for table in ('Artist', 'Venue'):
+            op.drop_index('ix_{0}_name_trgm'.format(table.lower()), table_name=table)
+        for column in ('artist_id', 'venue_id'):
+            op.drop_constraint('ex_show_{0}_overlap'.format(column), 'Show')
+    op.drop_index('ix_show_artist_id_end_time', table_name='Show')
+    op.drop_index('ix_show_venue_id_end_time', table_name='Show')
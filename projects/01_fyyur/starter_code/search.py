@@ -0,0 +1,80 @@
+import threading
+import time
+
+#----------------------------------------------------------------------------#
+# In-memory trigram index.
+#----------------------------------------------------------------------------#
+
+# Case-insensitive substring search over names without scanning a table.
+# Every name is broken into its trigrams; a term of three or more letters can
+# only occur in names that contain all of its trigrams, so the postings of
+# those trigrams are intersected and only the few candidates left are checked
+# with a real substring test.  Shorter terms are checked against the names in
+# memory.  Used where PostgreSQL's pg_trgm is not available (sqlite).
+
+def trigrams(text):
+  return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class TrigramIndex:
+  def __init__(self, load, ttl=300):
+    # load() returns every (id, name) to index
+    self.load = load
+    self.ttl = ttl
+    self._names = {}
+    self._postings = {}
+    self._loaded_at = None
+    self._lock = threading.RLock()
+
+  def rebuild(self):
+    with self._lock:
+      self._names = {}
+      self._postings = {}
+      for id, name in self.load():
+        self._add(id, name)
+      self._loaded_at = time.time()
+
+  def clear(self):
+    with self._lock:
+      self._loaded_at = None
+
+  def _add(self, id, name):
+    name = (name or '').lower()
+    self._names[id] = name
+    for trigram in trigrams(name):
+      self._postings.setdefault(trigram, set()).add(id)
+
+  def _remove(self, id):
+    name = self._names.pop(id, None)
+    if name is None:
+      return
+    for trigram in trigrams(name):
+      postings = self._postings.get(trigram)
+      if postings is not None:
+        postings.discard(id)
+        if not postings:
+          del self._postings[trigram]
+
+  def add(self, id, name):
+    with self._lock:
+      if self._loaded_at is not None:
+        self._remove(id)
+        self._add(id, name)
+
+  def remove(self, id):
+    with self._lock:
+      if self._loaded_at is not None:
+        self._remove(id)
+
+  def search(self, term):
+    # returns the ids of the names containing term, ignoring case
+    term = term.lower()
+    with self._lock:
+      if self._loaded_at is None or time.time() - self._loaded_at > self.ttl:
+        self.rebuild()
+      if len(term) < 3:
+        candidates = self._names
+      else:
+        postings = [self._postings.get(trigram, set()) for trigram in trigrams(term)]
+        postings.sort(key=len)
+        candidates = set.intersection(*postings)
+      return [id for id in candidates if term in self._names[id]]
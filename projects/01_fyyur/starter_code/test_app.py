@@ -0,0 +1,517 @@
+import gzip
+import json
+import os
+import re
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+# the app binds its database when it is imported
+fd, database_path = tempfile.mkstemp(suffix='.db')
+os.close(fd)
+os.environ['DATABASE_URL'] = 'sqlite:///' + database_path
+
+from app import app, db, Venue, Artist, Show, format_datetime, _format_datetime, \
+  SHOWS_PER_PAGE, refresh_show_counters, recount_show_counters, search_names, venue_areas, \
+  name_indexes
+from forms import VenueForm, ArtistForm, STATE_CHOICES, GENRE_CHOICES
+from engine import MeteredQueuePool, pool_stats
+import compression
+import instrumentation
+from sqlalchemy import create_engine, exc
+
+PAST = datetime(2019, 5, 21, 21, 30)
+UPCOMING = datetime(2035, 4, 1, 20, 0)
+
+def tearDownModule():
+  os.remove(database_path)
+
+class FyyurTestCase(unittest.TestCase):
+  """This class represents the Fyyur test case"""
+
+  def setUp(self):
+    """Define test variables and seed a venue, an artist and two shows."""
+    app.config['WTF_CSRF_ENABLED'] = False
+    self.client = app.test_client
+    with app.app_context():
+      db.drop_all()
+      db.create_all()
+      for index in name_indexes.values():
+        index.clear()
+      venue = Venue(name='The Musical Hop', city='San Francisco', state='CA')
+      artist = Artist(name='Guns N Petals', city='San Francisco', state='CA')
+      db.session.add_all([venue, artist])
+      db.session.commit()
+      self.venue_id, self.artist_id = venue.id, artist.id
+      for start_time in (PAST, UPCOMING):
+        db.session.add(Show(venue_id=venue.id, artist_id=artist.id, start_time=start_time))
+      db.session.commit()
+
+  def tearDown(self):
+    """Executed after reach test"""
+    with app.app_context():
+      db.session.remove()
+
+  #  Filters
+  #  ----------------------------------------------------------------
+
+  def test_format_datetime_is_memoized(self):
+    _format_datetime.cache_clear()
+    formatted = format_datetime(UPCOMING)
+    self.assertEqual(format_datetime(UPCOMING), formatted)
+    self.assertEqual(_format_datetime.cache_info().hits, 1)
+    self.assertEqual(format_datetime('2035-04-01T20:00:00'), formatted)
+    self.assertEqual(format_datetime(UPCOMING, 'full'), 'Sunday April, 1, 2035 at 8:00PM')
+
+  #  Shows
+  #  ----------------------------------------------------------------
+
+  def test_venue_page_lists_its_shows(self):
+    res = self.client().get('/venues/{}'.format(self.venue_id))
+    self.assertEqual(res.status_code, 200)
+    self.assertIn(b'Guns N Petals', res.data)
+    self.assertIn(format_datetime(PAST, 'full').encode(), res.data)
+    self.assertIn(format_datetime(UPCOMING, 'full').encode(), res.data)
+
+  def test_artist_page_lists_its_shows(self):
+    res = self.client().get('/artists/{}'.format(self.artist_id))
+    self.assertEqual(res.status_code, 200)
+    self.assertIn(b'The Musical Hop', res.data)
+    self.assertIn(format_datetime(UPCOMING, 'full').encode(), res.data)
+
+  def add_shows(self, count):
+    # weekly shows after UPCOMING, inserted without the ORM
+    with app.app_context():
+      db.session.execute(Show.__table__.insert(), [{
+        'venue_id': self.venue_id,
+        'artist_id': self.artist_id,
+        'start_time': UPCOMING + timedelta(weeks=week),
+      } for week in range(1, count + 1)])
+      db.session.commit()
+
+  def test_shows_page_is_streamed_in_start_time_order(self):
+    self.add_shows(200)
+    res = self.client().get('/shows')
+    self.assertEqual(res.status_code, 200)
+    self.assertTrue(res.is_streamed)
+    chunks = list(res.response)
+    self.assertTrue(len(chunks) > 1)
+    data = b''.join(chunks)
+    self.assertEqual(data.count(b'tile-show'), 202)
+    self.assertEqual(data.count(b'Guns N Petals'), 202)
+    self.assertNotIn(b'class="pager"', data)
+    past = data.index(format_datetime(PAST, 'full').encode())
+    upcoming = data.index(format_datetime(UPCOMING, 'full').encode())
+    last = data.index(format_datetime(UPCOMING + timedelta(weeks=200), 'full').encode())
+    self.assertTrue(past < upcoming < last)
+
+  def test_shows_pages(self):
+    self.add_shows(SHOWS_PER_PAGE)
+    res = self.client().get('/shows?page=1')
+    self.assertEqual(res.status_code, 200)
+    self.assertEqual(res.data.count(b'tile-show'), SHOWS_PER_PAGE)
+    self.assertIn(b'/shows?page=2', res.data)
+    self.assertNotIn(b'Previous', res.data)
+    res = self.client().get('/shows?page=2')
+    self.assertEqual(res.status_code, 200)
+    self.assertEqual(res.data.count(b'tile-show'), 2)
+    self.assertIn(b'/shows?page=1', res.data)
+    self.assertNotIn(b'/shows?page=3', res.data)
+    for page in (0, 3):
+      self.assertEqual(self.client().get('/shows?page={}'.format(page)).status_code, 404)
+
+  #  Show counters
+  #  ----------------------------------------------------------------
+
+  def start_a_show(self):
+    # a show booked as upcoming that has started since, with no refresh yet
+    with app.app_context():
+      show = Show(venue_id=self.venue_id, artist_id=self.artist_id,
+        start_time=datetime.utcnow() + timedelta(hours=1))
+      db.session.add(show)
+      db.session.commit()
+      db.session.execute(Show.__table__.update().where(Show.id == show.id).values(
+        start_time=datetime.utcnow() - timedelta(minutes=1)))
+      db.session.commit()
+
+  def counters(self):
+    with app.app_context():
+      return [(entity.upcoming_shows_count, entity.past_shows_count) for entity in (
+        Venue.query.get(self.venue_id), Artist.query.get(self.artist_id))]
+
+  def test_shows_are_counted_as_they_are_added(self):
+    self.assertEqual(self.counters(), [(1, 1), (1, 1)])
+    self.add_shows(1)
+    self.assertEqual(self.counters(), [(1, 1), (1, 1)])
+    with app.app_context():
+      db.session.add(Show(venue_id=self.venue_id, artist_id=self.artist_id,
+        start_time=UPCOMING + timedelta(days=1)))
+      db.session.commit()
+    self.assertEqual(self.counters(), [(2, 1), (2, 1)])
+
+  def test_started_shows_are_counted_as_past_before_a_refresh(self):
+    self.start_a_show()
+    self.assertEqual(self.counters(), [(2, 1), (2, 1)])
+    res = self.client().get('/venues/{}'.format(self.venue_id))
+    self.assertIn(b'1 Upcoming Show<', res.data)
+    self.assertIn(b'2 Past Shows<', res.data)
+    with app.app_context():
+      self.assertEqual(venue_areas()[0]['venues'][0]['num_upcoming_shows'], 1)
+      self.assertEqual(search_names(Venue, 'hop')['data'][0]['num_upcoming_shows'], 1)
+      self.assertEqual(search_names(Artist, 'guns')['data'][0]['num_upcoming_shows'], 1)
+
+  def test_refresh_show_counters(self):
+    self.start_a_show()
+    with app.app_context():
+      self.assertEqual(refresh_show_counters(), 1)
+      self.assertEqual(Show.query.filter_by(is_past=True).count(), 2)
+    self.assertEqual(self.counters(), [(1, 2), (1, 2)])
+    with app.app_context():
+      self.assertEqual(refresh_show_counters(), 0)
+      self.assertEqual(venue_areas()[0]['venues'][0]['num_upcoming_shows'], 1)
+    self.assertEqual(self.counters(), [(1, 2), (1, 2)])
+
+  def test_recount_show_counters(self):
+    # rows written without the ORM are not counted until a recount
+    self.add_shows(2)
+    self.start_a_show()
+    with app.app_context():
+      db.session.execute(Venue.__table__.update().values(upcoming_shows_count=0, past_shows_count=0))
+      db.session.commit()
+      recount_show_counters()
+      self.assertEqual(Show.query.filter_by(is_past=True).count(), 2)
+    self.assertEqual(self.counters(), [(3, 2), (3, 2)])
+
+  def create_shows(self, start_time, weeks):
+    return self.client().post('/shows/create', data={
+      'venue_id': str(self.venue_id),
+      'artist_id': str(self.artist_id),
+      'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S'),
+      'weeks': str(weeks),
+    })
+
+  def start_times(self):
+    with app.app_context():
+      return [start_time for start_time, in db.session.query(Show.start_time).order_by(Show.start_time)]
+
+  def test_create_weekly_shows(self):
+    start_time = datetime(2030, 1, 4, 21, 0)
+    res = self.create_shows(start_time, 3)
+    self.assertEqual(res.status_code, 200)
+    self.assertIn(b'Show was successfully listed for 3 weeks!', res.data)
+    self.assertEqual(self.start_times(), [PAST] + [
+      start_time + timedelta(weeks=week) for week in range(3)] + [UPCOMING])
+    with app.app_context():
+      venue, artist = Venue.query.get(self.venue_id), Artist.query.get(self.artist_id)
+      self.assertEqual((venue.upcoming_shows_count, venue.past_shows_count), (4, 1))
+      self.assertEqual((artist.upcoming_shows_count, artist.past_shows_count), (4, 1))
+
+  def test_weekly_shows_conflicting_in_any_week_are_refused(self):
+    # the third week is booked already
+    res = self.create_shows(UPCOMING - timedelta(weeks=2, hours=1), 3)
+    self.assertEqual(res.status_code, 409)
+    self.assertIn(b'is already booked at', res.data)
+    self.assertEqual(self.start_times(), [PAST, UPCOMING])
+
+  def test_weekly_shows_limited_to_a_year(self):
+    res = self.create_shows(datetime(2030, 1, 4, 21, 0), 53)
+    self.assertEqual(res.status_code, 400)
+    self.assertEqual(self.start_times(), [PAST, UPCOMING])
+
+  #  Venues
+  #  ----------------------------------------------------------------
+
+  def test_venues_grouped_by_city_and_state(self):
+    park, pianos = self.add_venues('Park Square Live Music & Coffee', 'The Dueling Pianos Bar')
+    with app.app_context():
+      db.session.add_all([
+        Venue(name='Corn Exchange', city='Springfield', state='MA'),
+        Venue(name='Capitol Hall', city='Springfield', state='IL'),
+        Show(venue_id=pianos, artist_id=self.artist_id, start_time=UPCOMING + timedelta(days=1)),
+        Show(venue_id=pianos, artist_id=self.artist_id, start_time=PAST - timedelta(days=1)),
+      ])
+      db.session.commit()
+      areas = venue_areas()
+    self.assertEqual([(area['city'], area['state']) for area in areas], [
+      ('San Francisco', 'CA'), ('Springfield', 'IL'), ('Springfield', 'MA'), ('New York', 'NY')])
+    self.assertEqual(areas[0]['venues'], [
+      {'id': self.venue_id, 'name': 'The Musical Hop', 'num_upcoming_shows': 1}])
+    self.assertEqual(areas[3]['venues'], [
+      {'id': park, 'name': 'Park Square Live Music & Coffee', 'num_upcoming_shows': 0},
+      {'id': pianos, 'name': 'The Dueling Pianos Bar', 'num_upcoming_shows': 1}])
+
+  def test_venues_page(self):
+    park, = self.add_venues('Park Square Live Music & Coffee')
+    res = self.client().get('/venues')
+    self.assertEqual(res.status_code, 200)
+    self.assertIn(b'<h3>San Francisco, CA</h3>', res.data)
+    self.assertIn(b'<h3>New York, NY</h3>', res.data)
+    self.assertIn('<a href="/venues/{}">'.format(park).encode(), res.data)
+    self.assertTrue(res.data.index(b'The Musical Hop') < res.data.index(b'Park Square'))
+
+  #  Search
+  #  ----------------------------------------------------------------
+
+  def add_venues(self, *names):
+    with app.app_context():
+      venues = [Venue(name=name, city='New York', state='NY') for name in names]
+      db.session.add_all(venues)
+      db.session.commit()
+      return [venue.id for venue in venues]
+
+  def search(self, model, term):
+    with app.app_context():
+      return [row['name'] for row in search_names(model, term)['data']]
+
+  def test_search_venues(self):
+    self.add_venues('Park Square Live Music & Coffee', 'The Dueling Pianos Bar')
+    res = self.client().post('/venues/search', data={'search_term': 'Music'})
+    self.assertEqual(res.status_code, 200)
+    self.assertIn(b'Number of search results for "Music": 2', res.data)
+    self.assertIn(b'The Musical Hop', res.data)
+    self.assertIn(b'Park Square Live Music &amp; Coffee', res.data)
+    self.assertNotIn(b'The Dueling Pianos Bar', res.data)
+
+  def test_search_artists(self):
+    res = self.client().post('/artists/search', data={'search_term': 'n p'})
+    self.assertEqual(res.status_code, 200)
+    self.assertIn(b'Number of search results for "n p": 1', res.data)
+    self.assertIn(b'Guns N Petals', res.data)
+
+  def test_search_is_case_insensitive_and_partial(self):
+    self.add_venues('Park Square Live Music & Coffee', 'The Dueling Pianos Bar')
+    music = ['Park Square Live Music & Coffee', 'The Musical Hop']
+    self.assertEqual(self.search(Venue, 'MUSIC'), music)
+    self.assertEqual(self.search(Venue, 'usic'), music)
+    self.assertEqual(self.search(Venue, 'jazz'), [])
+
+  def test_search_terms_shorter_than_a_trigram(self):
+    self.add_venues('Park Square Live Music & Coffee', 'The Dueling Pianos Bar')
+    self.assertEqual(self.search(Venue, 'BA'), ['The Dueling Pianos Bar'])
+    self.assertEqual(self.search(Venue, 'p'), [
+      'Park Square Live Music & Coffee', 'The Dueling Pianos Bar', 'The Musical Hop'])
+    self.assertEqual(len(self.search(Venue, '')), 3)
+
+  def test_search_wildcards_matched_literally(self):
+    self.add_venues('100% Jazz', 'Under_Score Club', 'Under Score Club')
+    self.assertEqual(self.search(Venue, '%'), ['100% Jazz'])
+    self.assertEqual(self.search(Venue, '0% j'), ['100% Jazz'])
+    self.assertEqual(self.search(Venue, '_'), ['Under_Score Club'])
+    self.assertEqual(self.search(Venue, 'r_s'), ['Under_Score Club'])
+
+  def test_search_index_follows_writes(self):
+    self.assertEqual(self.search(Venue, 'hop'), ['The Musical Hop'])
+    id, = self.add_venues('Hopscotch Hall')
+    self.assertEqual(self.search(Venue, 'hop'), ['Hopscotch Hall', 'The Musical Hop'])
+    with app.app_context():
+      Venue.query.get(id).name = 'Scotch Hall'
+      db.session.commit()
+    self.assertEqual(self.search(Venue, 'hop'), ['The Musical Hop'])
+    self.assertEqual(self.search(Venue, 'scotch'), ['Scotch Hall'])
+    with app.app_context():
+      db.session.delete(Venue.query.get(id))
+      db.session.commit()
+    self.assertEqual(self.search(Venue, 'scotch'), [])
+
+  def test_search_results_carry_upcoming_show_counts(self):
+    self.add_shows(2)
+    with app.app_context():
+      recount_show_counters()
+      self.assertEqual(search_names(Artist, 'PETAL'), {'count': 1, 'data': [{
+        'id': self.artist_id, 'name': 'Guns N Petals', 'num_upcoming_shows': 3}]})
+      self.assertEqual(search_names(Venue, 'hop')['data'][0]['num_upcoming_shows'], 3)
+
+  #  Forms
+  #  ----------------------------------------------------------------
+
+  def venue_form(self, **fields):
+    data = dict({
+      'name': 'The Dueling Pianos Bar',
+      'city': 'New York',
+      'state': 'NY',
+      'address': '335 Delancey Street',
+      'genres': ['Classical', 'R&B'],
+      'facebook_link': 'https://www.facebook.com/theduelingpianos',
+    }, **fields)
+    with app.test_request_context('/venues/create', method='POST', data=data):
+      form = VenueForm()
+      return form, form.validate()
+
+  def test_forms_share_their_choices(self):
+    with app.test_request_context('/'):
+      venue, artist = VenueForm(), ArtistForm()
+    for form in (venue, artist):
+      self.assertIs(form.state.choices, STATE_CHOICES)
+      self.assertIs(form.genres.choices, GENRE_CHOICES)
+
+  def test_form_accepts_listed_choices(self):
+    form, valid = self.venue_form()
+    self.assertTrue(valid, form.errors)
+    self.assertEqual(form.genres.data, ['Classical', 'R&B'])
+
+  def test_form_rejects_unlisted_choices(self):
+    form, valid = self.venue_form(state='ZZ', genres=['Jazz', 'Polka'])
+    self.assertFalse(valid)
+    self.assertEqual(form.errors['state'], ['Not a valid choice'])
+    self.assertEqual(form.errors['genres'], ["'Polka' is not a valid choice for this field"])
+
+  def test_form_renders_the_selected_choices(self):
+    form, _ = self.venue_form()
+    self.assertIn('<option selected value="NY">NY</option>', form.state())
+    self.assertIn('<option value="CA">CA</option>', form.state())
+    self.assertIn('<option selected value="R&amp;B">R&amp;B</option>', form.genres())
+    res = self.client().get('/venues/create')
+    self.assertEqual(res.status_code, 200)
+    self.assertEqual(res.data.count(b'<option'), len(STATE_CHOICES) + len(GENRE_CHOICES))
+
+  #  Compression
+  #  ----------------------------------------------------------------
+
+  def get_encoded(self, url, accept_encoding, min_size=0):
+    app.config['COMPRESS_MIN_SIZE'] = min_size
+    try:
+      res = self.client().get(url, headers={'Accept-Encoding': accept_encoding})
+      data = res.get_data()
+      res.close()
+      return res, data
+    finally:
+      app.config['COMPRESS_MIN_SIZE'] = compression.COMPRESS_MIN_SIZE
+
+  def test_compression_uses_the_preferred_encoding(self):
+    body = self.client().get('/venues').data
+    res, data = self.get_encoded('/venues', 'gzip, br')
+    coding = compression.encodings()[0]
+    self.assertEqual(res.headers['Content-Encoding'], coding)
+    self.assertIn('Accept-Encoding', res.headers['Vary'])
+    if coding == 'br':
+      self.assertEqual(compression.brotli.decompress(data), body)
+    res, data = self.get_encoded('/venues', 'br;q=0.5, gzip')
+    self.assertEqual(res.headers['Content-Encoding'], 'gzip')
+    self.assertEqual(gzip.decompress(data), body)
+    for accept_encoding in ('', 'identity', 'gzip;q=0'):
+      res, data = self.get_encoded('/venues', accept_encoding)
+      self.assertNotIn('Content-Encoding', res.headers)
+      self.assertEqual(data, body)
+
+  def test_compression_threshold(self):
+    size = len(self.client().get('/venues').data)
+    res, data = self.get_encoded('/venues', 'gzip', min_size=size + 1)
+    self.assertNotIn('Content-Encoding', res.headers)
+    self.assertEqual(len(data), size)
+    res, data = self.get_encoded('/venues', 'gzip', min_size=size)
+    self.assertEqual(res.headers['Content-Encoding'], 'gzip')
+
+  def test_streamed_page_is_compressed_as_it_renders(self):
+    self.add_shows(200)
+    body = self.client().get('/shows').get_data()
+    res = self.client().get('/shows', headers={'Accept-Encoding': 'gzip'})
+    self.assertTrue(res.is_streamed)
+    self.assertEqual(res.headers['Content-Encoding'], 'gzip')
+    self.assertNotIn('Content-Length', res.headers)
+    self.assertEqual(gzip.decompress(res.get_data()), body)
+
+  def test_static_files_served_from_prebuilt_copies(self):
+    path = os.path.join(app.static_folder, 'css', 'bootstrap.css')
+    with open(path, 'rb') as f:
+      body = f.read()
+    compression.static_variants.clear()
+    try:
+      with open(path + '.gz', 'wb') as f:
+        f.write(compression.compress(body, 'gzip', 9))
+      res, data = self.get_encoded('/static/css/bootstrap.css', 'gzip', min_size=1024)
+      self.assertEqual(res.headers['Content-Encoding'], 'gzip')
+      self.assertEqual(gzip.decompress(data), body)
+      res, data = self.get_encoded('/static/css/bootstrap.css', 'identity', min_size=1024)
+      self.assertNotIn('Content-Encoding', res.headers)
+      self.assertEqual(data, body)
+    finally:
+      os.remove(path + '.gz')
+      compression.static_variants.clear()
+    # without a copy the file is sent as it is, nothing is compressed
+    res, data = self.get_encoded('/static/css/bootstrap.css', 'gzip', min_size=1024)
+    self.assertNotIn('Content-Encoding', res.headers)
+    self.assertEqual(data, body)
+
+  #  Metrics
+  #  ----------------------------------------------------------------
+
+  def scrape(self):
+    res = self.client().get('/metrics')
+    self.assertEqual(res.status_code, 200)
+    self.assertEqual(res.mimetype, 'text/plain')
+    samples = {}
+    for line in res.get_data(as_text=True).splitlines():
+      if not line.startswith('#'):
+        name, value = line.rsplit(' ', 1)
+        samples[name] = float(value)
+    return samples
+
+  def test_metrics_count_requests_by_url_rule(self):
+    key = 'http_requests_total{method="GET",route="/venues/<int:venue_id>",status="200"}'
+    before = self.scrape().get(key, 0)
+    self.client().get('/venues/{}'.format(self.venue_id))
+    self.client().get('/venues/{}'.format(self.venue_id))
+    self.client().get('/no-such-page')
+    samples = self.scrape()
+    self.assertEqual(samples[key], before + 2)
+    self.assertIn('http_request_duration_seconds_count{method="GET",route="/venues/<int:venue_id>"}', samples)
+    self.assertTrue(samples['http_requests_total{method="GET",route="(unmatched)",status="404"}'])
+
+  def test_numeric_gauges_exported(self):
+    text = instrumentation.metrics.render({'db_pool_size': 5, 'db_pool_pool': 'QueuePool', 'flag': True})
+    self.assertIn('# TYPE db_pool_size gauge\ndb_pool_size 5\n', text)
+    self.assertNotIn('db_pool_pool', text)
+    self.assertNotIn('flag', text)
+
+  def test_server_timing(self):
+    res = self.client().get('/venues/{}'.format(self.venue_id))
+    self.assertRegex(res.headers['Server-Timing'],
+      r'^app;dur=[0-9.]+, db;dur=[0-9.]+;desc="[1-9][0-9]* queries"$')
+    res = self.client().get('/')
+    self.assertRegex(res.headers['Server-Timing'], r'^app;dur=[0-9.]+$')
+
+  def test_queries_per_request(self):
+    key = 'http_request_queries_sum{method="GET",route="/venues/<int:venue_id>"}'
+    before = self.scrape().get(key, 0)
+    res = self.client().get('/venues/{}'.format(self.venue_id))
+    queries = int(re.search(r'desc="(\d+) queries"', res.headers['Server-Timing']).group(1))
+    self.assertEqual(self.scrape()[key], before + queries)
+
+  def test_slow_queries_logged_and_counted(self):
+    key = 'db_slow_queries_total{route="/venues/<int:venue_id>"}'
+    before = self.scrape().get(key, 0)
+    slow_query_ms = instrumentation.metrics.slow_query_ms
+    instrumentation.metrics.slow_query_ms = 0
+    try:
+      with self.assertLogs('instrumentation', 'WARNING') as logs:
+        self.client().get('/venues/{}'.format(self.venue_id))
+    finally:
+      instrumentation.metrics.slow_query_ms = slow_query_ms
+    self.assertIn('in /venues/<int:venue_id>: SELECT ', logs.output[0])
+    self.assertEqual(self.scrape()[key], before + len(logs.output))
+
+  def test_pool_metrics_route(self):
+    res = self.client().get('/metrics/pool')
+    self.assertEqual(res.status_code, 200)
+    with app.app_context():
+      self.assertEqual(json.loads(res.data), pool_stats(db.engine))
+
+  def test_metered_pool_stats(self):
+    engine = create_engine('sqlite:///' + database_path, poolclass=MeteredQueuePool,
+      pool_size=1, max_overflow=0, pool_timeout=0.05)
+    connection = engine.connect()
+    with self.assertRaises(exc.TimeoutError):
+      engine.connect()
+    stats = pool_stats(engine)
+    self.assertEqual(stats['pool'], 'MeteredQueuePool')
+    self.assertEqual((stats['checked_out'], stats['utilization']), (1, 1.0))
+    self.assertEqual((stats['checkouts'], stats['timeouts']), (2, 1))
+    self.assertTrue(stats['wait_seconds_max'] >= 0.05)
+    connection.close()
+    stats = pool_stats(engine)
+    self.assertEqual((stats['checked_out'], stats['idle']), (0, 1))
+    engine.dispose()
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+  unittest.main()
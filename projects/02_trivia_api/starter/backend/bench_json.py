@@ -0,0 +1,105 @@
+'''
+Benchmark of jsonify() with the stdlib encoder and with FastJSONEncoder
+(orjson), on the responses the trivia API sends for the questions and
+categories bundled in trivia.psql:
+
+    /categories             - the category map, {id: type}
+    /questions              - the first page, with the category map
+    /questions/search       - the questions matching "title"
+    /categories/4/questions - the History questions
+    listing                 - the bundled questions repeated to [questions]
+                              rows, as /categories/<id>/questions returns a
+                              large category
+Checks that both encoders produce the same bytes before timing them.
+
+    python bench_json.py [questions] [rounds]
+'''
+import os
+import sys
+import time
+
+from flask import Flask, jsonify
+
+import fastjson
+
+DUMP = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'trivia.psql')
+QUESTIONS_PER_PAGE = 10
+
+
+def read_table(lines, table):
+    '''
+    read_table(lines, table)
+        the rows of the table's COPY block, as lists of strings
+    '''
+    start = lines.index(next(line for line in lines
+                             if line.startswith('COPY public.' + table)))
+    end = lines.index('\\.', start)
+    return [line.split('\t') for line in lines[start + 1:end]]
+
+
+def load_dump():
+    with open(DUMP, encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    categories = {int(id): type for id, type in read_table(lines,
+                                                           'categories')}
+    questions = sorted(({'id': int(id), 'question': question,
+                         'answer': answer, 'difficulty': int(difficulty),
+                         'category': int(category)}
+                        for id, question, answer, difficulty, category
+                        in read_table(lines, 'questions')),
+                       key=lambda question: question['id'])
+    return categories, questions
+
+
+def payloads(count):
+    categories, questions = load_dump()
+    found = [q for q in questions if 'title' in q['question'].lower()]
+    history = [q for q in questions if q['category'] == 4]
+    listing = [dict(questions[i % len(questions)], id=i + 1)
+               for i in range(count)]
+    return {
+        '/categories': {'success': True, 'categories': categories,
+                        'total_categories': len(categories)},
+        '/questions': {'success': True, 'total_questions': len(questions),
+                       'questions': questions[:QUESTIONS_PER_PAGE],
+                       'current_category': None, 'categories': categories},
+        '/questions/search': {'success': True, 'questions': found,
+                              'total_questions': len(found)},
+        '/categories/4/questions': {'success': True, 'questions': history,
+                                    'total_questions': len(history),
+                                    'current_category': 4},
+        'listing': {'success': True, 'questions': listing,
+                    'total_questions': count, 'current_category': 1}
+    }
+
+
+def run(app, payload, rounds):
+    with app.test_request_context():
+        body = jsonify(payload).get_data()
+        start = time.perf_counter()
+        for _ in range(rounds):
+            jsonify(payload).get_data()
+        elapsed = time.perf_counter() - start
+    return body, elapsed / rounds * 1e6
+
+
+def main(count=1000, rounds=2000):
+    stdlib = Flask('stdlib')
+    fast = Flask('fast')
+    if fastjson.init_app(fast) != 'orjson':
+        sys.exit('orjson is not installed')
+
+    print('{} listed questions, {} rounds, microseconds per response'.format(
+        count, rounds))
+    print('{:<24} {:>10} {:>10} {:>8} {:>10}'.format(
+        'payload', 'stdlib', 'orjson', 'speedup', 'bytes'))
+    for name, payload in payloads(count).items():
+        expected, slow = run(stdlib, payload, rounds)
+        body, quick = run(fast, payload, rounds)
+        assert body == expected, name
+        print('{:<24} {:>10.1f} {:>10.1f} {:>7.1f}x {:>10}'.format(
+            name, slow, quick, slow / quick, len(body)))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
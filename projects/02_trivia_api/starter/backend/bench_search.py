@@ -0,0 +1,96 @@
+'''
+Benchmark of question search over a generated corpus.
+
+Compares the old ILIKE '%term%' scan with find_questions(), which uses the
+GIN full text and pg_trgm indexes on PostgreSQL and the in-memory inverted
+and trigram indexes elsewhere.  'itle' and 'zebra' match no word prefix, so
+they take the substring fallback.  Uses a throwaway sqlite database unless
+DATABASE_URL points at an (empty, disposable) PostgreSQL database.
+
+    python bench_search.py [questions] [rounds]
+'''
+import os
+import random
+import sys
+import tempfile
+import time
+
+from flask import Flask
+
+from models import db, setup_db, Question
+from search import setup_search, find_questions, question_index, \
+    question_trigrams
+
+WORDS = ('what which who where when is the was of in first largest river '
+         'country actor movie title painter invented capital world cup '
+         'ocean planet element author novel band album year city king '
+         'queen war team sport prize science art history geography').split()
+TERMS = ['title', 'capital city', 'novel', 'itle', 'zebra']
+
+
+def seed(count, chunk=50000):
+    rng = random.Random(0)
+    for start in range(0, count, chunk):
+        rows = [{'question': ' '.join(rng.choice(WORDS)
+                                      for _ in range(rng.randint(5, 12))),
+                 'answer': 'answer', 'category': rng.randint(1, 6),
+                 'difficulty': rng.randint(1, 5)}
+                for _ in range(min(chunk, count - start))]
+        db.session.execute(Question.__table__.insert(), rows)
+        db.session.commit()
+
+
+def ilike_search(term, page=1, per_page=10):
+    query = Question.query.filter(
+        Question.question.ilike('%{}%'.format(term))).order_by(Question.id)
+    return query.offset((page - 1) * per_page).limit(per_page).all(), \
+        query.count()
+
+
+def best_of(rounds, func):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def main(count=1000000, rounds=3):
+    path = None
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        database_url = 'sqlite:///' + path
+    app = Flask(__name__)
+    setup_db(app, database_url)
+    try:
+        with app.app_context():
+            start = time.perf_counter()
+            seed(count)
+            print('seeded {} questions in {:.1f} s'.format(
+                count, time.perf_counter() - start))
+            setup_search(app)
+            if db.engine.dialect.name != 'postgresql':
+                start = time.perf_counter()
+                question_index.build()
+                question_trigrams.build()
+                print('built inverted and trigram indexes in {:.1f} s'.format(
+                    time.perf_counter() - start))
+            for term in TERMS:
+                scan = best_of(rounds, lambda: ilike_search(term))
+                indexed = best_of(rounds, lambda: find_questions(term))
+                total = find_questions(term)[1]
+                print('{:14} {:8} hits   ilike: {:9.1f} ms   '
+                      'index: {:9.1f} ms'.format(repr(term), total, scan,
+                                                 indexed))
+    finally:
+        if path is not None:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:3]]
+    main(*args)
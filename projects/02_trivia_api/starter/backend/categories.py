@@ -0,0 +1,73 @@
+import threading
+import time
+from collections import namedtuple
+
+from sqlalchemy import event
+
+from models import Category
+
+'''
+Category cache
+
+Categories almost never change, so they are read once into a versioned
+snapshot shared by /categories, /questions and the quiz.  The snapshot is
+replaced when a category is written through the ORM, when invalidate() is
+called, or after CATEGORY_CACHE_TTL seconds to pick up writes made by
+other processes.  Hit and miss counters are kept for monitoring.
+'''
+CATEGORY_CACHE_TTL = 300
+
+'''
+CategorySnapshot
+    version - increases every time the snapshot is rebuilt
+    categories - {category id: type}, shared between requests, read only
+'''
+CategorySnapshot = namedtuple('CategorySnapshot', ['version', 'categories'])
+
+
+class CategoryCache:
+    def __init__(self, ttl=CATEGORY_CACHE_TTL):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._version = 0
+        self._snapshot = None
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        snapshot = self._snapshot
+        if snapshot is not None and time.time() - self._loaded_at <= self.ttl:
+            self.hits += 1
+            return snapshot
+        with self._lock:
+            self.misses += 1
+            categories = {}
+            for category in Category.query.order_by(Category.id).all():
+                categories[category.id] = category.type
+            self._version += 1
+            self._snapshot = CategorySnapshot(self._version, categories)
+            self._loaded_at = time.time()
+            return self._snapshot
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'version': snapshot.version if snapshot else None,
+            'size': len(snapshot.categories) if snapshot else 0
+        }
+
+
+category_cache = CategoryCache()
+
+
+@event.listens_for(Category, 'after_insert')
+@event.listens_for(Category, 'after_update')
+@event.listens_for(Category, 'after_delete')
+def invalidate_categories(mapper, connection, target):
+    category_cache.invalidate()
@@ -0,0 +1,185 @@
+import gzip
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+'''
+Response compression
+
+init_app(app) compresses JSON and text responses of COMPRESS_MIN_SIZE
+bytes or more with Brotli or gzip, whichever the client's Accept-Encoding
+prefers (Brotli on a tie, and only if the brotli package is installed), at
+the fast COMPRESS_BR_QUALITY / COMPRESS_LEVEL; smaller bodies gain less
+than the CPU they cost.  A body with a strong ETag is compressed once per
+encoding and kept in an LRU cache of COMPRESS_CACHE_SIZE entries, and
+streamed bodies are compressed as they are sent.  Compressed responses
+carry Vary: Accept-Encoding and a weak ETag, which If-None-Match still
+matches, so conditional requests keep returning 304.
+'''
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+COMPRESS_BR_QUALITY = int(os.environ.get('COMPRESS_BR_QUALITY', 5))
+COMPRESS_CACHE_SIZE = int(os.environ.get('COMPRESS_CACHE_SIZE', 256))
+# streamed bodies are flushed after the first chunk and then every 16KB
+STREAM_FLUSH_SIZE = 16 * 1024
+
+COMPRESSIBLE_TYPES = {'text/html', 'text/css', 'text/plain',
+                      'text/javascript', 'application/javascript',
+                      'application/json', 'application/xml',
+                      'image/svg+xml'}
+
+
+def encodings():
+    # in order of preference
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate(accept_encodings):
+    '''
+    negotiate(request.accept_encodings)
+        the preferred encoding the client accepts, or None for identity
+    '''
+    best, best_quality = None, 0
+    for coding in encodings():
+        quality = accept_encodings[coding]
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def compress(data, coding, level):
+    if coding == 'br':
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def compress_stream(source, chunks, coding, level,
+                    flush_size=STREAM_FLUSH_SIZE):
+    '''
+    compress_stream(source, chunks, coding, level)
+        compresses an iterable of byte chunks; the first chunk is flushed at
+        once, later ones whenever flush_size bytes of them are pending
+    '''
+    if coding == 'br':
+        compressor = brotli.Compressor(quality=level)
+        process, flush = compressor.process, compressor.flush
+        finish = compressor.finish
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED,
+                                      16 + zlib.MAX_WBITS)
+        process, finish = compressor.compress, compressor.flush
+
+        def flush():
+            return compressor.flush(zlib.Z_SYNC_FLUSH)
+    try:
+        pending = flush_size
+        for chunk in chunks:
+            data = process(chunk)
+            pending += len(chunk)
+            if pending >= flush_size:
+                data += flush()
+                pending = 0
+            if data:
+                yield data
+        yield finish()
+    finally:
+        if hasattr(source, 'close'):
+            source.close()
+
+
+class CompressedCache:
+    '''
+    CompressedCache
+        LRU of compressed bodies, keyed by (strong ETag, encoding)
+    '''
+    def __init__(self, maxsize=COMPRESS_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, key, body):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+compressed_cache = CompressedCache()
+
+
+def encoded(response, coding):
+    response.headers['Content-Encoding'] = coding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def init_app(app):
+    config = app.config
+    config.setdefault('COMPRESS_MIN_SIZE', COMPRESS_MIN_SIZE)
+    config.setdefault('COMPRESS_LEVEL', COMPRESS_LEVEL)
+    config.setdefault('COMPRESS_BR_QUALITY', COMPRESS_BR_QUALITY)
+
+    @app.after_request
+    def compress_response(response):
+        if response.status_code < 200 or \
+                response.status_code in (204, 206, 304) or \
+                'Content-Encoding' in response.headers or \
+                response.mimetype not in COMPRESSIBLE_TYPES or \
+                response.direct_passthrough:
+            return response
+        response.vary.add('Accept-Encoding')
+        coding = negotiate(request.accept_encodings)
+        if coding is None:
+            return response
+        level = config['COMPRESS_BR_QUALITY'] if coding == 'br' \
+            else config['COMPRESS_LEVEL']
+
+        if response.is_streamed:
+            source = response.response
+            response.response = compress_stream(
+                source, response.iter_encoded(), coding, level)
+            response.headers.pop('Content-Length', None)
+            encoded(response, coding)
+            return response
+
+        data = response.get_data()
+        if len(data) < config['COMPRESS_MIN_SIZE']:
+            return response
+        etag, weak = response.get_etag()
+        key = (etag, coding) if etag and not weak else None
+        body = compressed_cache.get(key) if key else None
+        if body is None:
+            body = compress(data, coding, level)
+            if key:
+                compressed_cache.put(key, body)
+        if len(body) >= len(data):
+            return response
+        response.set_data(body)
+        encoded(response, coding)
+        return response
+
+    return compressed_cache
@@ -1,25 +1,69 @@
 from flask import Flask, request, abort, jsonify
 from flask_cors import CORS
-import random
-
-from models import setup_db, Question, Category
+import click
+import time
+
+from models import setup_db, db, Question
+from engine import pool_stats
+import instrumentation
+import fastjson
+import compression
+from search import setup_search, find_questions
+from quiz import question_sampler
+from categories import category_cache
+from importer import IMPORT_CHUNK_SIZE, IMPORT_FORMATS, read_records, \
+    import_questions
 
 QUESTIONS_PER_PAGE = 10
+# seconds the total question count is trusted before it is counted again
+QUESTION_COUNT_TTL = 30
 curr_category = None
+question_count = {'value': None, 'counted_at': 0}
+
+
+def paginate(request, query):
+    '''
+    Fetches one page of the query, ordered by question id, in the database.
+    ?page=n uses LIMIT/OFFSET; ?after_id=n starts after the given question
+    id instead, which stays fast however deep the page is.  Pages are
+    numbered from 1; a lower page number is not found.
+    '''
+    after_id = request.args.get('after_id', None, type=int)
+    if after_id is not None:
+        query = query.filter(Question.id > after_id).order_by(Question.id)
+    else:
+        page = request.args.get('page', 1, type=int)
+        if page < 1:
+            abort(404)
+        query = query.order_by(Question.id).offset(
+            (page - 1) * QUESTIONS_PER_PAGE)
+    selection = query.limit(QUESTIONS_PER_PAGE).all()
+    return [question.format() for question in selection]
+
 
+def count_questions():
+    now = time.time()
+    if question_count['value'] is None or \
+            now - question_count['counted_at'] > QUESTION_COUNT_TTL:
+        question_count['value'] = Question.query.count()
+        question_count['counted_at'] = now
+    return question_count['value']
 
-def paginate(request, selection):
-    page = request.args.get('page', 1, type=int)
-    start = (page - 1) * QUESTIONS_PER_PAGE
-    end = start + QUESTIONS_PER_PAGE
-    questions = [question.format() for question in selection]
-    return questions[start:end]
+
+def invalidate_question_count():
+    question_count['value'] = None
 
 
 def create_app(test_config=None):
     # create and configure the app
     app = Flask(__name__)
+    fastjson.init_app(app)
     setup_db(app)
+    setup_search(app)
+    instrumentation.init_app(app, gauges=lambda: {
+        'db_pool_' + name: value
+        for name, value in pool_stats(db.engine).items()})
+    compression.init_app(app)
 
     CORS(app)
 
@@ -32,10 +76,9 @@ def create_app(test_config=None):
 
     @app.route('/categories')
     def get_categories():
-        categories = Category.query.order_by(Category.id).all()
-        formatted_categories = format_categories(categories)
+        formatted_categories = category_cache.get().categories
 
-        if len(categories) == 0:
+        if len(formatted_categories) == 0:
             abort(404)
 
         return jsonify({
@@ -44,25 +87,31 @@ def create_app(test_config=None):
             'total_categories': len(formatted_categories)
         })
 
-    def format_categories(categories):
-        cat_dict = {}
-        for cat in categories:
-            cat_dict[cat.id] = cat.type
-        return cat_dict
+    @app.route('/categories/cache')
+    def get_category_cache_stats():
+        return jsonify({
+            'success': True,
+            'cache': category_cache.stats()
+        })
+
+    @app.route('/metrics/pool')
+    def get_pool_stats():
+        return jsonify({
+            'success': True,
+            'pool': pool_stats(db.engine)
+        })
 
     @app.route('/questions')
     def getQuestions():
-        categories = Category.query.order_by(Category.id).all()
-        formatted_categories = format_categories(categories)
-        questions = Question.query.order_by(Question.id).all()
-        current_questions = paginate(request, questions)
+        formatted_categories = category_cache.get().categories
+        current_questions = paginate(request, Question.query)
 
         if len(current_questions) == 0:
             abort(404)
 
         return jsonify({
             'success': True,
-            'total_questions': len(questions),
+            'total_questions': count_questions(),
             'questions': current_questions,
             'current_category': curr_category,
             'categories': formatted_categories
@@ -77,6 +126,7 @@ def create_app(test_config=None):
                 abort(404)
 
             question.delete()
+            invalidate_question_count()
 
             return jsonify({
                 'success': True,
@@ -102,6 +152,7 @@ def create_app(test_config=None):
                                         int(category),
                                         int(difficulty))
                 new_question.insert()
+                invalidate_question_count()
                 return jsonify({
                     'success': True,
                     'added': new_question.format()
@@ -112,6 +163,43 @@ def create_app(test_config=None):
         else:
             abort(400)
 
+    @app.route('/questions/import', methods=['POST'])
+    def bulk_import_questions():
+        default_format = 'csv' if request.mimetype == 'text/csv' else 'jsonl'
+        format = request.args.get('format', default_format)
+        chunk_size = request.args.get('chunk_size', IMPORT_CHUNK_SIZE,
+                                      type=int)
+        if format not in IMPORT_FORMATS or chunk_size < 1:
+            abort(400)
+
+        report = import_questions(read_records(request.stream, format),
+                                  chunk_size)
+        invalidate_question_count()
+        return jsonify({
+            'success': True,
+            'inserted': report['inserted'],
+            'rejected': report['rejected'],
+            'batches': report['batches']
+        })
+
+    @app.cli.command('import-questions')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'format', type=click.Choice(IMPORT_FORMATS),
+                  help='defaults to csv for .csv files, jsonl otherwise')
+    @click.option('--chunk-size', default=IMPORT_CHUNK_SIZE,
+                  show_default=True, type=click.IntRange(min=1))
+    def import_questions_command(path, format, chunk_size):
+        """Bulk import questions from a JSON Lines or CSV file."""
+        format = format or ('csv' if path.endswith('.csv') else 'jsonl')
+        with open(path, 'rb') as f:
+            report = import_questions(read_records(f, format), chunk_size)
+        for batch in report['batches']:
+            for error in batch['errors']:
+                click.echo('batch {}: {}'.format(batch['batch'], error),
+                           err=True)
+        click.echo('inserted {inserted}, rejected {rejected}'.format(
+            **report))
+
     @app.route('/questions/search', methods=['POST'])
     def search_questions():
         body = request.get_json()
@@ -119,13 +207,15 @@ def create_app(test_config=None):
             abort(400)
 
         search_term = body.get('searchTerm', '')
-        questions = Question.query.order_by(Question.id).filter(
-            Question.question.ilike('%{}%'.format(search_term))).all()
-        result_questions = paginate(request, questions)
+        page = request.args.get('page', 1, type=int)
+        if page < 1:
+            abort(404)
+        questions, total = find_questions(search_term, page,
+                                          QUESTIONS_PER_PAGE)
         return jsonify({
             'success': True,
-            'questions': result_questions,
-            'total_questions': len(questions)
+            'questions': [question.format() for question in questions],
+            'total_questions': total
         })
 
     @app.route('/categories/<int:category_id>/questions')
@@ -147,6 +237,9 @@ def create_app(test_config=None):
             abort(400)
 
         prev_questions = body.get('previous_questions', [])
+        if not isinstance(prev_questions, list) or \
+                not all(isinstance(id, int) for id in prev_questions):
+            abort(400)
         if len(prev_questions) > 4:
             return jsonify({
                 'success': True,
@@ -157,25 +250,17 @@ def create_app(test_config=None):
         if category:
             category_id = int(category['id'])
 
-        if category_id > 1:
-            questions = Question.query.filter(Question.category ==
-                                              category_id).all()
+        if category_id <= 1:
+            question = question_sampler.sample(None, prev_questions)
+        elif category_id in category_cache.get().categories:
+            question = question_sampler.sample(category_id, prev_questions)
         else:
-            questions = Question.query.all()
+            question = None
 
-        if len(questions) > len(prev_questions):
-            curr_questions = \
-              [q for q in questions if q.id not in prev_questions]
-            random_question = random.choice(curr_questions)
-            return jsonify({
-                'success': True,
-                'question': random_question.format()
-            })
-        else:
-            return jsonify({
-                'success': True,
-                'question': None
-            })
+        return jsonify({
+            'success': True,
+            'question': question.format() if question else None
+        })
 
     @app.errorhandler(400)
     def bad_request(error):
@@ -0,0 +1,163 @@
+import csv
+import io
+import json
+
+from models import db, Question
+from categories import category_cache
+from search import question_index
+from quiz import question_sampler
+
+IMPORT_CHUNK_SIZE = 1000
+IMPORT_FORMATS = ('jsonl', 'csv')
+IMPORT_COLUMNS = ('question', 'answer', 'category', 'difficulty')
+
+'''
+Bulk question import
+
+Reads questions from JSON Lines (one object per line) or CSV (with a
+question,answer,category,difficulty header) and inserts them in chunks,
+one transaction per chunk: a multi-row executemany insert, or COPY on
+PostgreSQL.  Invalid records are skipped and a failed chunk is rolled back,
+both are reported per batch and the import carries on with the next chunk.
+'''
+
+
+def decode_lines(lines, invalid):
+    '''
+    decode_lines(lines, invalid)
+        decodes UTF-8 byte lines, replacing bad bytes; the numbers of the
+        lines that had any are added to the invalid set
+    '''
+    for number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            try:
+                line = line.decode('utf-8')
+            except UnicodeDecodeError:
+                invalid.add(number)
+                line = line.decode('utf-8', errors='replace')
+        yield line
+
+
+def read_records(stream, format='jsonl'):
+    '''
+    read_records(stream, format)
+        yields (record number, record or error message) from a text or
+        UTF-8 byte stream
+    '''
+    invalid = set()
+    lines = decode_lines(stream, invalid)
+    if format == 'csv':
+        reader = csv.DictReader(lines)
+        first_line = reader.line_num + 1
+        for number, row in enumerate(reader, start=1):
+            bad = sorted(invalid.intersection(
+                range(first_line, reader.line_num + 1)))
+            first_line = reader.line_num + 1
+            if bad:
+                yield number, 'invalid utf-8 on line {}'.format(bad[0])
+            else:
+                yield number, row
+        return
+    for number, line in enumerate(lines, start=1):
+        if number in invalid:
+            yield number, 'invalid utf-8 on line {}'.format(number)
+            continue
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as e:
+            yield number, 'invalid json: {}'.format(e)
+
+
+def text_field(record, name):
+    value = record.get(name)
+    if value is not None and not isinstance(value, str):
+        raise ValueError('{} must be a string'.format(name))
+    return (value or '').strip()
+
+
+def validate(record, categories):
+    if not isinstance(record, dict):
+        raise ValueError(record if isinstance(record, str)
+                         else 'record must be an object')
+    question = text_field(record, 'question')
+    answer = text_field(record, 'answer')
+    if not question or not answer:
+        raise ValueError('question and answer are required')
+    try:
+        category = int(record.get('category'))
+        difficulty = int(record.get('difficulty'))
+    except (TypeError, ValueError):
+        raise ValueError('category and difficulty must be integers')
+    if category not in categories:
+        raise ValueError('unknown category {}'.format(category))
+    return {
+        'question': question,
+        'answer': answer,
+        'category': category,
+        'difficulty': difficulty
+    }
+
+
+def insert_rows(rows):
+    if db.engine.dialect.name == 'postgresql':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([row[column] for column in IMPORT_COLUMNS])
+        buffer.seek(0)
+        cursor = db.session.connection().connection.cursor()
+        cursor.copy_expert('COPY questions ({}) FROM STDIN WITH CSV'.format(
+            ', '.join(IMPORT_COLUMNS)), buffer)
+    else:
+        db.session.execute(Question.__table__.insert(), rows)
+
+
+def import_questions(records, chunk_size=IMPORT_CHUNK_SIZE):
+    '''
+    import_questions(records, chunk_size)
+        inserts the (record number, record) pairs from read_records()
+        returns a report of the inserted and rejected records per batch
+    '''
+    categories = category_cache.get().categories
+    report = {'inserted': 0, 'rejected': 0, 'batches': []}
+
+    def flush(rows, numbers, errors):
+        batch = {'batch': len(report['batches']) + 1, 'inserted': 0,
+                 'errors': errors}
+        if rows:
+            try:
+                insert_rows(rows)
+                db.session.commit()
+                batch['inserted'] = len(rows)
+            except Exception as e:
+                db.session.rollback()
+                batch['errors'].append({
+                    'records': [numbers[0], numbers[-1]],
+                    'error': str(e).splitlines()[0]
+                })
+        report['inserted'] += batch['inserted']
+        report['rejected'] += len(rows) - batch['inserted'] + \
+            len([error for error in errors if 'record' in error])
+        report['batches'].append(batch)
+
+    rows, numbers, errors = [], [], []
+    for number, record in records:
+        try:
+            rows.append(validate(record, categories))
+            numbers.append(number)
+        except ValueError as e:
+            errors.append({'record': number, 'error': str(e)})
+        if len(rows) + len(errors) >= chunk_size:
+            flush(rows, numbers, errors)
+            rows, numbers, errors = [], [], []
+    if rows or errors:
+        flush(rows, numbers, errors)
+
+    # the rows bypassed the ORM, so the in-memory indexes did not see them
+    if report['inserted']:
+        question_index.clear()
+        question_sampler.clear()
+    return report
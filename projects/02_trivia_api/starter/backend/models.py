@@ -1,6 +1,9 @@
 from sqlalchemy import Column, String, Integer
 from flask_sqlalchemy import SQLAlchemy
 
+from engine import engine_options
+from writer import group_writer
+
 database_name = "trivia"
 database_path = "postgres://{}/{}".format('localhost:5432', database_name)
 
@@ -15,9 +18,11 @@ setup_db(app)
 def setup_db(app, database_path=database_path):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(database_path)
     db.app = app
     db.init_app(app)
     db.create_all()
+    group_writer.init_app(app, db)
 
 
 '''
@@ -41,14 +46,26 @@ class Question(db.Model):
         self.category = category
         self.difficulty = difficulty
 
-    def insert(self):
+    '''
+    insert(), update() and delete() commit at once, or through the
+    group-commit writer when it is enabled (see writer.py): they then wait
+    for the batch holding the change to commit, unless wait=False, and
+    return its future
+    '''
+    def insert(self, wait=True):
+        if group_writer.enabled:
+            return group_writer.insert(self, wait)
         db.session.add(self)
         db.session.commit()
 
-    def update(self):
+    def update(self, wait=True):
+        if group_writer.enabled:
+            return group_writer.update(self, wait)
         db.session.commit()
 
-    def delete(self):
+    def delete(self, wait=True):
+        if group_writer.enabled:
+            return group_writer.delete(self, wait)
         db.session.delete(self)
         db.session.commit()
 
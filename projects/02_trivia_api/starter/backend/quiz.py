@@ -0,0 +1,151 @@
+import random
+import threading
+import time
+
+from sqlalchemy import event
+
+from models import db, Question
+
+'''
+Quiz question sampler
+
+Keeps the question ids of every category in memory so a quiz question can
+be picked without loading the questions table.  The ids are loaded on
+first use and kept up to date as questions are inserted, updated and
+deleted, so the cost of a pick does not depend on the size of the table.
+They are reloaded every QUIZ_IDS_TTL seconds to pick up questions written
+by other processes.
+'''
+QUIZ_IDS_TTL = 300
+
+
+'''
+IdSet
+    set of ids supporting O(1) add, remove and random choice
+    removal swaps the last id into the removed slot
+'''
+
+
+class IdSet:
+    def __init__(self):
+        self._ids = []
+        self._positions = {}
+
+    def add(self, id):
+        if id not in self._positions:
+            self._positions[id] = len(self._ids)
+            self._ids.append(id)
+
+    def remove(self, id):
+        position = self._positions.pop(id, None)
+        if position is None:
+            return
+        last = self._ids.pop()
+        if last != id:
+            self._ids[position] = last
+            self._positions[last] = position
+
+    def choice(self, exclude=()):
+        '''
+        choice(exclude)
+            a random id not in exclude, or None if every id is excluded
+            draws at random first and only scans when most ids are excluded
+        '''
+        if not self._ids:
+            return None
+        for _ in range(len(exclude) + 8):
+            id = random.choice(self._ids)
+            if id not in exclude:
+                return id
+        remaining = [id for id in self._ids if id not in exclude]
+        return random.choice(remaining) if remaining else None
+
+    def __len__(self):
+        return len(self._ids)
+
+
+class QuestionSampler:
+    def __init__(self, ttl=QUIZ_IDS_TTL):
+        self.ttl = ttl
+        self._all = IdSet()
+        self._categories = {}
+        self._category_of = {}
+        self._loaded = False
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            self._all = IdSet()
+            self._categories = {}
+            self._category_of = {}
+            rows = db.session.query(Question.id, Question.category)
+            for question_id, category in rows.yield_per(10000):
+                self._add(question_id, category)
+            self._loaded = True
+            self._loaded_at = time.time()
+
+    def clear(self):
+        with self._lock:
+            self._loaded = False
+
+    def _add(self, question_id, category):
+        self._all.add(question_id)
+        self._categories.setdefault(category, IdSet()).add(question_id)
+        self._category_of[question_id] = category
+
+    def _remove(self, question_id):
+        self._all.remove(question_id)
+        if question_id in self._category_of:
+            category = self._category_of.pop(question_id)
+            self._categories[category].remove(question_id)
+
+    def add(self, question_id, category):
+        with self._lock:
+            if self._loaded:
+                self._remove(question_id)
+                self._add(question_id, category)
+
+    def remove(self, question_id):
+        with self._lock:
+            if self._loaded:
+                self._remove(question_id)
+
+    def sample(self, category=None, exclude=()):
+        '''
+        sample(category, exclude)
+            a random question of the category (any category if None)
+            whose id is not in exclude, or None when there is none left
+        '''
+        if not self._loaded or time.time() - self._loaded_at > self.ttl:
+            self.load()
+        exclude = set(exclude)
+        # a question may be deleted by another process after its id was read
+        for _ in range(3):
+            with self._lock:
+                if category is None:
+                    ids = self._all
+                else:
+                    ids = self._categories.get(category, IdSet())
+                question_id = ids.choice(exclude)
+            if question_id is None:
+                return None
+            question = Question.query.get(question_id)
+            if question is not None:
+                return question
+            self.remove(question_id)
+        return None
+
+
+question_sampler = QuestionSampler()
+
+
+@event.listens_for(Question, 'after_insert')
+@event.listens_for(Question, 'after_update')
+def track_question(mapper, connection, target):
+    question_sampler.add(target.id, target.category)
+
+
+@event.listens_for(Question, 'after_delete')
+def untrack_question(mapper, connection, target):
+    question_sampler.remove(target.id)
@@ -0,0 +1,310 @@
+import re
+import threading
+from bisect import bisect_left
+
+from sqlalchemy import event, exc, func, literal_column
+
+from models import db, Question
+
+SEARCH_CONFIG = 'english'
+TOKEN_RE = re.compile(r'\w+')
+
+'''
+Question search
+
+On PostgreSQL questions are matched with a tsvector/tsquery full text
+search backed by a GIN index, ranked with ts_rank and paginated in the
+database.  Other databases (sqlite in tests) use an in-memory inverted
+index of the question text instead, kept up to date as questions are
+inserted, updated and deleted.
+
+Every word of the search term has to match the start of a word in the
+question, so partial words still find questions ("tit" finds "title").
+When nothing matches that way, because the term is part of a word
+("itle" in "title"), only stop words, which PostgreSQL leaves out of the
+tsquery, or has no words at all ("???"), the questions containing the term
+are returned instead, in id order: on PostgreSQL with ILIKE backed by a
+pg_trgm GIN index, elsewhere with an in-memory trigram index.  A blank term
+lists every question.
+'''
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def setup_search(app):
+    with app.app_context():
+        if db.engine.dialect.name == 'postgresql':
+            create_search_index()
+
+
+def create_search_index():
+    db.session.execute(
+        "CREATE INDEX IF NOT EXISTS ix_questions_question_fts ON questions "
+        "USING GIN (to_tsvector('{}', question))".format(SEARCH_CONFIG))
+    db.session.commit()
+    try:
+        db.session.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        db.session.execute(
+            "CREATE INDEX IF NOT EXISTS ix_questions_question_trgm ON "
+            "questions USING GIN (question gin_trgm_ops)")
+        db.session.commit()
+    except exc.DBAPIError:
+        # pg_trgm needs privileges the app may not have; ILIKE still works
+        db.session.rollback()
+
+
+def find_questions(term, page=1, per_page=10):
+    '''
+    find_questions(term, page, per_page)
+        returns one page of the questions matching term, best match first,
+        and the total number of matches
+    '''
+    term = '' if term is None else str(term)
+    offset = (page - 1) * per_page
+    if not term.strip():
+        query = Question.query.order_by(Question.id)
+        return query.offset(offset).limit(per_page).all(), query.count()
+    terms = tokenize(term)
+    postgresql = db.engine.dialect.name == 'postgresql'
+    if terms:
+        if postgresql:
+            questions, total = _search_postgresql(terms, offset, per_page)
+        else:
+            questions, total = _search_index(terms, offset, per_page)
+        if total:
+            return questions, total
+    if postgresql:
+        return _search_substring(term.strip(), offset, per_page)
+    return _search_trigrams(term.strip(), offset, per_page)
+
+
+def _search_postgresql(terms, offset, per_page):
+    # the config is inlined so the expression matches the GIN index
+    config = literal_column("'{}'".format(SEARCH_CONFIG))
+    document = func.to_tsvector(config, Question.question)
+    query = func.to_tsquery(config, ' & '.join(t + ':*' for t in terms))
+    matches = Question.query.filter(document.op('@@')(query))
+    questions = matches.order_by(func.ts_rank(document, query).desc(),
+                                 Question.id) \
+        .offset(offset).limit(per_page).all()
+    return questions, matches.count()
+
+
+def _search_substring(term, offset, per_page):
+    pattern = '%{}%'.format(term.replace('\\', '\\\\')
+                            .replace('%', '\\%').replace('_', '\\_'))
+    matches = Question.query.filter(Question.question.ilike(pattern,
+                                                            escape='\\'))
+    questions = matches.order_by(Question.id) \
+        .offset(offset).limit(per_page).all()
+    return questions, matches.count()
+
+
+def _fetch_page(ids):
+    if not ids:
+        return []
+    rows = {q.id: q for q in Question.query.filter(Question.id.in_(ids))}
+    return [rows[i] for i in ids if i in rows]
+
+
+def _search_index(terms, offset, per_page):
+    ranked = question_index.search(terms)
+    ids = [question_id for question_id, score in
+           ranked[offset:offset + per_page]]
+    return _fetch_page(ids), len(ranked)
+
+
+def _search_trigrams(term, offset, per_page):
+    ids = question_trigrams.search(term)
+    return _fetch_page(ids[offset:offset + per_page]), len(ids)
+
+
+'''
+InvertedIndex
+    in-memory word -> {question id: occurrences} index
+    built from the questions table on first use; prefix lookups bisect a
+    sorted copy of the vocabulary, rebuilt only after the vocabulary grows
+'''
+
+
+class InvertedIndex:
+    def __init__(self):
+        self._postings = {}
+        self._documents = {}
+        self._vocabulary = None
+        self._built = False
+        self._lock = threading.RLock()
+
+    def build(self):
+        with self._lock:
+            self.clear()
+            rows = db.session.query(Question.id, Question.question)
+            for question_id, text in rows.yield_per(10000):
+                self._add(question_id, text)
+            self._built = True
+
+    def clear(self):
+        with self._lock:
+            self._postings = {}
+            self._documents = {}
+            self._vocabulary = None
+            self._built = False
+
+    def _add(self, question_id, text):
+        words = tokenize(text)
+        self._documents[question_id] = words
+        for word in words:
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = self._postings[word] = {}
+                self._vocabulary = None
+            postings[question_id] = postings.get(question_id, 0) + 1
+
+    def add(self, question_id, text):
+        with self._lock:
+            if self._built:
+                self.remove(question_id)
+                self._add(question_id, text)
+
+    def remove(self, question_id):
+        with self._lock:
+            for word in self._documents.pop(question_id, ()):
+                postings = self._postings.get(word)
+                if postings is not None:
+                    postings.pop(question_id, None)
+
+    def _expand(self, prefix):
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._postings)
+        vocabulary = self._vocabulary
+        i = bisect_left(vocabulary, prefix)
+        while i < len(vocabulary) and vocabulary[i].startswith(prefix):
+            yield vocabulary[i]
+            i += 1
+
+    def search(self, terms):
+        '''
+        search(terms)
+            returns [(question id, score)] of the questions containing a word
+            starting with every term, highest score first
+        '''
+        with self._lock:
+            if not self._built:
+                self.build()
+            scores = None
+            for term in terms:
+                term_scores = {}
+                for word in self._expand(term):
+                    for question_id, count in self._postings[word].items():
+                        term_scores[question_id] = \
+                            term_scores.get(question_id, 0) + count
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {question_id: score + term_scores[question_id]
+                              for question_id, score in scores.items()
+                              if question_id in term_scores}
+                if not scores:
+                    return []
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+question_index = InvertedIndex()
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+'''
+TrigramIndex
+    in-memory trigram -> {question id} index of the lowercased question
+    text, for substring search where pg_trgm is not available
+    a term of three or more characters can only occur in questions holding
+    all of its trigrams, so only those are checked with a substring test;
+    shorter terms are checked against every question in memory
+'''
+
+
+class TrigramIndex:
+    def __init__(self):
+        self._postings = {}
+        self._texts = {}
+        self._built = False
+        self._lock = threading.RLock()
+
+    def build(self):
+        with self._lock:
+            self.clear()
+            rows = db.session.query(Question.id, Question.question)
+            for question_id, text in rows.yield_per(10000):
+                self._add(question_id, text)
+            self._built = True
+
+    def clear(self):
+        with self._lock:
+            self._postings = {}
+            self._texts = {}
+            self._built = False
+
+    def _add(self, question_id, text):
+        text = (text or '').lower()
+        self._texts[question_id] = text
+        for trigram in trigrams(text):
+            self._postings.setdefault(trigram, set()).add(question_id)
+
+    def add(self, question_id, text):
+        with self._lock:
+            if self._built:
+                self.remove(question_id)
+                self._add(question_id, text)
+
+    def remove(self, question_id):
+        with self._lock:
+            text = self._texts.pop(question_id, None)
+            if text is None:
+                return
+            for trigram in trigrams(text):
+                postings = self._postings.get(trigram)
+                if postings is not None:
+                    postings.discard(question_id)
+                    if not postings:
+                        del self._postings[trigram]
+
+    def search(self, term):
+        '''
+        search(term)
+            returns the ids of the questions containing term, ignoring
+            case, in id order
+        '''
+        term = term.lower()
+        with self._lock:
+            if not self._built:
+                self.build()
+            if len(term) < 3:
+                candidates = self._texts
+            else:
+                postings = [self._postings.get(trigram, set())
+                            for trigram in trigrams(term)]
+                postings.sort(key=len)
+                candidates = set.intersection(*postings)
+            return sorted(question_id for question_id in candidates
+                          if term in self._texts[question_id])
+
+
+question_trigrams = TrigramIndex()
+
+
+@event.listens_for(Question, 'after_insert')
+@event.listens_for(Question, 'after_update')
+def index_question(mapper, connection, target):
+    question_index.add(target.id, target.question)
+    question_trigrams.add(target.id, target.question)
+
+
+@event.listens_for(Question, 'after_delete')
+def unindex_question(mapper, connection, target):
+    question_index.remove(target.id)
+    question_trigrams.remove(target.id)
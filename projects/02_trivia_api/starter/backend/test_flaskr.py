@@ -1,9 +1,17 @@
 import unittest
+import gzip
 import json
+import re
+from flask import Flask, jsonify
 from flask_sqlalchemy import SQLAlchemy
 
+import compression
+import fastjson
+import instrumentation
 from flaskr import create_app
-from models import setup_db, Question
+from models import setup_db, db, Question
+from search import InvertedIndex, TrigramIndex, find_questions
+from writer import GroupCommitWriter
 
 
 class TriviaTestCase(unittest.TestCase):
@@ -37,6 +45,27 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['total_categories'], 6)
         self.assertTrue(data['categories'])
 
+    def test_category_cache_stats(self):
+        self.client().get('/categories')
+        self.client().get('/categories')
+        res = self.client().get('/categories/cache')
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertTrue(data['cache']['hits'] >= 1)
+        self.assertTrue(data['cache']['version'])
+        self.assertEqual(data['cache']['size'], 6)
+
+    def test_pool_stats(self):
+        self.client().get('/categories')
+        res = self.client().get('/metrics/pool')
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['pool']['pool'], 'MeteredQueuePool')
+        self.assertTrue(data['pool']['checkouts'] >= 1)
+        self.assertTrue(0 <= data['pool']['utilization'] <= 1)
+
     def test_get_paginated_questions(self):
         res = self.client().get('/questions')
         data = json.loads(res.data)
@@ -46,6 +75,47 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(['questions'])
         self.assertTrue(data['categories'])
 
+    def test_get_questions_after_id(self):
+        res = self.client().get('/questions')
+        first_page = json.loads(res.data)['questions']
+        res = self.client().get('/questions?after_id=' +
+                                str(first_page[-1]['id']))
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertTrue(data['questions'])
+        self.assertTrue(all(q['id'] > first_page[-1]['id']
+                            for q in data['questions']))
+
+    def test_get_questions_after_id_matches_page_two(self):
+        res = self.client().get('/questions')
+        last_id = json.loads(res.data)['questions'][-1]['id']
+        by_page = json.loads(self.client().get('/questions?page=2').data)
+        by_id = json.loads(self.client().get('/questions?after_id=' +
+                                             str(last_id)).data)
+        self.assertEqual(by_page['questions'], by_id['questions'])
+
+    def test_not_found_questions_after_last_id(self):
+        res = self.client().get('/questions?after_id=99999')
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['success'], False)
+
+    def test_not_found_questions_after_the_last_question(self):
+        with self.app.app_context():
+            last_id = db.session.query(db.func.max(Question.id)).scalar()
+        res = self.client().get('/questions?after_id=' + str(last_id))
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['success'], False)
+
+    def test_not_found_questions_page_below_one(self):
+        for page in ('0', '-1'):
+            res = self.client().get('/questions?page=' + page)
+            data = json.loads(res.data)
+            self.assertEqual(res.status_code, 404)
+            self.assertEqual(data['success'], False)
+
     def test_not_found_questions_beyond_page_range(self):
         res = self.client().get('/questions?page=99999')
         data = json.loads(res.data)
@@ -91,6 +161,71 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(len(data['questions']), 0)
         self.assertEqual(data['total_questions'], 0)
 
+    def test_search_questions_part_of_a_word(self):
+        res = self.client().post('/questions/search',
+                                 json={'searchTerm': 'itle'})
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        ids = [question['id'] for question in data['questions']]
+        # "title" and "entitled"
+        self.assertIn(5, ids)
+        self.assertIn(6, ids)
+
+    def test_search_questions_without_words(self):
+        res = self.client().post('/questions/search',
+                                 json={'searchTerm': '???'})
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['questions'], [])
+        self.assertEqual(data['total_questions'], 0)
+
+    def test_search_questions_non_string_term(self):
+        res = self.client().post('/questions/search',
+                                 json={'searchTerm': 5})
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        for question in data['questions']:
+            self.assertIn('5', question['question'])
+
+    def test_find_questions_prefix(self):
+        with self.app.app_context():
+            questions = find_questions('tit')[0]
+        ids = [question.id for question in questions]
+        self.assertIn(6, ids)
+        self.assertNotIn(5, ids)
+
+    def test_find_questions_stop_words(self):
+        with self.app.app_context():
+            questions, total = find_questions('the')
+        self.assertTrue(total)
+        for question in questions:
+            self.assertIn('the', question.question.lower())
+
+    def test_inverted_index(self):
+        index = InvertedIndex()
+        with self.app.app_context():
+            index.build()
+        index.add(100000, 'Which planet has the most moons?')
+        self.assertEqual(index.search(['plan', 'moon']), [(100000, 2)])
+        self.assertEqual(index.search(['lanet']), [])
+        index.remove(100000)
+        self.assertNotIn(100000, dict(index.search(['plan'])))
+
+    def test_trigram_index(self):
+        index = TrigramIndex()
+        with self.app.app_context():
+            index.build()
+        index.add(100000, 'Which planet has the most moons?')
+        self.assertIn(100000, index.search('LANET'))
+        self.assertIn(100000, index.search('s?'))
+        self.assertNotIn(100000, index.search('lanets'))
+        index.add(100000, 'Which star is closest?')
+        self.assertNotIn(100000, index.search('lanet'))
+        self.assertIn(100000, index.search('star'))
+        index.remove(100000)
+        self.assertNotIn(100000, index.search('star'))
+
     def test_questions_by_category_results(self):
         res = self.client().get('/categories/6/questions')
         data = json.loads(res.data)
@@ -126,6 +261,110 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['added']['category'], 3)
         self.assertEqual(data['added']['difficulty'], 3)
 
+    def test_import_questions(self):
+        body = '\n'.join([
+            json.dumps({'question': 'Imported question?', 'answer': 'Yes',
+                        'category': 1, 'difficulty': 1}),
+            '{not json',
+            json.dumps({'question': 'No answer?', 'category': 1,
+                        'difficulty': 1})
+        ])
+        res = self.client().post('/questions/import', data=body,
+                                 content_type='application/x-ndjson')
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['inserted'], 1)
+        self.assertEqual(data['rejected'], 2)
+        self.assertEqual(len(data['batches'][0]['errors']), 2)
+
+    def test_import_questions_csv(self):
+        body = 'question,answer,category,difficulty\n' \
+               'Imported from csv?,Yes,2,3\n'
+        res = self.client().post('/questions/import', data=body,
+                                 content_type='text/csv')
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['inserted'], 1)
+        self.assertEqual(data['rejected'], 0)
+
+    def test_import_questions_rejects_bad_fields(self):
+        body = b'\n'.join([
+            json.dumps({'question': 5, 'answer': 'Yes', 'category': 1,
+                        'difficulty': 1}).encode(),
+            b'{"question": "Caf\xe9?", "answer": "Yes", "category": 1, '
+            b'"difficulty": 1}',
+            json.dumps({'question': 'Still imported?', 'answer': 'Yes',
+                        'category': 1, 'difficulty': 1}).encode()
+        ])
+        res = self.client().post('/questions/import', data=body,
+                                 content_type='application/x-ndjson')
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['inserted'], 1)
+        self.assertEqual(data['rejected'], 2)
+        self.assertEqual(data['batches'][0]['errors'], [
+            {'record': 1, 'error': 'question must be a string'},
+            {'record': 2, 'error': 'invalid utf-8 on line 2'}
+        ])
+
+    def test_import_questions_bad_format(self):
+        res = self.client().post('/questions/import?format=xml', data='x')
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data['success'], False)
+
+    def test_group_commit_failure_fails_only_its_batch(self):
+        writer = GroupCommitWriter(max_delay=0.001)
+        writer.init_app(self.app, db, environ={'GROUP_COMMIT': '1'})
+        commit = writer._commit
+
+        def broken_commit(batch):
+            writer._commit = commit
+            raise RuntimeError('connection lost')
+        writer._commit = broken_commit
+        try:
+            with self.assertRaises(RuntimeError):
+                writer.insert(Question('Lost?', 'Yes', 1, 1))
+            question = Question('Committed?', 'Yes', 1, 1)
+            writer.insert(question)
+            self.assertTrue(question.id)
+            writer.delete(question)
+        finally:
+            writer.close()
+
+    def get_encoded(self, url, accept_encoding, min_size=0):
+        self.app.config['COMPRESS_MIN_SIZE'] = min_size
+        return self.client().get(url,
+                                 headers={'Accept-Encoding': accept_encoding})
+
+    def test_compression_uses_the_preferred_encoding(self):
+        body = self.client().get('/questions').data
+        res = self.get_encoded('/questions', 'gzip, br')
+        coding = compression.encodings()[0]
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.headers['Content-Encoding'], coding)
+        self.assertIn('Accept-Encoding', res.headers['Vary'])
+        if coding == 'br':
+            self.assertEqual(compression.brotli.decompress(res.data), body)
+        res = self.get_encoded('/questions', 'br;q=0.5, gzip')
+        self.assertEqual(res.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(res.data), body)
+
+    def test_compression_needs_an_accepted_encoding(self):
+        for accept_encoding in ('', 'identity', 'deflate', 'gzip;q=0'):
+            res = self.get_encoded('/questions', accept_encoding)
+            self.assertEqual(res.status_code, 200)
+            self.assertNotIn('Content-Encoding', res.headers)
+
+    def test_compression_threshold(self):
+        size = len(self.client().get('/questions').data)
+        res = self.get_encoded('/questions', 'gzip', min_size=size + 1)
+        self.assertNotIn('Content-Encoding', res.headers)
+        self.assertEqual(len(res.data), size)
+        res = self.get_encoded('/questions', 'gzip', min_size=size)
+        self.assertEqual(res.headers['Content-Encoding'], 'gzip')
+
     def test_add_question_bad_request(self):
         res = self.client().post('/questions', json={
             'question': 'What is the largest state east of the Mississippi Riv'
@@ -153,6 +392,154 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['message'], 'method not allowed')
         self.assertEqual(data['error'], 405)
 
+    def test_play_quiz_in_category(self):
+        res = self.client().post('/quizzes', json={
+            'previous_questions': [],
+            'quiz_category': {'type': 'Sports', 'id': 6}
+        })
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['question']['category'], 6)
+
+    def test_play_quiz_skips_previous_questions(self):
+        res = self.client().post('/quizzes', json={
+            'previous_questions': [10],
+            'quiz_category': {'type': 'Sports', 'id': 6}
+        })
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(data['question']['id'], 10)
+
+    def test_play_quiz_no_questions_left(self):
+        res = self.client().post('/quizzes', json={
+            'previous_questions': [10, 11],
+            'quiz_category': {'type': 'Sports', 'id': 6}
+        })
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['question'], None)
+
+    def test_400_play_quiz_invalid_previous_questions(self):
+        res = self.client().post('/quizzes', json={
+            'previous_questions': [{'id': 10}],
+            'quiz_category': {'type': 'Sports', 'id': 6}
+        })
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data['success'], False)
+
+    def scrape(self):
+        res = self.client().get('/metrics')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.mimetype, 'text/plain')
+        samples = {}
+        for line in res.get_data(as_text=True).splitlines():
+            if not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                samples[name] = float(value)
+        return samples
+
+    def test_metrics_count_requests_by_url_rule(self):
+        key = 'http_requests_total{method="GET",' \
+            'route="/categories/<int:category_id>/questions",status="200"}'
+        before = self.scrape().get(key, 0)
+        self.client().get('/categories/1/questions')
+        self.client().get('/categories/2/questions')
+        samples = self.scrape()
+        self.assertEqual(samples[key], before + 2)
+        self.assertIn('http_request_duration_seconds_count{method="GET",'
+                      'route="/categories/<int:category_id>/questions"}',
+                      samples)
+
+    def test_metrics_unmatched_route(self):
+        self.client().get('/no-such-page')
+        samples = self.scrape()
+        self.assertTrue(samples['http_requests_total{method="GET",'
+                                'route="(unmatched)",status="404"}'])
+
+    def test_server_timing(self):
+        res = self.client().get('/categories/1/questions')
+        self.assertRegex(res.headers['Server-Timing'],
+                         r'^app;dur=[0-9.]+, db;dur=[0-9.]+;'
+                         r'desc="[1-9][0-9]* queries"$')
+        # served from the category cache, without SQL
+        self.client().get('/categories')
+        res = self.client().get('/categories')
+        self.assertRegex(res.headers['Server-Timing'], r'^app;dur=[0-9.]+$')
+
+    def test_queries_per_request(self):
+        key = 'http_request_queries_sum{method="GET",' \
+            'route="/categories/<int:category_id>/questions"}'
+        before = self.scrape().get(key, 0)
+        res = self.client().get('/categories/1/questions')
+        queries = int(re.search(r'desc="(\d+) queries"',
+                                res.headers['Server-Timing']).group(1))
+        self.assertEqual(self.scrape()[key], before + queries)
+
+    def test_slow_queries_logged_and_counted(self):
+        route = '/categories/<int:category_id>/questions'
+        key = 'db_slow_queries_total{{route="{}"}}'.format(route)
+        before = self.scrape().get(key, 0)
+        slow_query_ms = instrumentation.metrics.slow_query_ms
+        instrumentation.metrics.slow_query_ms = 0
+        try:
+            with self.assertLogs('instrumentation', 'WARNING') as logs:
+                self.client().get('/categories/1/questions')
+        finally:
+            instrumentation.metrics.slow_query_ms = slow_query_ms
+        self.assertIn('in {}: SELECT '.format(route), logs.output[0])
+        self.assertEqual(self.scrape()[key], before + len(logs.output))
+
+
+@unittest.skipUnless(fastjson.orjson, 'orjson is not installed')
+class FastJSONTestCase(unittest.TestCase):
+    """This class represents the orjson encoder test case"""
+
+    def setUp(self):
+        self.stdlib = Flask('stdlib')
+        self.fast = Flask('fast')
+        fastjson.init_app(self.fast)
+
+    def assertSameBytes(self, payload, sort_keys=True):
+        bodies = []
+        for encoding_app in (self.stdlib, self.fast):
+            encoding_app.config['JSON_SORT_KEYS'] = sort_keys
+            with encoding_app.test_request_context():
+                bodies.append(jsonify(payload).get_data())
+        self.assertEqual(bodies[0], bodies[1])
+
+    def test_int_keys(self):
+        categories = {id: 'Category {}'.format(id) for id in range(1, 13)}
+        self.assertSameBytes({'success': True, 'categories': categories})
+        self.assertSameBytes({'success': True, 'categories': categories},
+                             sort_keys=False)
+        self.assertSameBytes({2: 'b', 10: 'a', -1: 'c'})
+
+    def test_non_ascii_text(self):
+        self.assertSameBytes({'answer': 'caf\xe9 na\xefve \xff \u0100 '
+                                        '\u201cquoted\u201d \u2013 \uffff'})
+
+    def test_astral_characters(self):
+        self.assertSameBytes({'answer': 'grin \U0001f600, \U00010000'})
+
+    def test_del(self):
+        self.assertSameBytes({'answer': 'a\x7fb', 'other': '\x7f\xe9'})
+
+    def test_tiny_and_huge_floats(self):
+        self.assertSameBytes({'values': [1e-05, 0.00001234, 5e-324, -2e-07,
+                                         0.0001, 1e16, 1.5e300, 1e15,
+                                         123456789012345.6]})
+
+    def test_big_ints(self):
+        self.assertSameBytes({'values': [2 ** 63, -2 ** 63 - 1, 2 ** 64,
+                                         10 ** 30, 2 ** 53 + 1]})
+
+    def test_words_like_exponents(self):
+        self.assertSameBytes({'answer': 're-elected', 'other': 'pre-1900',
+                              'more': ['e-mail', 'the 1e-5 setting']})
+
 
 # Make the tests conveniently executable
 if __name__ == "__main__":
@@ -0,0 +1,91 @@
+'''
+Microbenchmark of the requires_auth decorator overhead per request,
+with and without the verified-token cache.
+
+Signs a token with a throwaway RSA key, serves the matching public key
+from a local jwks.json and calls a decorated view inside a request context.
+
+    python bench_auth.py [iterations]
+'''
+import base64
+import json
+import os
+import sys
+import tempfile
+import time
+
+from Crypto.PublicKey import RSA
+from flask import Flask
+from jose import jwt
+
+from src.auth import auth
+
+
+def b64_int(value):
+    raw = value.to_bytes((value.bit_length() + 7) // 8, 'big')
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def make_token_and_jwks(kid='bench-key'):
+    key = RSA.generate(2048)
+    jwks = {'keys': [{
+        'kty': 'RSA',
+        'kid': kid,
+        'use': 'sig',
+        'n': b64_int(key.n),
+        'e': b64_int(key.e)
+    }]}
+    claims = {
+        'iss': 'https://' + auth.AUTH0_DOMAIN + '/',
+        'aud': auth.API_AUDIENCE,
+        'sub': 'bench|user',
+        'exp': int(time.time()) + 3600,
+        'permissions': ['get:drinks-detail']
+    }
+    token = jwt.encode(claims, key.exportKey('PEM').decode('ascii'),
+                       algorithm='RS256', headers={'kid': kid})
+    return token, jwks
+
+
+def run(view, app, token, iterations):
+    headers = {'Authorization': 'Bearer ' + token}
+    with app.test_request_context('/drinks-detail', headers=headers):
+        view()
+        start = time.perf_counter()
+        for _ in range(iterations):
+            view()
+        elapsed = time.perf_counter() - start
+    return elapsed / iterations * 1e6
+
+
+def main(iterations=2000):
+    token, jwks = make_token_and_jwks()
+    fd, path = tempfile.mkstemp(suffix='.json')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(jwks, f)
+    auth.jwks_cache = auth.JWKSCache('file://' + path)
+
+    app = Flask(__name__)
+
+    @auth.requires_auth('get:drinks-detail')
+    def view(payload):
+        return payload
+
+    try:
+        auth.token_cache.maxsize = 0
+        auth.token_cache.clear()
+        uncached = run(view, app, token, iterations)
+
+        auth.token_cache.maxsize = auth.TOKEN_CACHE_SIZE
+        cached = run(view, app, token, iterations)
+    finally:
+        os.remove(path)
+
+    print('iterations:      {}'.format(iterations))
+    print('uncached:        {:10.1f} us/request'.format(uncached))
+    print('cached:          {:10.1f} us/request'.format(cached))
+    print('speedup:         {:10.1f}x'.format(uncached / cached))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,69 @@
+'''
+Benchmark of response compression on the GET /drinks and /drinks-detail
+bodies: the bytes sent uncompressed, with gzip and with Brotli, and the CPU
+time to compress them at COMPRESS_LEVEL / COMPRESS_BR_QUALITY.
+
+The menu responses carry a strong ETag, so api.py compresses each of them
+once per encoding and serves the compressed copy from the cache until the
+menu changes; the last column is the cost of such a cached response.
+
+    python bench_compression.py [drinks] [rounds]
+'''
+import sys
+import time
+
+from flask import Flask
+
+from src import compression
+from bench_json import payloads
+
+
+def cpu_ms(func, rounds):
+    start = time.process_time()
+    for _ in range(rounds):
+        func()
+    return (time.process_time() - start) / rounds * 1000
+
+
+def main(count=1000, rounds=50):
+    app = Flask(__name__)
+    compression.init_app(app)
+    codings = compression.encodings()
+    bodies = {}
+    for name, payload in payloads(count).items():
+        with app.test_request_context():
+            bodies[name] = app.json_encoder(
+                separators=(',', ':'), sort_keys=True).encode(payload).encode()
+
+    print('{} drinks, {} rounds, encodings: {}'.format(
+        count, rounds, ', '.join(codings)))
+    print('{:<15} {:>9} {:>9} {:>9} {:>9} {:>9} {:>10}'.format(
+        'payload', 'identity', 'gzip', 'br', 'gzip ms', 'br ms',
+        'cached ms'))
+    for name, data in bodies.items():
+        sizes, times = {}, {}
+        for coding in codings:
+            level = app.config['COMPRESS_BR_QUALITY'] if coding == 'br' \
+                else app.config['COMPRESS_LEVEL']
+            sizes[coding] = len(compression.compress(data, coding, level))
+            times[coding] = cpu_ms(
+                lambda: compression.compress(data, coding, level), rounds)
+
+        @app.route(name, endpoint=name)
+        def view(data=data):
+            response = app.response_class(data, mimetype='application/json')
+            response.set_etag(str(hash(data)))
+            return response
+
+        client = app.test_client()
+        headers = {'Accept-Encoding': codings[0]}
+        client.get(name, headers=headers)
+        cached = cpu_ms(lambda: client.get(name, headers=headers), rounds)
+        print('{:<15} {:>9} {:>9} {:>9} {:>9.2f} {:>9} {:>10.2f}'.format(
+            name, len(data), sizes['gzip'], sizes.get('br', '-'),
+            times['gzip'],
+            '{:.2f}'.format(times['br']) if 'br' in times else '-', cached))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,103 @@
+'''
+Benchmark of listing the drinks menu the way GET /drinks and
+GET /drinks-detail do, against a throwaway sqlite database.
+
+Compares the memoized recipe parsing in Drink.short()/long() with parsing
+the recipe blob on every call (and printing it from short()), as the
+models used to. stdout is sent to /dev/null while timing.
+
+    python bench_drinks.py [drinks] [rounds]
+'''
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+from flask import Flask, jsonify
+
+from src.database.models import db, setup_db, Drink, parse_recipe
+
+COLORS = ['brown', 'white', 'red', 'blue', 'green', 'tan']
+NAMES = ['espresso', 'milk', 'foam', 'mocha', 'matcha', 'water']
+
+
+def naive_short(drink):
+    print(json.loads(drink.recipe))
+    return {
+        'id': drink.id,
+        'title': drink.title,
+        'recipe': [{'color': r['color'], 'parts': r['parts']}
+                   for r in json.loads(drink.recipe)]
+    }
+
+
+def naive_long(drink):
+    return {
+        'id': drink.id,
+        'title': drink.title,
+        'recipe': json.loads(drink.recipe)
+    }
+
+
+def seed(count):
+    rows = []
+    for i in range(count):
+        recipe = [{'name': random.choice(NAMES),
+                   'color': random.choice(COLORS),
+                   'parts': random.randint(1, 4)}
+                  for _ in range(random.randint(1, 3))]
+        rows.append({'title': 'drink %d' % i, 'recipe': json.dumps(recipe)})
+    db.session.bulk_insert_mappings(Drink, rows)
+    db.session.commit()
+
+
+def best_of(rounds, func):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def time_serialize(rows, serialize, rounds):
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        # the first round warms the recipe cache, as earlier requests would
+        [serialize(drink) for drink in rows]
+        return best_of(rounds, lambda: jsonify({
+            'success': True,
+            'drinks': [serialize(drink) for drink in rows]
+        }))
+
+
+def main(count=10000, rounds=5):
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    app = Flask(__name__)
+    setup_db(app, 'sqlite:///' + path)
+    try:
+        with app.app_context():
+            db.create_all()
+            seed(count)
+            print('drinks: {}, best of {} rounds'.format(count, rounds))
+            query = best_of(rounds, lambda: Drink.query.all())
+            print('query all drinks:            {:8.1f} ms'.format(query))
+            rows = Drink.query.all()
+            for name, naive, memoized in [('short', naive_short, Drink.short),
+                                          ('long', naive_long, Drink.long)]:
+                parse_recipe.cache_clear()
+                before = time_serialize(rows, naive, rounds)
+                after = time_serialize(rows, memoized, rounds)
+                print('{:5} parse every call:     {:8.1f} ms   '
+                      'memoized: {:8.1f} ms'.format(name, before, after))
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:3]]
+    main(*args)
@@ -0,0 +1,82 @@
+'''
+Benchmark of jsonify() with the stdlib encoder and with FastJSONEncoder
+(orjson), on the GET /drinks and GET /drinks-detail responses for the
+drinks in the bundled database.db: as they are, and repeated to a menu of
+[drinks] drinks.
+
+The menu cache in api.py encodes these bodies only when the menu changed,
+so this is the cost of a cache miss.  Checks that both encoders produce the
+same bytes before timing them.
+
+    python bench_json.py [drinks] [rounds]
+'''
+import os
+import sqlite3
+import sys
+import time
+
+from flask import Flask, jsonify
+
+from src import fastjson
+from src.database.models import Drink
+
+DATABASE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'src', 'database', 'database.db')
+
+
+def drinks(count=None):
+    '''
+    drinks(count)
+        the bundled drinks, or count of them repeated with new ids
+    '''
+    with sqlite3.connect(DATABASE) as connection:
+        rows = connection.execute(
+            'SELECT id, title, recipe FROM drink ORDER BY id').fetchall()
+    if count is not None:
+        rows = [(i + 1, '{} {}'.format(rows[i % len(rows)][1], i + 1),
+                 rows[i % len(rows)][2]) for i in range(count)]
+    return [Drink(id=id, title=title, recipe=recipe)
+            for id, title, recipe in rows]
+
+
+def payloads(count=None):
+    menu = drinks(count)
+    return {
+        '/drinks': {'success': True,
+                    'drinks': [drink.short() for drink in menu]},
+        '/drinks-detail': {'success': True,
+                           'drinks': [drink.long() for drink in menu]}
+    }
+
+
+def run(app, payload, rounds):
+    with app.test_request_context():
+        body = jsonify(payload).get_data()
+        start = time.perf_counter()
+        for _ in range(rounds):
+            jsonify(payload).get_data()
+        elapsed = time.perf_counter() - start
+    return body, elapsed / rounds * 1e6
+
+
+def main(count=1000, rounds=200):
+    stdlib = Flask('stdlib')
+    fast = Flask('fast')
+    if fastjson.init_app(fast) != 'orjson':
+        sys.exit('orjson is not installed')
+
+    print('{} rounds, microseconds per response'.format(rounds))
+    print('{:<15} {:>7} {:>10} {:>10} {:>8} {:>10}'.format(
+        'payload', 'drinks', 'stdlib', 'orjson', 'speedup', 'bytes'))
+    for menu in (None, count):
+        for name, payload in payloads(menu).items():
+            expected, slow = run(stdlib, payload, rounds)
+            body, quick = run(fast, payload, rounds)
+            assert body == expected, name
+            print('{:<15} {:>7} {:>10.1f} {:>10.1f} {:>7.1f}x {:>10}'.format(
+                name, len(payload['drinks']), slow, quick, slow / quick,
+                len(body)))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,425 @@
+'''
+Load test that replays udacity-fsnd-udaspicelatte.postman_collection.json
+against the API with concurrent clients.
+
+The app is started with `flask run` on a free port, against a throwaway
+sqlite database seeded with one drink, or against DATABASE_URL when given
+(e.g. a local PostgreSQL).  The collection's tokens were issued by Auth0 and
+have expired, so every token from the app's issuer is signed again, claims
+and permissions unchanged, with a throwaway RSA key whose public half a
+local JWKS server hands to the app through JWKS_URL.  Tokens from other
+issuers are replayed as they are and keep failing as the collection
+expects.
+
+Each client walks the collection in order, from its own starting point,
+until the duration is over.  A request is an error when its status is not
+the one the collection's test expects, or 4xx/5xx if it has no test.
+Requests that would change data (not GET and expected to succeed) are
+skipped unless --writes is given: they target fixed ids and titles, so only
+their first replay can succeed.
+
+The report, per endpoint and in total, has the throughput, p50/p95/p99
+latency in ms, error rate and status counts.  It is printed as JSON, or
+saved with --output; --baseline prints how each endpoint's throughput and
+p95 changed since an earlier report.
+
+    python bench_load.py [--concurrency 8] [--duration 10] [--writes]
+                         [--database-url URL] [--output report.json]
+                         [--baseline old.json]
+'''
+import argparse
+import base64
+import http.client
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from Crypto.PublicKey import RSA
+from jose import jwt
+
+from src.auth import auth
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+COLLECTION = os.path.join(HERE,
+                          'udacity-fsnd-udaspicelatte.postman_collection.json')
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+SEED_RECIPE = json.dumps([{'name': 'water', 'color': 'blue', 'parts': 1}])
+
+
+# Collection
+
+def substitute(text, variables):
+    return re.sub(r'{{\s*([^}\s]+)\s*}}',
+                  lambda m: variables.get(m.group(1), m.group(0)), text)
+
+
+def expected_status(item):
+    for event in item.get('event', ()):
+        if event.get('listen') == 'test':
+            script = '\n'.join(event.get('script', {}).get('exec', ()))
+            match = re.search(r'to\.have\.status\((\d+)\)', script)
+            if match:
+                return int(match.group(1))
+    return None
+
+
+def bearer_token(auth_block):
+    if not auth_block or auth_block.get('type') != 'bearer':
+        return None
+    for entry in auth_block.get('bearer', ()):
+        if entry.get('key') == 'token':
+            return entry.get('value')
+    return None
+
+
+def load_requests(path):
+    '''
+    load_requests(path)
+        the collection's requests in order, with the folder auth inherited
+        and the collection variables substituted into url, headers and body
+    '''
+    with open(path) as f:
+        collection = json.load(f)
+    variables = {v['key']: v.get('value', '')
+                 for v in collection.get('variable', ())}
+    requests = []
+
+    def walk(items, folder, token):
+        for item in items:
+            own_token = bearer_token(item.get('auth')) or token
+            if 'item' in item:
+                walk(item['item'], folder + [item['name']], own_token)
+                continue
+            request = item['request']
+            token_here = bearer_token(request.get('auth')) or own_token
+            url = request['url']
+            raw = url['raw'] if isinstance(url, dict) else url
+            raw = substitute(raw, variables)
+            path = '/' + re.sub(r'^(\w+://)?[^/]*/?', '', raw)
+            headers = {h['key']: substitute(h['value'], variables)
+                       for h in request.get('header', ())
+                       if not h.get('disabled')}
+            body = request.get('body') or {}
+            requests.append({
+                'name': ' '.join([request['method'], path] + (
+                    ['[{}]'.format('/'.join(folder))] if folder else [])),
+                'method': request['method'],
+                'path': path,
+                'headers': headers,
+                'body': substitute(body.get('raw', ''), variables).encode()
+                if body.get('mode') == 'raw' else None,
+                'token': token_here,
+                'expect': expected_status(item)
+            })
+
+    walk(collection['item'], [], bearer_token(collection.get('auth')))
+    return requests
+
+
+def is_write(request):
+    expect = request['expect']
+    return request['method'] not in SAFE_METHODS and \
+        (expect is None or 200 <= expect < 300)
+
+
+# Stub identity provider
+
+def b64_int(value):
+    raw = value.to_bytes((value.bit_length() + 7) // 8, 'big')
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+class StubIssuer:
+    '''
+    StubIssuer
+        signs tokens with a throwaway RSA key and serves its JWKS on a local
+        port, standing in for Auth0
+    '''
+    def __init__(self, kid='load-test-key'):
+        self.kid = kid
+        self.key = RSA.generate(2048)
+        self.pem = self.key.exportKey('PEM').decode('ascii')
+        jwks = json.dumps({'keys': [{
+            'kty': 'RSA',
+            'kid': kid,
+            'use': 'sig',
+            'n': b64_int(self.key.n),
+            'e': b64_int(self.key.e)
+        }]}).encode()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(jwks)))
+                self.end_headers()
+                self.wfile.write(jwks)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:{}/.well-known/jwks.json'.format(
+            self.server.server_port)
+        threading.Thread(target=self.server.serve_forever,
+                         daemon=True).start()
+
+    def resign(self, token):
+        '''
+        resign(token)
+            the token signed again by this issuer with a fresh expiry, if
+            the app's issuer made it; otherwise the token unchanged
+        '''
+        try:
+            claims = jwt.get_unverified_claims(token)
+        except Exception:
+            return token
+        if claims.get('iss') != 'https://' + auth.AUTH0_DOMAIN + '/':
+            return token
+        claims['iat'] = int(time.time())
+        claims['exp'] = claims['iat'] + 24 * 3600
+        return jwt.encode(claims, self.pem, algorithm='RS256',
+                          headers={'kid': self.kid})
+
+    def close(self):
+        self.server.shutdown()
+
+
+# App under test
+
+def prepare_database(database_url):
+    '''
+    prepare_database(database_url)
+        creates the tables and seeds one drink if there are none
+    '''
+    from flask import Flask
+    from src.database.models import db, setup_db, Drink
+
+    app = Flask(__name__)
+    setup_db(app, database_url)
+    with app.app_context():
+        db.create_all()
+        if Drink.query.count() == 0:
+            db.session.add(Drink(title='water', recipe=SEED_RECIPE))
+            db.session.commit()
+        db.session.remove()
+        db.engine.dispose()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_app(database_url, jwks_url, port, timeout=30):
+    env = dict(os.environ, FLASK_APP='src.api', FLASK_ENV='production',
+               DATABASE_URL=database_url, JWKS_URL=jwks_url)
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'flask', 'run', '--no-reload',
+         '--host', '127.0.0.1', '--port', str(port)],
+        cwd=HERE, env=env, stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('the app exited with {}'.format(
+                process.returncode))
+        try:
+            socket.create_connection(('127.0.0.1', port), 0.2).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError('the app did not start within {}s'.format(timeout))
+
+
+# Load
+
+def send(port, request):
+    headers = dict(request['headers'])
+    if request['token']:
+        headers['Authorization'] = 'Bearer ' + request['token']
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    start = time.perf_counter()
+    try:
+        connection.request(request['method'], request['path'],
+                           body=request['body'], headers=headers)
+        response = connection.getresponse()
+        response.read()
+        status = response.status
+    except (OSError, http.client.HTTPException):
+        status = None
+    finally:
+        connection.close()
+    return status, time.perf_counter() - start
+
+
+def is_error(request, status):
+    if status is None:
+        return True
+    if request['expect'] is not None:
+        return status != request['expect']
+    return status >= 400
+
+
+def replay(port, requests, concurrency, duration):
+    '''
+    replay(port, requests, concurrency, duration)
+        [(request index, status, seconds)] from every client
+    '''
+    results = [[] for _ in range(concurrency)]
+    stop = time.monotonic() + duration
+
+    def client(n):
+        i = n * len(requests) // concurrency
+        while time.monotonic() < stop:
+            index = i % len(requests)
+            status, seconds = send(port, requests[index])
+            results[n].append((index, status, seconds))
+            i += 1
+
+    threads = [threading.Thread(target=client, args=(n,))
+               for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return [sample for samples in results for sample in samples]
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return None
+    rank = max(int(round(fraction * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(seconds for _, _, seconds in samples)
+    statuses = {}
+    for _, status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    errors = sum(1 for error, _, _ in samples if error)
+    return {
+        'requests': len(samples),
+        'throughput_rps': round(len(samples) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2)
+        if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2)
+        if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2)
+        if latencies else None,
+        'error_rate': round(errors / len(samples), 4) if samples else None,
+        'statuses': statuses
+    }
+
+
+def report(requests, samples, elapsed):
+    by_endpoint = {}
+    flagged = []
+    for index, status, seconds in samples:
+        sample = (is_error(requests[index], status), status, seconds)
+        by_endpoint.setdefault(requests[index]['name'], []).append(sample)
+        flagged.append(sample)
+    return {
+        'total': summarize(flagged, elapsed),
+        'endpoints': {name: summarize(by_endpoint.get(name, []), elapsed)
+                      for name in dict.fromkeys(r['name'] for r in requests)}
+    }
+
+
+def compare(current, baseline):
+    rows = []
+    for name, now in current['endpoints'].items():
+        then = baseline.get('endpoints', {}).get(name)
+        if not then or not then['requests'] or not now['requests']:
+            continue
+        rows.append('{:<45} {:>9.1f} -> {:>9.1f} rps   p95 {:>8.2f} -> '
+                    '{:>8.2f} ms'.format(name, then['throughput_rps'],
+                                         now['throughput_rps'],
+                                         then['p95_ms'], now['p95_ms']))
+    return '\n'.join(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--collection', default=COLLECTION)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10,
+                        help='seconds of load after a warm-up pass')
+    parser.add_argument('--writes', action='store_true',
+                        help='replay requests that change data too')
+    parser.add_argument('--database-url',
+                        help='database to run against (default: a '
+                             'throwaway sqlite file)')
+    parser.add_argument('--output', help='file to save the JSON report to')
+    parser.add_argument('--baseline', help='earlier report to compare with')
+    args = parser.parse_args()
+
+    requests = load_requests(args.collection)
+    if not args.writes:
+        requests = [r for r in requests if not is_write(r)]
+    issuer = StubIssuer()
+    tokens = {}
+    for request in requests:
+        if request['token']:
+            token = request['token']
+            if token not in tokens:
+                tokens[token] = issuer.resign(token)
+            request['token'] = tokens[token]
+
+    scratch = None
+    database_url = args.database_url
+    if not database_url:
+        fd, scratch = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        database_url = 'sqlite:///' + scratch
+    port = free_port()
+    try:
+        prepare_database(database_url)
+        process = start_app(database_url, issuer.url, port)
+        try:
+            for request in requests:
+                send(port, request)
+            start = time.perf_counter()
+            samples = replay(port, requests, args.concurrency,
+                             args.duration)
+            elapsed = time.perf_counter() - start
+        finally:
+            process.terminate()
+            process.wait()
+    finally:
+        issuer.close()
+        if scratch:
+            os.remove(scratch)
+
+    result = {
+        'collection': os.path.basename(args.collection),
+        'database': database_url.split(':', 1)[0],
+        'concurrency': args.concurrency,
+        'duration_s': round(elapsed, 2),
+        'writes': args.writes,
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        **report(requests, samples, elapsed)
+    }
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline) as f:
+            print(compare(result, json.load(f)), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
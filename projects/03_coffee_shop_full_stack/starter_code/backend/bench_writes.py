@@ -0,0 +1,76 @@
+'''
+Throughput benchmark of Drink.insert() from concurrent request threads,
+against a throwaway sqlite database.
+
+Compares committing every insert in its own transaction, as the models do
+by default, with the group-commit writer (GROUP_COMMIT=1), which commits
+the inserts queued by all threads together in micro-batches.  Each insert
+waits until it is committed in both cases.
+
+    python bench_writes.py [threads] [inserts per thread]
+'''
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from flask import Flask
+
+from src.database.models import db, setup_db, Drink
+from src.database.writer import group_writer
+
+RECIPE = json.dumps([{'name': 'espresso', 'color': 'brown', 'parts': 1}])
+
+
+def run(app, label, threads, inserts):
+    errors = []
+
+    def work(thread):
+        with app.app_context():
+            for i in range(inserts):
+                try:
+                    Drink(title='{} {}-{}'.format(label, thread, i),
+                          recipe=RECIPE).insert()
+                except Exception as e:
+                    db.session.rollback()
+                    errors.append(e)
+            db.session.remove()
+
+    workers = [threading.Thread(target=work, args=(thread,))
+               for thread in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    total = threads * inserts
+    print('{:18} {:8.0f} inserts/s  ({} inserts in {:.2f} s, {} errors)'
+          .format(label, (total - len(errors)) / elapsed, total, elapsed,
+                  len(errors)))
+
+
+def main(threads=16, inserts=100):
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    app = Flask(__name__)
+    setup_db(app, 'sqlite:///' + path)
+    try:
+        with app.app_context():
+            db.create_all()
+        print('threads: {}, inserts per thread: {}'.format(threads, inserts))
+        run(app, 'commit per call', threads, inserts)
+        group_writer.init_app(app, db, {'GROUP_COMMIT': '1'})
+        run(app, 'group commit', threads, inserts)
+        group_writer.close()
+        print('group commit batches: {}, changes per batch: {:.1f}'.format(
+            group_writer.batches, group_writer.changes / group_writer.batches))
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:3]]
+    main(*args)
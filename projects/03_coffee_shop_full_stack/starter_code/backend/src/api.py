@@ -1,35 +1,94 @@
 import os
 import sys
+import hashlib
+import threading
+import time
 from flask import Flask, request, jsonify, abort
 from sqlalchemy import exc
 import json
 from flask_cors import CORS
 
-from .database.models import db_drop_and_create_all, setup_db, Drink
+from .database.models import db_drop_and_create_all, setup_db, db, Drink
+from .database.engine import pool_stats
 from .auth.auth import AuthError, requires_auth
+from . import instrumentation
+from . import fastjson
+from . import compression
 
 app = Flask(__name__)
+fastjson.init_app(app)
 setup_db(app)
+instrumentation.init_app(app, gauges=lambda: {
+    'db_pool_' + name: value for name, value in pool_stats(db.engine).items()})
+compression.init_app(app)
 CORS(app)
 
 # db_drop_and_create_all()
 
-# ROUTES
+# Menu Cache
+'''
+menu_cache
+    the encoded GET /drinks and /drinks-detail bodies with their ETag
+    the menu rarely changes, so it is queried and serialized once and
+    served from memory until a POST, PATCH or DELETE invalidates it, or
+    for MENU_CACHE_TTL seconds at most, since a write only invalidates the
+    cache of the worker that handled it
+    clients sending a matching If-None-Match get a 304 without a query
+'''
+MENU_CACHE_TTL = int(os.environ.get('MENU_CACHE_TTL', 30))
+menu_cache = {}
+menu_cache_lock = threading.Lock()
+menu_version = 0
 
 
-@app.route('/drinks')
-def get_drinks():
-    try:
-        drinks = Drink.query.all()
-        drinks = [drink.short() for drink in drinks]
+def invalidate_menu():
+    global menu_version
+    with menu_cache_lock:
+        menu_version += 1
+        menu_cache.clear()
+
+
+def menu_response(form):
+    entry = menu_cache.get(form)
+    now = time.monotonic()
+    if entry is None or now - entry[2] > MENU_CACHE_TTL:
+        version = menu_version
+        drinks = [getattr(drink, form)() for drink in Drink.query.all()]
 
         if not drinks:
             abort(404)
 
-        return jsonify({
+        body = jsonify({
             'success': True,
             'drinks': drinks
-        })
+        }).get_data()
+        entry = (body, hashlib.sha1(body).hexdigest(), now)
+        with menu_cache_lock:
+            # a write raced with this query, do not keep the old menu
+            if version == menu_version:
+                menu_cache[form] = entry
+
+    body, etag, cached_at = entry
+    response = app.response_class(body, mimetype=app.config[
+        'JSONIFY_MIMETYPE'])
+    response.set_etag(etag)
+    return response.make_conditional(request)
+
+# ROUTES
+
+
+@app.route('/metrics/pool')
+def get_pool_stats():
+    return jsonify({
+        'success': True,
+        'pool': pool_stats(db.engine)
+    })
+
+
+@app.route('/drinks')
+def get_drinks():
+    try:
+        return menu_response('short')
     except Exception:
         # print('Error:', sys.exc_info())
         abort(422)
@@ -39,16 +98,7 @@ def get_drinks():
 @requires_auth('get:drinks-detail')
 def get_drinks_detail(token):
     try:
-        drinks = Drink.query.all()
-        drinks = [drink.long() for drink in drinks]
-
-        if not drinks:
-            abort(404)
-
-        return jsonify({
-            'success': True,
-            'drinks': drinks
-        })
+        return menu_response('long')
     except Exception:
         # print('Error:', sys.exc_info())
         abort(422)
@@ -66,6 +116,7 @@ def create_new_drink(token):
         try:
             new_drink = Drink(title=title, recipe=json.dumps(recipe))
             new_drink.insert()
+            invalidate_menu()
             return jsonify({
                 'success': True,
                 'drinks': [{'id': new_drink.id,
@@ -96,6 +147,7 @@ def udpate_drink(token, drink_id):
 
     try:
         drink.update()
+        invalidate_menu()
         return jsonify({
             'success': True,
             'drinks': [drink.long()]
@@ -113,6 +165,7 @@ def delete_drink(token, drink_id):
         if drink is None:
             abort(404)
         drink.delete()
+        invalidate_menu()
         return jsonify({
             'success': True,
             'delete': drink_id
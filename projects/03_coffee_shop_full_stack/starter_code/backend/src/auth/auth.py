@@ -1,4 +1,9 @@
+import hashlib
 import json
+import os
+import threading
+import time
+from collections import OrderedDict
 from flask import request, _request_ctx_stack, abort
 from functools import wraps
 from jose import jwt
@@ -8,6 +13,20 @@ AUTH0_DOMAIN = 'fsnd-coffeeshop.auth0.com'
 ALGORITHMS = ['RS256']
 API_AUDIENCE = 'Coffee'
 
+JWKS_URL = os.environ.get('JWKS_URL',
+                          f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
+# seconds a fetched key set is considered fresh
+JWKS_TTL = int(os.environ.get('JWKS_TTL', 600))
+# minimum seconds between refreshes triggered by an unknown kid
+JWKS_MIN_REFRESH_INTERVAL = int(os.environ.get('JWKS_MIN_REFRESH_INTERVAL',
+                                               30))
+# longest wait between retries while the provider keeps failing
+JWKS_MAX_BACKOFF = int(os.environ.get('JWKS_MAX_BACKOFF', 300))
+# seconds to wait on the provider before a fetch is given up
+JWKS_FETCH_TIMEOUT = float(os.environ.get('JWKS_FETCH_TIMEOUT', 5))
+# how many verified tokens to remember, 0 disables the cache
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', 1024))
+
 # AuthError Exception
 '''
 AuthError Exception
@@ -51,14 +70,53 @@ def get_token_auth_header():
     return parts[1]
 
 
-def check_permissions(permission, payload):
+# Permissions
+'''
+PERMISSIONS
+    registry of every permission the app declares, mapped to a bit
+    requires_auth('...') registers its permission when the route is
+    decorated, so the registry is complete once the app is imported
+'''
+PERMISSIONS = {}
+
+
+def register_permission(permission):
+    if permission not in PERMISSIONS:
+        PERMISSIONS[permission] = 1 << len(PERMISSIONS)
+        # masks compiled before this permission existed are incomplete
+        token_cache.clear()
+    return PERMISSIONS[permission]
+
+
+'''
+compile_permissions(payload)
+    folds the payload's permissions into a bitmask of registered permissions
+    so each check is a single AND instead of a list scan
+'''
+
+
+def compile_permissions(payload):
+    granted = 0
+    for permission in payload.get('permissions', ()):
+        granted |= PERMISSIONS.get(permission, 0)
+    return granted
+
+
+def check_permissions(permission, payload, granted=None):
     if 'permissions' not in payload:
         raise AuthError({
             'code': 'Unauthorized',
             'description': 'No permissions found'
         }, 401)
 
-    if permission not in payload['permissions']:
+    bit = PERMISSIONS.get(permission)
+    if bit is None:
+        allowed = permission in payload['permissions']
+    else:
+        if granted is None:
+            granted = compile_permissions(payload)
+        allowed = granted & bit
+    if not allowed:
         raise AuthError({
             'code': 'Forbidden',
             'description': 'You do not have permission to access this resource'
@@ -67,26 +125,163 @@ def check_permissions(permission, payload):
     return True
 
 
+# JWKS Cache
+'''
+JWKSCache
+    process-wide cache of the identity provider's signing keys, indexed by kid
+    - keys are fetched once and served from memory for `ttl` seconds
+    - once stale, the old keys keep being served while a background thread
+      refreshes them (stale-while-revalidate), so a slow or unavailable
+      provider does not block requests
+    - an unknown kid triggers a blocking refresh, at most once every
+      `min_refresh_interval` seconds
+    - after a failed refresh no other is attempted, in the background or
+      for an unknown kid, for `min_refresh_interval` seconds, doubling with
+      every further failure up to JWKS_MAX_BACKOFF
+    - a fetch gives up after `timeout` seconds and runs outside the lock,
+      so a provider that stops responding holds up only the callers that
+      need keys it has not fetched yet, and them for `timeout` at most
+'''
+
+
+class JWKSCache:
+    def __init__(self, url, ttl=JWKS_TTL,
+                 min_refresh_interval=JWKS_MIN_REFRESH_INTERVAL,
+                 timeout=JWKS_FETCH_TIMEOUT):
+        self.url = url
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.timeout = timeout
+        self._keys = {}
+        self._fetched_at = None
+        self._last_attempt = None
+        self._failures = 0
+        self._lock = threading.Lock()
+        # notified whenever a fetch finishes
+        self._fetched = threading.Condition(self._lock)
+        self._fetching = False
+        self._refreshing = False
+
+    def _fetch(self):
+        with urlopen(self.url, timeout=self.timeout) as jsonurl:
+            jwks = json.loads(jsonurl.read())
+        keys = {}
+        for key in jwks['keys']:
+            keys[key['kid']] = {
+                'kty': key['kty'],
+                'kid': key['kid'],
+                'use': key['use'],
+                'n': key['n'],
+                'e': key['e']
+            }
+        return keys
+
+    def refresh(self, since=None):
+        '''
+        refresh(since=None)
+            fetches the key set, unless another caller already refreshed it
+            after the monotonic timestamp `since`
+            returns True if the cache holds keys fetched after `since`
+        '''
+        with self._lock:
+            # share a fetch already in flight rather than start another
+            if not self._fetched.wait_for(lambda: not self._fetching,
+                                          self.timeout):
+                return self._fetched_at is not None
+            if since is not None and self._last_attempt is not None \
+                    and self._last_attempt > since:
+                return self._fetched_at is not None
+            self._last_attempt = time.monotonic()
+            self._fetching = True
+        try:
+            keys = self._fetch()
+        except Exception:
+            with self._lock:
+                self._failures += 1
+                self._fetching = False
+                self._fetched.notify_all()
+                # keep serving whatever we already have
+                if not self._keys:
+                    raise
+            return False
+        with self._lock:
+            self._keys = keys
+            self._fetched_at = time.monotonic()
+            self._failures = 0
+            self._fetching = False
+            self._fetched.notify_all()
+        return True
+
+    def _background_refresh(self, since):
+        try:
+            self.refresh(since)
+        except Exception:
+            pass
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _refresh_in_background(self, now):
+        with self._lock:
+            if self._refreshing or self._fetching or \
+                    (self._failures and not self._may_refresh(now)):
+                return
+            self._refreshing = True
+        threading.Thread(target=self._background_refresh, args=(now,),
+                         daemon=True).start()
+
+    def _retry_interval(self):
+        if not self._failures:
+            return self.min_refresh_interval
+        return min(max(self.min_refresh_interval, 1) *
+                   2 ** (self._failures - 1), JWKS_MAX_BACKOFF)
+
+    def _may_refresh(self, now):
+        return (self._last_attempt is None or
+                now - self._last_attempt >= self._retry_interval())
+
+    def get_key(self, kid):
+        now = time.monotonic()
+        if self._fetched_at is None:
+            if self._failures and not self._may_refresh(now):
+                raise RuntimeError('signing keys unavailable')
+            if not self.refresh(now):
+                raise RuntimeError('signing keys unavailable')
+        elif now - self._fetched_at >= self.ttl:
+            self._refresh_in_background(now)
+
+        key = self._keys.get(kid)
+        if key is None and self._may_refresh(now):
+            self.refresh(now)
+            key = self._keys.get(kid)
+        return key
+
+    def clear(self):
+        with self._lock:
+            self._keys = {}
+            self._fetched_at = None
+            self._last_attempt = None
+            self._failures = 0
+
+
+jwks_cache = JWKSCache(JWKS_URL)
+
+
 def verify_decode_jwt(token):
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(jsonurl.read())
     unverified_header = jwt.get_unverified_header(token)
-    rsa_key = {}
     if 'kid' not in unverified_header:
         raise AuthError({
             'code': 'invalid_header',
             'description': 'Authorization malformed.'
         }, 401)
 
-    for key in jwks['keys']:
-        if key['kid'] == unverified_header['kid']:
-            rsa_key = {
-                'kty': key['kty'],
-                'kid': key['kid'],
-                'use': key['use'],
-                'n': key['n'],
-                'e': key['e']
-            }
+    try:
+        rsa_key = jwks_cache.get_key(unverified_header['kid'])
+    except Exception:
+        raise AuthError({
+            'code': 'jwks_unavailable',
+            'description': 'Unable to fetch the signing keys.'
+        }, 401)
     if rsa_key:
         try:
             payload = jwt.decode(
@@ -121,13 +316,93 @@ def verify_decode_jwt(token):
     }, 400)
 
 
+# Verified Token Cache
+'''
+TokenCache
+    bounded LRU cache of verified tokens, so a client repeating the same
+    bearer token does not pay for a RS256 verification on every request
+    - entries hold the decoded payload and its compiled permission mask
+    - entries are keyed by the sha256 of the token, never the token itself
+    - an entry expires at the token's `exp` claim; tokens without one
+      are not cached
+    - invalidate(token) and clear() drop entries explicitly
+'''
+
+
+class TokenCache:
+    def __init__(self, maxsize=TOKEN_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    def get(self, token):
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, payload, granted = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return payload, granted
+
+    def set(self, token, payload, granted=0):
+        if self.maxsize <= 0 or 'exp' not in payload:
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (payload['exp'], payload, granted)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, token):
+        with self._lock:
+            self._entries.pop(self._key(token), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+token_cache = TokenCache()
+
+
+'''
+verify_decode_jwt_cached(token)
+    returns the decoded payload and its compiled permission mask,
+    from the token cache when possible
+'''
+
+
+def verify_decode_jwt_cached(token):
+    entry = token_cache.get(token)
+    if entry is None:
+        payload = verify_decode_jwt(token)
+        granted = compile_permissions(payload)
+        token_cache.set(token, payload, granted)
+        return payload, granted
+    return entry
+
+
 def requires_auth(permission=''):
+    register_permission(permission)
+
     def requires_auth_decorator(f):
         @wraps(f)
         def wrapper(*args, **kwargs):
             token = get_token_auth_header()
-            payload = verify_decode_jwt(token)
-            check_permissions(permission, payload)
+            payload, granted = verify_decode_jwt_cached(token)
+            check_permissions(permission, payload, granted)
             return f(payload, *args, **kwargs)
 
         return wrapper
@@ -0,0 +1,118 @@
+import os
+import threading
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool
+
+'''
+Engine options
+
+The SQLAlchemy engine is configured from the environment:
+    DB_POOL_SIZE - connections kept open (5)
+    DB_MAX_OVERFLOW - connections opened above the pool size under load (10)
+    DB_POOL_TIMEOUT - seconds to wait for a free connection (30)
+    DB_POOL_RECYCLE - seconds after which a connection is replaced (1800)
+    DB_POOL_PRE_PING - 0 to skip testing connections on checkout (1)
+    DB_STATEMENT_TIMEOUT - PostgreSQL statement_timeout in ms, 0 for none (0)
+Pre-ping replaces connections dropped by a failover or restart of the
+database instead of failing the request that checks them out, and recycling
+keeps connections from outliving server and proxy idle timeouts.
+'''
+
+
+def env_int(environ, name, default):
+    value = environ.get(name, '')
+    return int(value) if value.strip() else default
+
+
+'''
+MeteredQueuePool
+    QueuePool recording how long checkouts wait for a connection
+'''
+
+
+class MeteredQueuePool(QueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self.metrics_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            wait = time.perf_counter() - start
+            with self.metrics_lock:
+                self.checkouts += 1
+                self.wait_total += wait
+                self.wait_max = max(self.wait_max, wait)
+
+    def stats(self):
+        capacity = self.size() + max(self._max_overflow, 0)
+        checked_out = self.checkedout()
+        with self.metrics_lock:
+            return {
+                'size': self.size(),
+                'max_overflow': self._max_overflow,
+                'checked_out': checked_out,
+                'idle': self.checkedin(),
+                'utilization': checked_out / capacity if capacity else 0.0,
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'wait_seconds_total': self.wait_total,
+                'wait_seconds_max': self.wait_max,
+                'wait_seconds_avg': self.wait_total / self.checkouts
+                if self.checkouts else 0.0
+            }
+
+
+def engine_options(database_path, environ=os.environ):
+    '''
+    engine_options(database_path)
+        the SQLALCHEMY_ENGINE_OPTIONS for database_path
+        sqlite keeps its own pool, only pre-ping and recycle apply to it
+    '''
+    url = make_url(database_path)
+    options = {
+        'pool_pre_ping': env_int(environ, 'DB_POOL_PRE_PING', 1) != 0,
+        'pool_recycle': env_int(environ, 'DB_POOL_RECYCLE', 1800)
+    }
+    if url.get_backend_name() == 'sqlite':
+        return options
+    options.update({
+        'poolclass': MeteredQueuePool,
+        'pool_size': env_int(environ, 'DB_POOL_SIZE', 5),
+        'max_overflow': env_int(environ, 'DB_MAX_OVERFLOW', 10),
+        'pool_timeout': env_int(environ, 'DB_POOL_TIMEOUT', 30)
+    })
+    statement_timeout = env_int(environ, 'DB_STATEMENT_TIMEOUT', 0)
+    if statement_timeout and \
+            url.get_backend_name() in ('postgresql', 'postgres'):
+        options['connect_args'] = {
+            'options': '-c statement_timeout={}'.format(statement_timeout)
+        }
+    return options
+
+
+def pool_stats(engine):
+    '''
+    pool_stats(engine)
+        checkout wait times and utilization of the engine's pool
+    '''
+    pool = engine.pool
+    if isinstance(pool, MeteredQueuePool):
+        stats = pool.stats()
+    else:
+        stats = {}
+    stats['pool'] = type(pool).__name__
+    return stats
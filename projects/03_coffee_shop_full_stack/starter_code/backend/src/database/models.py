@@ -1,11 +1,16 @@
 import os
+from functools import lru_cache
 from sqlalchemy import Column, String, Integer
 from flask_sqlalchemy import SQLAlchemy
 import json
 
+from .engine import engine_options
+from .writer import group_writer
+
 database_filename = "database.db"
 project_dir = os.path.dirname(os.path.abspath(__file__))
-database_path = "sqlite:///{}".format(os.path.join(project_dir, database_filename))
+database_path = os.environ.get("DATABASE_URL", "sqlite:///{}".format(
+    os.path.join(project_dir, database_filename)))
 
 db = SQLAlchemy()
 
@@ -13,11 +18,13 @@ db = SQLAlchemy()
 setup_db(app)
     binds a flask application and a SQLAlchemy service
 '''
-def setup_db(app):
+def setup_db(app, database_path=database_path):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(database_path)
     db.app = app
     db.init_app(app)
+    group_writer.init_app(app, db)
 
 '''
 db_drop_and_create_all()
@@ -29,6 +36,22 @@ def db_drop_and_create_all():
     db.drop_all()
     db.create_all()
 
+'''
+parse_recipe(recipe)
+    parses a recipe blob, memoized on the blob itself
+    a row is only parsed again once its recipe changes, so listing the menu
+    does not json.loads the same blobs on every request
+    anything stored other than a list, such as a single ingredient object,
+    is read as a one-item recipe
+    the parsed ingredients are shared, callers must copy before mutating
+'''
+@lru_cache(maxsize=int(os.environ.get('RECIPE_CACHE_SIZE', 16384)))
+def parse_recipe(recipe):
+    parsed = json.loads(recipe)
+    if not isinstance(parsed, list):
+        return (parsed,)
+    return tuple(parsed)
+
 '''
 Drink
 a persistent drink entity, extends the base SQLAlchemy Model
@@ -47,8 +70,7 @@ class Drink(db.Model):
         short form representation of the Drink model
     '''
     def short(self):
-        print(json.loads(self.recipe))
-        short_recipe = [{'color': r['color'], 'parts': r['parts']} for r in json.loads(self.recipe)]
+        short_recipe = [{'color': r['color'], 'parts': r['parts']} for r in parse_recipe(self.recipe)]
         return {
             'id': self.id,
             'title': self.title,
@@ -63,7 +85,7 @@ class Drink(db.Model):
         return {
             'id': self.id,
             'title': self.title,
-            'recipe': json.loads(self.recipe)
+            'recipe': list(parse_recipe(self.recipe))
         }
 
     '''
@@ -74,8 +96,13 @@ class Drink(db.Model):
         EXAMPLE
             drink = Drink(title=req_title, recipe=req_recipe)
             drink.insert()
+        with GROUP_COMMIT=1 the insert is committed by the group-commit
+        writer: insert() waits for it and sets drink.id, or with wait=False
+        returns at once with a future of the id
     '''
-    def insert(self):
+    def insert(self, wait=True):
+        if group_writer.enabled:
+            return group_writer.insert(self, wait)
         db.session.add(self)
         db.session.commit()
 
@@ -86,8 +113,11 @@ class Drink(db.Model):
         EXAMPLE
             drink = Drink(title=req_title, recipe=req_recipe)
             drink.delete()
+        with GROUP_COMMIT=1 it goes through the group-commit writer too
     '''
-    def delete(self):
+    def delete(self, wait=True):
+        if group_writer.enabled:
+            return group_writer.delete(self, wait)
         db.session.delete(self)
         db.session.commit()
 
@@ -99,8 +129,11 @@ class Drink(db.Model):
             drink = Drink.query.filter(Drink.id == id).one_or_none()
             drink.title = 'Black Coffee'
             drink.update()
+        with GROUP_COMMIT=1 it goes through the group-commit writer too
     '''
-    def update(self):
+    def update(self, wait=True):
+        if group_writer.enabled:
+            return group_writer.update(self, wait)
         db.session.commit()
 
     def __repr__(self):
@@ -0,0 +1,237 @@
+import atexit
+import os
+import queue
+import threading
+import time
+import weakref
+from concurrent.futures import Future, TimeoutError
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+'''
+Group-commit writer
+
+When GROUP_COMMIT=1, the models' insert(), update() and delete() do not
+commit in the request.  The change is queued instead, and a background thread
+applies the queued changes in micro-batches: a batch is committed once it
+holds GROUP_COMMIT_MAX_BATCH changes or GROUP_COMMIT_MAX_DELAY_MS after its
+first change arrived, whichever comes first.  Concurrent requests then share
+one commit, and one fsync, instead of paying for one each.
+
+Every change gets a Future that resolves to the primary key of its row (a
+tuple for composite keys) once its batch is committed, or raises the error
+that stopped it.  If a batch fails its changes are retried one commit at a
+time, so a bad change only fails its own future.  A request waits at most
+GROUP_COMMIT_TIMEOUT seconds for its future.  A change that is still queued
+then is cancelled, so a TimeoutError always means it was not written; one
+whose batch is already committing is waited for, so its outcome is known.
+
+An update writes only the attributes changed on the instance since it was
+loaded, so concurrent updates of different columns of a row do not undo
+each other.  If the request's session flushed the instance before update()
+those changes are no longer pending, and would be rolled back with the
+session, so update() raises RuntimeError instead of writing nothing.
+'''
+GROUP_COMMIT_MAX_BATCH = 64
+GROUP_COMMIT_MAX_DELAY_MS = 2
+GROUP_COMMIT_TIMEOUT = 30
+
+
+# instances flushed in the current transaction of each session
+@event.listens_for(Session, 'after_flush')
+def _record_flushed(session, flush_context):
+    flushed = session.info.setdefault('flushed', weakref.WeakSet())
+    flushed.update(session.dirty)
+
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def _forget_flushed(session):
+    session.info.pop('flushed', None)
+
+
+class GroupCommitWriter:
+    def __init__(self, max_batch=GROUP_COMMIT_MAX_BATCH,
+                 max_delay=GROUP_COMMIT_MAX_DELAY_MS / 1000,
+                 timeout=GROUP_COMMIT_TIMEOUT):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.app = None
+        self.db = None
+        self.batches = 0
+        self.changes = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.app is not None
+
+    def init_app(self, app, db, environ=os.environ):
+        '''
+        init_app(app, db)
+            turns the writer on when GROUP_COMMIT=1
+        '''
+        if environ.get('GROUP_COMMIT', '0') == '0':
+            return
+        self.max_batch = int(environ.get('GROUP_COMMIT_MAX_BATCH',
+                                         self.max_batch))
+        self.max_delay = int(environ.get(
+            'GROUP_COMMIT_MAX_DELAY_MS', self.max_delay * 1000)) / 1000
+        self.timeout = float(environ.get('GROUP_COMMIT_TIMEOUT',
+                                         self.timeout))
+        self.app = app
+        self.db = db
+
+    def insert(self, instance, wait=True):
+        return self._submit('insert', instance, wait)
+
+    def update(self, instance, wait=True):
+        return self._submit('update', instance, wait)
+
+    def delete(self, instance, wait=True):
+        return self._submit('delete', instance, wait)
+
+    def _submit(self, operation, instance, wait):
+        '''
+        _submit(operation, instance, wait)
+            queues a copy of the instance's column values (for an update,
+            of the changed ones) and returns its future; with wait, blocks
+            until the change is committed, raising TimeoutError if it was
+            still queued after self.timeout seconds
+        '''
+        state = inspect(instance)
+        mapper = state.mapper
+        if operation == 'update' and state.session is not None and \
+                instance in state.session.info.get('flushed', ()):
+            raise RuntimeError(
+                '{} was flushed before update(); its changes would be '
+                'rolled back with the session'.format(mapper.class_.__name__))
+        values = {attribute.key: getattr(instance, attribute.key)
+                  for attribute in mapper.column_attrs
+                  if operation == 'insert' or
+                  state.attrs[attribute.key].history.has_changes()}
+        key = mapper.primary_key_from_instance(instance)
+        future = Future()
+        self._start()
+        self._queue.put((operation, mapper, key, values, future))
+        if wait:
+            try:
+                key = future.result(self.timeout)
+            except TimeoutError:
+                if future.cancel():
+                    raise
+                # the change is in a batch being committed: wait for it
+                key = future.result()
+            if operation == 'insert':
+                key = key if isinstance(key, tuple) else (key,)
+                for column, value in zip(mapper.primary_key, key):
+                    setattr(instance, mapper.get_property_by_column(
+                        column).key, value)
+        return future
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def close(self):
+        '''
+        close()
+            commits what is queued and stops the background thread
+        '''
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def _run(self):
+        while True:
+            change = self._queue.get()
+            if change is None:
+                return
+            batch = [change]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    change = self._queue.get(
+                        timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if change is None:
+                    self._queue.put(None)
+                    break
+                batch.append(change)
+            # skip the changes whose caller gave up waiting
+            batch = [change for change in batch
+                     if change[4].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                with self.app.app_context():
+                    try:
+                        self._commit(batch)
+                    finally:
+                        self.db.session.remove()
+            except Exception as e:
+                # fail what is left of the batch, and keep serving the queue
+                for change in batch:
+                    if not change[4].done():
+                        change[4].set_exception(e)
+
+    def _apply(self, session, operation, mapper, key, values):
+        if operation == 'insert':
+            instance = mapper.class_manager.new_instance()
+            for name, value in values.items():
+                setattr(instance, name, value)
+            session.add(instance)
+            return instance
+        instance = session.query(mapper).get(key)
+        if instance is None:
+            raise LookupError('{} {} does not exist'.format(
+                mapper.class_.__name__, key))
+        if operation == 'update':
+            for name, value in values.items():
+                setattr(instance, name, value)
+        else:
+            session.delete(instance)
+        return instance
+
+    def _commit(self, batch):
+        session = self.db.session
+        try:
+            instances = [self._apply(session, *change[:4])
+                         for change in batch]
+            session.flush()
+            keys = [inspect(instance).identity for instance in instances]
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            if len(batch) == 1:
+                batch[0][4].set_exception(e)
+            else:
+                for change in batch:
+                    self._commit([change])
+            return
+        self.batches += 1
+        self.changes += len(batch)
+        for key, change in zip(keys, batch):
+            change[4].set_result(key[0] if len(key) == 1 else key)
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'batches': self.batches,
+            'changes': self.changes,
+            'queued': self._queue.qsize()
+        }
+
+
+group_writer = GroupCommitWriter()
@@ -0,0 +1,478 @@
+import unittest
+import gzip
+import json
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import TimeoutError
+
+from flask import Flask, jsonify
+from sqlalchemy import create_engine, event, exc
+
+# the app binds its database when src.api is imported
+fd, database_path = tempfile.mkstemp(suffix='.db')
+os.close(fd)
+os.environ['DATABASE_URL'] = 'sqlite:///' + database_path
+
+from src import api, compression, fastjson, instrumentation  # noqa: E402
+from src.api import app, invalidate_menu  # noqa: E402
+from src.database.models import db, Drink, parse_recipe  # noqa: E402
+from src.database.engine import MeteredQueuePool, engine_options, \
+    pool_stats  # noqa: E402
+from src.database.writer import GroupCommitWriter  # noqa: E402
+
+RECIPE = json.dumps([{'name': 'espresso', 'color': 'brown', 'parts': 1}])
+
+
+def tearDownModule():
+    os.remove(database_path)
+
+
+class GroupCommitWriterTestCase(unittest.TestCase):
+    """This class represents the group-commit writer test case"""
+
+    def setUp(self):
+        """Start a writer with GROUP_COMMIT=1 on a clean database."""
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+        self.writer = GroupCommitWriter(max_delay=0.001)
+        self.writer.init_app(app, db, environ={'GROUP_COMMIT': '1'})
+
+    def tearDown(self):
+        """Executed after reach test"""
+        self.writer.close()
+
+    def insert(self, title, recipe=RECIPE):
+        drink = Drink(title=title, recipe=recipe)
+        self.writer.insert(drink)
+        return drink.id
+
+    def test_insert_sets_id(self):
+        drink_id = self.insert('Latte')
+        with app.app_context():
+            self.assertEqual(Drink.query.get(drink_id).title, 'Latte')
+        self.assertEqual(self.writer.stats()['changes'], 1)
+
+    def test_failed_commit_fails_only_its_own_change(self):
+        self.insert('Latte')
+        duplicate = self.writer.insert(Drink(title='Latte', recipe=RECIPE),
+                                       wait=False)
+        other = self.writer.insert(Drink(title='Mocha', recipe=RECIPE),
+                                   wait=False)
+        with self.assertRaises(Exception):
+            duplicate.result(5)
+        self.assertTrue(other.result(5))
+        self.assertTrue(self.insert('Flat white'))
+
+    def test_unexpected_error_keeps_the_writer_running(self):
+        commit = self.writer._commit
+
+        def broken_commit(batch):
+            self.writer._commit = commit
+            raise RuntimeError('connection lost')
+        self.writer._commit = broken_commit
+        with self.assertRaises(RuntimeError):
+            self.insert('Latte')
+        self.assertTrue(self.insert('Mocha'))
+
+    def slow_commits(self, delay):
+        commit = self.writer._commit
+
+        def slow_commit(batch):
+            time.sleep(delay)
+            commit(batch)
+        self.writer._commit = slow_commit
+
+    def test_wait_times_out_and_cancels_queued_change(self):
+        self.writer.timeout = 0.05
+        self.slow_commits(0.2)
+        first = self.writer.insert(Drink(title='Latte', recipe=RECIPE),
+                                   wait=False)
+        time.sleep(0.01)
+        with self.assertRaises(TimeoutError):
+            self.insert('Mocha')
+        self.assertTrue(first.result(5))
+        self.writer.close()
+        with app.app_context():
+            self.assertEqual([drink.title for drink in Drink.query.all()],
+                             ['Latte'])
+
+    def test_wait_outlasts_timeout_for_committing_change(self):
+        self.writer.timeout = 0.05
+        self.slow_commits(0.2)
+        drink_id = self.insert('Latte')
+        with app.app_context():
+            self.assertEqual(Drink.query.get(drink_id).title, 'Latte')
+
+    def test_update_writes_only_changed_columns(self):
+        drink_id = self.insert('Latte')
+        with app.app_context():
+            drink = Drink.query.get(drink_id)
+            drink.title = 'Caffe latte'
+            # a concurrent request changes the recipe meanwhile
+            other = json.dumps([{'name': 'milk', 'color': 'white',
+                                 'parts': 2}])
+            with db.engine.begin() as connection:
+                connection.execute(Drink.__table__.update().values(
+                    recipe=other))
+            self.writer.update(drink)
+            db.session.remove()
+            drink = Drink.query.get(drink_id)
+            self.assertEqual(drink.title, 'Caffe latte')
+            self.assertEqual(drink.recipe, other)
+            db.session.remove()
+
+    def test_update_after_flush_raises(self):
+        drink_id = self.insert('Latte')
+        with app.app_context():
+            drink = Drink.query.get(drink_id)
+            drink.title = 'Caffe latte'
+            Drink.query.count()  # autoflushes the new title
+            with self.assertRaises(RuntimeError):
+                self.writer.update(drink)
+            db.session.remove()
+            self.assertEqual(Drink.query.get(drink_id).title, 'Latte')
+            db.session.remove()
+
+    def test_delete(self):
+        drink_id = self.insert('Latte')
+        with app.app_context():
+            self.writer.delete(Drink.query.get(drink_id))
+            db.session.remove()
+            self.assertEqual(Drink.query.get(drink_id), None)
+
+
+class MenuCacheTestCase(unittest.TestCase):
+    """This class represents the encoded menu cache test case"""
+
+    def setUp(self):
+        """Define test variables and initialize a menu of one drink."""
+        self.client = app.test_client
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            Drink(title='Latte', recipe=RECIPE).insert()
+        invalidate_menu()
+
+    def count_queries(self, func):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            result = func()
+        finally:
+            event.remove(engine, 'before_cursor_execute',
+                         before_cursor_execute)
+        return result, len(statements)
+
+    def test_get_drinks_sets_etag(self):
+        res = self.client().get('/drinks')
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['drinks'][0]['title'], 'Latte')
+        self.assertTrue(res.headers['ETag'])
+
+    def test_cached_menu_served_without_a_query(self):
+        first = self.client().get('/drinks')
+        second, queries = self.count_queries(
+            lambda: self.client().get('/drinks'))
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(queries, 0)
+
+    def test_matching_if_none_match_returns_304(self):
+        etag = self.client().get('/drinks').headers['ETag']
+        res = self.client().get('/drinks', headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.data, b'')
+        res = self.client().get('/drinks',
+                                headers={'If-None-Match': '"other"'})
+        self.assertEqual(res.status_code, 200)
+
+    def test_menu_expires_after_ttl(self):
+        etag = self.client().get('/drinks').headers['ETag']
+        # a write handled by another worker leaves this cache in place
+        with app.app_context():
+            Drink(title='Mocha', recipe=RECIPE).insert()
+        self.assertEqual(self.client().get('/drinks').headers['ETag'], etag)
+        ttl = api.MENU_CACHE_TTL
+        api.MENU_CACHE_TTL = 0
+        try:
+            time.sleep(0.01)
+            res = self.client().get('/drinks')
+        finally:
+            api.MENU_CACHE_TTL = ttl
+        data = json.loads(res.data)
+        self.assertNotEqual(res.headers['ETag'], etag)
+        self.assertEqual(len(data['drinks']), 2)
+
+    def test_write_invalidates_the_menu(self):
+        etag = self.client().get('/drinks').headers['ETag']
+        with app.app_context():
+            Drink(title='Mocha', recipe=RECIPE).insert()
+        invalidate_menu()
+        res = self.client().get('/drinks', headers={'If-None-Match': etag})
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res.headers['ETag'], etag)
+        self.assertEqual(len(data['drinks']), 2)
+
+
+class CompressionTestCase(unittest.TestCase):
+    """This class represents the response compression test case"""
+
+    def setUp(self):
+        """Define test variables and initialize a menu of 20 drinks."""
+        self.client = app.test_client
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            for number in range(20):
+                Drink(title='Latte {}'.format(number), recipe=RECIPE).insert()
+        invalidate_menu()
+        self.min_size = app.config['COMPRESS_MIN_SIZE']
+        app.config['COMPRESS_MIN_SIZE'] = 0
+
+    def tearDown(self):
+        """Executed after reach test"""
+        app.config['COMPRESS_MIN_SIZE'] = self.min_size
+
+    def get(self, accept_encoding, **headers):
+        headers['Accept-Encoding'] = accept_encoding
+        return self.client().get('/drinks', headers=headers)
+
+    def test_preferred_encoding(self):
+        body = self.client().get('/drinks').data
+        res = self.get('gzip, br')
+        coding = compression.encodings()[0]
+        self.assertEqual(res.headers['Content-Encoding'], coding)
+        self.assertIn('Accept-Encoding', res.headers['Vary'])
+        if coding == 'br':
+            self.assertEqual(compression.brotli.decompress(res.data), body)
+        res = self.get('br;q=0.5, gzip')
+        self.assertEqual(res.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(res.data), body)
+        for accept_encoding in ('', 'identity', 'gzip;q=0'):
+            self.assertNotIn('Content-Encoding',
+                             self.get(accept_encoding).headers)
+
+    def test_threshold(self):
+        size = len(self.client().get('/drinks').data)
+        app.config['COMPRESS_MIN_SIZE'] = size + 1
+        self.assertNotIn('Content-Encoding', self.get('gzip').headers)
+        app.config['COMPRESS_MIN_SIZE'] = size
+        self.assertEqual(self.get('gzip').headers['Content-Encoding'], 'gzip')
+
+    def test_compressed_menu_is_still_conditional(self):
+        strong = self.client().get('/drinks').headers['ETag']
+        res = self.get('gzip')
+        etag = res.headers['ETag']
+        self.assertEqual(etag, 'W/' + strong)
+        res = self.get('gzip', **{'If-None-Match': etag})
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.data, b'')
+        self.assertNotIn('Content-Encoding', res.headers)
+
+
+class InstrumentationTestCase(unittest.TestCase):
+    """This class represents the request and query instrumentation test case"""
+
+    def setUp(self):
+        """Define test variables and initialize a menu of one drink."""
+        self.client = app.test_client
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            Drink(title='Latte', recipe=RECIPE).insert()
+        invalidate_menu()
+
+    def scrape(self):
+        res = self.client().get('/metrics')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.mimetype, 'text/plain')
+        samples = {}
+        for line in res.get_data(as_text=True).splitlines():
+            if not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                samples[name] = float(value)
+        return samples
+
+    def test_requests_counted_by_route(self):
+        key = 'http_requests_total{method="GET",route="/drinks",status="200"}'
+        observed = 'http_request_duration_seconds_bucket{method="GET",' \
+            'route="/drinks",le="+Inf"}'
+        before = self.scrape()
+        self.client().get('/drinks')
+        self.client().get('/drinks')
+        samples = self.scrape()
+        self.assertEqual(samples[key], before.get(key, 0) + 2)
+        self.assertEqual(samples[observed], before.get(observed, 0) + 2)
+
+    def test_numeric_gauges_exported(self):
+        text = instrumentation.metrics.render({
+            'db_pool_size': 5, 'db_pool_pool': 'QueuePool', 'flag': True})
+        self.assertIn('# TYPE db_pool_size gauge\ndb_pool_size 5\n', text)
+        self.assertNotIn('db_pool_pool', text)
+        self.assertNotIn('flag', text)
+
+    def test_route_label_is_the_url_rule(self):
+        self.client().patch('/drinks/1')
+        self.client().get('/no-such-page')
+        samples = self.scrape()
+        self.assertTrue(samples['http_requests_total{method="PATCH",'
+                                'route="/drinks/<drink_id>",status="401"}'])
+        self.assertTrue(samples['http_requests_total{method="GET",'
+                                'route="(unmatched)",status="404"}'])
+
+    def test_server_timing(self):
+        res = self.client().get('/drinks')
+        self.assertRegex(res.headers['Server-Timing'],
+                         r'^app;dur=[0-9.]+, db;dur=[0-9.]+;'
+                         r'desc="[1-9][0-9]* queries"$')
+        # the cached menu runs no SQL
+        res = self.client().get('/drinks')
+        self.assertRegex(res.headers['Server-Timing'], r'^app;dur=[0-9.]+$')
+
+    def test_queries_per_request(self):
+        key = 'http_request_queries_sum{method="GET",route="/drinks"}'
+        before = self.scrape().get(key, 0)
+        res = self.client().get('/drinks')
+        queries = int(re.search(r'desc="(\d+) queries"',
+                                res.headers['Server-Timing']).group(1))
+        self.client().get('/drinks')
+        self.assertEqual(self.scrape()[key], before + queries)
+
+    def test_slow_queries_logged_and_counted(self):
+        key = 'db_slow_queries_total{route="/drinks"}'
+        before = self.scrape().get(key, 0)
+        slow_query_ms = instrumentation.metrics.slow_query_ms
+        instrumentation.metrics.slow_query_ms = 0
+        try:
+            with self.assertLogs('instrumentation', 'WARNING') as logs:
+                self.client().get('/drinks')
+        finally:
+            instrumentation.metrics.slow_query_ms = slow_query_ms
+        self.assertRegex(logs.output[0],
+                         r'slow query \([0-9.]+ ms\) in /drinks: SELECT ')
+        self.assertEqual(self.scrape()[key], before + len(logs.output))
+
+
+class PoolMetricsTestCase(unittest.TestCase):
+    """This class represents the connection pool metrics test case"""
+
+    def test_pool_metrics_route(self):
+        res = app.test_client().get('/metrics/pool')
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        with app.app_context():
+            self.assertEqual(data['pool'], pool_stats(db.engine))
+
+    def test_metered_pool_stats(self):
+        engine = create_engine('sqlite:///' + database_path,
+                               poolclass=MeteredQueuePool, pool_size=1,
+                               max_overflow=0, pool_timeout=0.05)
+        connection = engine.connect()
+        with self.assertRaises(exc.TimeoutError):
+            engine.connect()
+        stats = pool_stats(engine)
+        self.assertEqual(stats['pool'], 'MeteredQueuePool')
+        self.assertEqual(stats['checked_out'], 1)
+        self.assertEqual(stats['utilization'], 1.0)
+        self.assertEqual(stats['checkouts'], 2)
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertTrue(stats['wait_seconds_max'] >= 0.05)
+        connection.close()
+        stats = pool_stats(engine)
+        self.assertEqual((stats['checked_out'], stats['idle']), (0, 1))
+        engine.dispose()
+
+    def test_engine_options(self):
+        options = engine_options('postgresql://localhost/coffee', environ={
+            'DB_POOL_SIZE': '3', 'DB_STATEMENT_TIMEOUT': '500'})
+        self.assertIs(options['poolclass'], MeteredQueuePool)
+        self.assertEqual(options['pool_size'], 3)
+        self.assertEqual(options['max_overflow'], 10)
+        self.assertEqual(options['connect_args'],
+                         {'options': '-c statement_timeout=500'})
+        options = engine_options('sqlite:///database.db', environ={})
+        self.assertEqual(options, {'pool_pre_ping': True,
+                                   'pool_recycle': 1800})
+
+
+class ParseRecipeTestCase(unittest.TestCase):
+    """This class represents the recipe parsing test case"""
+
+    def test_list(self):
+        self.assertEqual(parse_recipe(RECIPE), (
+            {'name': 'espresso', 'color': 'brown', 'parts': 1},))
+
+    def test_single_ingredient(self):
+        recipe = json.dumps({'name': 'milk', 'color': 'white', 'parts': 2})
+        self.assertEqual(parse_recipe(recipe), (
+            {'name': 'milk', 'color': 'white', 'parts': 2},))
+
+    def test_other_values_are_not_split(self):
+        self.assertEqual(parse_recipe('"espresso"'), ('espresso',))
+        self.assertEqual(parse_recipe('2'), (2,))
+        self.assertEqual(parse_recipe('null'), (None,))
+
+
+@unittest.skipUnless(fastjson.orjson, 'orjson is not installed')
+class FastJSONTestCase(unittest.TestCase):
+    """This class represents the orjson encoder test case"""
+
+    def setUp(self):
+        self.stdlib = Flask('stdlib')
+        self.fast = Flask('fast')
+        fastjson.init_app(self.fast)
+
+    def assertSameBytes(self, payload, sort_keys=True):
+        bodies = []
+        for encoding_app in (self.stdlib, self.fast):
+            encoding_app.config['JSON_SORT_KEYS'] = sort_keys
+            with encoding_app.test_request_context():
+                bodies.append(jsonify(payload).get_data())
+        self.assertEqual(bodies[0], bodies[1])
+
+    def test_int_keys(self):
+        categories = {id: 'Category {}'.format(id) for id in range(1, 13)}
+        self.assertSameBytes({'success': True, 'categories': categories})
+        self.assertSameBytes({'success': True, 'categories': categories},
+                             sort_keys=False)
+        self.assertSameBytes({2: 'b', 10: 'a', -1: 'c'})
+
+    def test_non_ascii_text(self):
+        self.assertSameBytes({'answer': 'caf\xe9 na\xefve \xff \u0100 '
+                                        '\u201cquoted\u201d \u2013 \uffff'})
+
+    def test_astral_characters(self):
+        self.assertSameBytes({'answer': 'grin \U0001f600, \U00010000'})
+
+    def test_del(self):
+        self.assertSameBytes({'answer': 'a\x7fb', 'other': '\x7f\xe9'})
+
+    def test_tiny_and_huge_floats(self):
+        self.assertSameBytes({'values': [1e-05, 0.00001234, 5e-324, -2e-07,
+                                         0.0001, 1e16, 1.5e300, 1e15,
+                                         123456789012345.6]})
+
+    def test_big_ints(self):
+        self.assertSameBytes({'values': [2 ** 63, -2 ** 63 - 1, 2 ** 64,
+                                         10 ** 30, 2 ** 53 + 1]})
+
+    def test_words_like_exponents(self):
+        self.assertSameBytes({'answer': 're-elected', 'other': 'pre-1900',
+                              'more': ['e-mail', 'the 1e-5 setting']})
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,266 @@
+import unittest
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.auth.auth import AuthError, JWKSCache, TokenCache, \
+    check_permissions, compile_permissions, register_permission
+
+
+def make_jwks(*kids):
+    return {'keys': [{
+        'kty': 'RSA',
+        'kid': kid,
+        'use': 'sig',
+        'n': 'n-' + kid,
+        'e': 'AQAB'
+    } for kid in kids]}
+
+
+class JWKSCacheTestCase(unittest.TestCase):
+    """This class represents the JWKS cache test case"""
+
+    def setUp(self):
+        """Write a stand-in jwks.json served through a file:// url."""
+        fd, self.jwks_path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        self.write_jwks('key-1')
+        self.url = 'file://' + self.jwks_path
+        self.cache = JWKSCache(self.url, ttl=60, min_refresh_interval=60)
+        self.fetches = 0
+        fetch = self.cache._fetch
+
+        def counting_fetch():
+            self.fetches += 1
+            return fetch()
+        self.cache._fetch = counting_fetch
+
+    def tearDown(self):
+        """Executed after reach test"""
+        os.remove(self.jwks_path)
+
+    def write_jwks(self, *kids):
+        with open(self.jwks_path, 'w') as f:
+            json.dump(make_jwks(*kids), f)
+
+    def test_get_key_by_kid(self):
+        key = self.cache.get_key('key-1')
+        self.assertEqual(key['kid'], 'key-1')
+        self.assertEqual(key['n'], 'n-key-1')
+        self.assertEqual(self.fetches, 1)
+
+    def test_keys_served_from_memory_within_ttl(self):
+        self.cache.get_key('key-1')
+        self.cache.get_key('key-1')
+        self.cache.get_key('key-1')
+        self.assertEqual(self.fetches, 1)
+
+    def test_unknown_kid_refreshes_once(self):
+        self.cache.min_refresh_interval = 0
+        self.cache.get_key('key-1')
+        self.write_jwks('key-1', 'key-2')
+        key = self.cache.get_key('key-2')
+        self.assertEqual(key['kid'], 'key-2')
+        self.assertEqual(self.fetches, 2)
+
+    def test_unknown_kid_refresh_is_rate_limited(self):
+        self.cache.get_key('key-1')
+        self.assertEqual(self.cache.get_key('key-2'), None)
+        self.assertEqual(self.cache.get_key('key-3'), None)
+        self.assertEqual(self.fetches, 1)
+
+    def test_stale_keys_served_while_revalidating(self):
+        self.cache.get_key('key-1')
+        self.cache.ttl = 0
+        self.write_jwks('key-2')
+        release = threading.Event()
+        fetch = self.cache._fetch
+
+        def slow_fetch():
+            release.wait(5)
+            return fetch()
+        self.cache._fetch = slow_fetch
+
+        # the stale key set is still answered from memory
+        self.assertEqual(self.cache.get_key('key-1')['kid'], 'key-1')
+        release.set()
+        deadline = time.time() + 5
+        while 'key-2' not in self.cache._keys and time.time() < deadline:
+            time.sleep(0.01)
+        self.cache.ttl = 60
+        self.assertEqual(self.cache.get_key('key-2')['kid'], 'key-2')
+
+    def test_failed_refresh_keeps_stale_keys(self):
+        self.cache.get_key('key-1')
+        os.remove(self.jwks_path)
+        self.assertFalse(self.cache.refresh())
+        self.assertEqual(self.cache.get_key('key-1')['kid'], 'key-1')
+        self.write_jwks('key-1')
+
+    def test_failed_background_refresh_backs_off(self):
+        self.cache.get_key('key-1')
+        self.cache.ttl = 0
+        os.remove(self.jwks_path)
+        self.cache.get_key('key-1')
+        deadline = time.time() + 5
+        while self.cache._failures == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        for _ in range(50):
+            self.assertEqual(self.cache.get_key('key-1')['kid'], 'key-1')
+            self.assertEqual(self.cache.get_key('key-2'), None)
+        self.assertEqual(self.fetches, 2)
+        self.write_jwks('key-1')
+
+    def test_one_background_refresh_at_a_time(self):
+        self.cache.get_key('key-1')
+        self.cache.ttl = 0
+        release = threading.Event()
+        fetch = self.cache._fetch
+
+        def slow_fetch():
+            release.wait(5)
+            return fetch()
+        self.cache._fetch = slow_fetch
+        threads = [threading.Thread(target=self.cache.get_key,
+                                    args=('key-1',)) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        release.set()
+        deadline = time.time() + 5
+        while self.cache._refreshing and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.fetches, 2)
+
+
+class StalledProviderTestCase(unittest.TestCase):
+    """This class represents the JWKS cache against a stalled provider"""
+
+    def setUp(self):
+        """Serve a key set url that accepts connections and never answers."""
+        release = self.release = threading.Event()
+
+        class StalledHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                release.wait(10)
+
+            def log_message(self, *args):
+                pass
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StalledHandler)
+        threading.Thread(target=self.server.serve_forever,
+                         daemon=True).start()
+        self.url = 'http://127.0.0.1:{}/.well-known/jwks.json'.format(
+            self.server.server_port)
+
+    def tearDown(self):
+        """Executed after reach test"""
+        self.release.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_cold_start_gives_up_after_timeout(self):
+        cache = JWKSCache(self.url, timeout=0.2)
+        start = time.monotonic()
+        with self.assertRaises(Exception):
+            cache.get_key('key-1')
+        self.assertLess(time.monotonic() - start, 2)
+
+    def test_stalled_refresh_does_not_block_lookups(self):
+        fd, path = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(make_jwks('key-1'), f)
+        cache = JWKSCache('file://' + path, ttl=0, min_refresh_interval=0,
+                          timeout=0.5)
+        cache.get_key('key-1')
+        os.remove(path)
+        cache.url = self.url
+        # the stale key starts a background refresh that stalls
+        self.assertEqual(cache.get_key('key-1')['kid'], 'key-1')
+        start = time.monotonic()
+        self.assertEqual(cache.get_key('key-1')['kid'], 'key-1')
+        self.assertLess(time.monotonic() - start, 0.1)
+        self.assertEqual(cache.get_key('key-2'), None)
+        self.assertLess(time.monotonic() - start, 2)
+
+
+class TokenCacheTestCase(unittest.TestCase):
+    """This class represents the verified-token cache test case"""
+
+    def setUp(self):
+        self.cache = TokenCache(maxsize=2)
+        self.exp = int(time.time()) + 3600
+
+    def test_cached_payload_returned(self):
+        payload = {'sub': 'barista', 'exp': self.exp}
+        self.cache.set('token-1', payload, 3)
+        self.assertEqual(self.cache.get('token-1'), (payload, 3))
+        self.assertEqual(self.cache.get('token-2'), None)
+
+    def test_entries_keyed_by_hash(self):
+        self.cache.set('token-1', {'exp': self.exp})
+        self.assertNotIn('token-1', self.cache._entries)
+
+    def test_expired_token_not_returned(self):
+        self.cache.set('token-1', {'exp': int(time.time()) - 1})
+        self.assertEqual(self.cache.get('token-1'), None)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_token_without_exp_not_cached(self):
+        self.cache.set('token-1', {'sub': 'barista'})
+        self.assertEqual(len(self.cache), 0)
+
+    def test_least_recently_used_evicted(self):
+        self.cache.set('token-1', {'exp': self.exp})
+        self.cache.set('token-2', {'exp': self.exp})
+        self.cache.get('token-1')
+        self.cache.set('token-3', {'exp': self.exp})
+        self.assertTrue(self.cache.get('token-1'))
+        self.assertEqual(self.cache.get('token-2'), None)
+        self.assertTrue(self.cache.get('token-3'))
+
+    def test_invalidate(self):
+        self.cache.set('token-1', {'exp': self.exp})
+        self.cache.invalidate('token-1')
+        self.assertEqual(self.cache.get('token-1'), None)
+
+
+class PermissionsTestCase(unittest.TestCase):
+    """This class represents the compiled permissions test case"""
+
+    def setUp(self):
+        self.read_bit = register_permission('test:read')
+        self.write_bit = register_permission('test:write')
+        self.payload = {'permissions': ['test:read', 'unknown:perm']}
+
+    def test_register_is_idempotent(self):
+        self.assertEqual(register_permission('test:read'), self.read_bit)
+        self.assertNotEqual(self.read_bit, self.write_bit)
+
+    def test_compile_permissions(self):
+        granted = compile_permissions(self.payload)
+        self.assertTrue(granted & self.read_bit)
+        self.assertFalse(granted & self.write_bit)
+
+    def test_check_with_compiled_mask(self):
+        granted = compile_permissions(self.payload)
+        self.assertTrue(check_permissions('test:read', self.payload, granted))
+        with self.assertRaises(AuthError) as ctx:
+            check_permissions('test:write', self.payload, granted)
+        self.assertEqual(ctx.exception.status_code, 403)
+
+    def test_check_unregistered_permission(self):
+        self.assertTrue(check_permissions('unknown:perm', self.payload))
+
+    def test_check_missing_permissions_claim(self):
+        with self.assertRaises(AuthError) as ctx:
+            check_permissions('test:read', {})
+        self.assertEqual(ctx.exception.status_code, 401)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,7 @@
 import os
-from flask import Flask
-from models import setup_db
+from flask import Flask, jsonify
+from models import setup_db, db
+from engine import pool_stats
 
 def create_app(test_config=None):
 
@@ -15,6 +16,10 @@ def create_app(test_config=None):
         if excited == 'true': greeting = greeting + "!!!!!"
         return greeting
 
+    @app.route('/metrics/pool')
+    def get_pool_stats():
+        return jsonify(pool_stats(db.engine))
+
     @app.route('/coolkids')
     def be_cool():
         return "Be cool, man, be coooool! You're almost a FSND grad!"